@@ -1,5 +1,6 @@
 import React, { useEffect, useState } from 'react';
 import axios from 'axios';
+import fetchAllPages from '../../../customHooks/fetchAllPages';
 import { ToastContainer, toast } from 'react-toastify';
 import 'react-toastify/dist/ReactToastify.css';
 
@@ -21,12 +22,12 @@ const Order = () => {
   const fetchOrders = async () => {
     const token = localStorage.getItem('token');
     try {
-      const response = await axios.get(`${BASE_URL}/orders/`, {
+      const orders = await fetchAllPages(`${BASE_URL}/orders/`, {
         headers: {
           Authorization: `Bearer ${token}`,
         },
       });
-      setOrders(response.data);
+      setOrders(orders);
     } catch (error) {
       console.error('Error fetching orders:', error);
       toast.error('Failed to fetch orders');
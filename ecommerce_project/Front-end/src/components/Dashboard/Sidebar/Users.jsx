@@ -1,4 +1,5 @@
 import axios from 'axios';
+import fetchAllPages from '../../../customHooks/fetchAllPages';
 import React, { useEffect, useState } from 'react';
 import { toast } from 'react-toastify';
 
@@ -20,13 +21,12 @@ const UserperPage = 10;
   const fetchData = async () => {
     try {
       const token = localStorage.getItem('token');
-      const response = await axios.get(`${BASE_URL}/admin/users`, {
+      const users = await fetchAllPages(`${BASE_URL}/admin/users`, {
         headers: {
           Authorization: `Bearer ${token}`
         }
-      });
-      console.log("API response is", response.data);
-      setData(response.data.users);
+      }, (data) => data.users);
+      setData(users);
     } catch (error) {
       toast.error('Try again');
       console.log("The error is", error);
@@ -1,5 +1,6 @@
 import React, { useEffect, useState } from 'react';
 import axios from 'axios';
+import fetchAllPages from '../../../customHooks/fetchAllPages';
 const BASE_URL = import.meta.env.VITE_API_BASE_URL;
 import { IoBagAddSharp } from "react-icons/io5";
 
@@ -17,12 +18,12 @@ const ViewProducts = () => {
   useEffect(() => {
     const fetchProducts = async () => {
       try {
-        const response = await axios.get(`${BASE_URL}/products/allproducts/`, {
+        const products = await fetchAllPages(`${BASE_URL}/products/allproducts/`, {
           headers: {
             Authorization: `Bearer ${token}`,
           },
         });
-        setProducts(response.data);
+        setProducts(products);
       } catch (error) {
         console.error('Error fetching products:', error);
       }
@@ -1,5 +1,6 @@
 import React, { useEffect, useState } from 'react';
 import axios from 'axios';
+import fetchAllPages from '../../../customHooks/fetchAllPages';
 import { toast, ToastContainer } from 'react-toastify';
 import 'react-toastify/dist/ReactToastify.css';
 import { RxCross2 } from "react-icons/rx";
@@ -20,8 +21,7 @@ const Customer = () => {
   
   const fetchReviews = async () => {
     try {
-      const response = await axios.get(`${BASE_URL}/reviews/`);
-      setReviews(response.data);
+      setReviews(await fetchAllPages(`${BASE_URL}/reviews/`));
     } catch (error) {
       console.error('Error fetching reviews:', error);
     }
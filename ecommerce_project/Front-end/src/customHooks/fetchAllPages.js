@@ -0,0 +1,22 @@
+import axios from "axios";
+
+// List endpoints return one page per request (at most 200 rows) and put the cursor of
+// the next page in the X-Next-Cursor header. Follows it until the last page and returns
+// every row; `pick` gets the rows out of endpoints that wrap them, e.g. data => data.users.
+const PAGE_SIZE = 200;
+
+const fetchAllPages = async (url, config = {}, pick = (data) => data) => {
+    const rows = [];
+    let cursor = null;
+    do {
+        const res = await axios.get(url, {
+            ...config,
+            params: { ...config.params, limit: PAGE_SIZE, ...(cursor ? { cursor } : {}) },
+        });
+        rows.push(...pick(res.data));
+        cursor = res.headers["x-next-cursor"];
+    } while (cursor);
+    return rows;
+};
+
+export default fetchAllPages;
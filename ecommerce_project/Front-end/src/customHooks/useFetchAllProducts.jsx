@@ -1,5 +1,6 @@
 import { useEffect, useState } from "react";
 import axios from "axios";
+import fetchAllPages from "./fetchAllPages";
 const BASE_URL=import.meta.env.VITE_API_BASE_URL
 const useAllProducts = () => {
     const [products,setProducts]=useState([])
@@ -10,9 +11,9 @@ const useAllProducts = () => {
     useEffect(()=>{
 
         const fetchProducts=()=>{
-            axios.get(`${BASE_URL}/products/allproducts`)
-            .then(res=>{
-                setProducts(res.data)
+            fetchAllPages(`${BASE_URL}/products/allproducts`)
+            .then(products=>{
+                setProducts(products)
                 setLoading(false)
             })
             .catch(err=>{
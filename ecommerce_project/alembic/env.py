@@ -4,7 +4,7 @@ import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 import os
-from sqlalchemy import engine_from_config, pool
+from sqlalchemy import engine_from_config, pool, inspect
 from alembic import context
 from logging.config import fileConfig
 from app.database import Base, engine
@@ -25,6 +25,20 @@ from app.database import Base, engine  # Ensure this import works
 
 target_metadata = Base.metadata
 
+def refuse_unstamped_schema(connection):
+    # An unstamped database is either empty or was built by the old create_all(), whose
+    # tables the root revision would drop. `python -m app.migrate` prepares and stamps both.
+    command = getattr(config.cmd_opts, "cmd", None)
+    if config.attributes.get("schema_checked") or (command and command[0].__name__ == "stamp"):
+        return
+    tables = inspect(connection).get_table_names()
+    if "alembic_version" not in tables:
+        raise SystemExit(
+            "Database has no alembic_version: run `python -m app.migrate`, which creates or "
+            "stamps the create_all() schema before upgrading, or stamp it by hand."
+        )
+
+
 def run_migrations_online():
     connectable = engine_from_config(
         config.get_section(config.config_ini_section),
@@ -33,6 +47,7 @@ def run_migrations_online():
     )
 
     with connectable.connect() as connection:
+        refuse_unstamped_schema(connection)
         context.configure(
             connection=connection,
             target_metadata=target_metadata,
@@ -0,0 +1,26 @@
+"""archived variants
+
+Revision ID: 1b6e4c9a7d30
+Revises: e4b9d7a2c5f8
+Create Date: 2026-10-17 21:12:44.519387
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1b6e4c9a7d30'
+down_revision: Union[str, None] = 'e4b9d7a2c5f8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('product_variants', sa.Column('is_archived', sa.Boolean(), server_default=sa.text('false'), nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('product_variants', 'is_archived')
@@ -0,0 +1,36 @@
+"""product search index
+
+Revision ID: 3f1c9a2b7d4e
+Revises: 96536b1dcfec
+Create Date: 2026-10-16 10:12:41.208311
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f1c9a2b7d4e'
+down_revision: Union[str, None] = '96536b1dcfec'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Expression must match app.search.SEARCH_DOCUMENT exactly
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_products_search_document ON products USING gin ("
+        "to_tsvector('simple', coalesce(products.product_name, '') || ' ' || "
+        "coalesce(products.brand, '') || ' ' || coalesce(products.description, '')))"
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_products_name_trgm ON products "
+        "USING gin (product_name gin_trgm_ops)"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_products_name_trgm")
+    op.execute("DROP INDEX IF EXISTS ix_products_search_document")
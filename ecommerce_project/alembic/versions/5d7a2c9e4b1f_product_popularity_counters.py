@@ -0,0 +1,66 @@
+"""product popularity counters
+
+Revision ID: 5d7a2c9e4b1f
+Revises: 8b2e4d6f1a3c
+Create Date: 2026-10-16 13:41:05.218734
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d7a2c9e4b1f'
+down_revision: Union[str, None] = '8b2e4d6f1a3c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('products', sa.Column('units_sold', sa.Integer(), server_default=sa.text('0'), nullable=False))
+    op.add_column('products', sa.Column('units_sold_7d', sa.Integer(), server_default=sa.text('0'), nullable=False))
+    op.add_column('products', sa.Column('units_sold_30d', sa.Integer(), server_default=sa.text('0'), nullable=False))
+    op.create_index('ix_products_units_sold', 'products', ['units_sold'], unique=False)
+    op.create_index('ix_products_units_sold_7d', 'products', ['units_sold_7d'], unique=False)
+    op.create_index('ix_products_units_sold_30d', 'products', ['units_sold_30d'], unique=False)
+    op.create_table('product_sales_daily',
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('units', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('product_id', 'day')
+    )
+    op.create_index('ix_product_sales_daily_day', 'product_sales_daily', ['day'], unique=False)
+    # backfill from existing orders (same as app.product_stats.backfill_sales_counters)
+    op.execute(
+        "UPDATE products SET units_sold = coalesce(("
+        "SELECT sum(order_items.quantity) FROM order_items JOIN orders ON orders.id = order_items.order_id "
+        "WHERE order_items.product_id = products.id AND orders.order_status <> 'cancelled'), 0)"
+    )
+    op.execute(
+        "INSERT INTO product_sales_daily (product_id, day, units) "
+        "SELECT order_items.product_id, date(orders.order_date), sum(order_items.quantity) "
+        "FROM order_items JOIN orders ON orders.id = order_items.order_id "
+        "WHERE orders.order_date >= now() - interval '35 days' AND orders.order_status <> 'cancelled' "
+        "GROUP BY order_items.product_id, date(orders.order_date)"
+    )
+    op.execute(
+        "UPDATE products SET "
+        "units_sold_7d = coalesce((SELECT sum(units) FROM product_sales_daily d "
+        "WHERE d.product_id = products.id AND d.day > current_date - 7), 0), "
+        "units_sold_30d = coalesce((SELECT sum(units) FROM product_sales_daily d "
+        "WHERE d.product_id = products.id AND d.day > current_date - 30), 0)"
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_product_sales_daily_day', table_name='product_sales_daily')
+    op.drop_table('product_sales_daily')
+    op.drop_index('ix_products_units_sold_30d', table_name='products')
+    op.drop_index('ix_products_units_sold_7d', table_name='products')
+    op.drop_index('ix_products_units_sold', table_name='products')
+    op.drop_column('products', 'units_sold_30d')
+    op.drop_column('products', 'units_sold_7d')
+    op.drop_column('products', 'units_sold')
@@ -0,0 +1,105 @@
+"""tables created at startup
+
+Revision ID: 7c3e9d2a5b18
+Revises: f6a9b2c4d8e1
+Create Date: 2026-10-16 23:58:12.604913
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c3e9d2a5b18'
+down_revision: Union[str, None] = 'f6a9b2c4d8e1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# These tables were only ever created by Base.metadata.create_all() when the app
+# started. The app no longer does that, so Alembic creates them where they are
+# missing; existing databases already have them and are left untouched.
+def upgrade() -> None:
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if 'roles' not in existing:
+        op.create_table('roles',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('name', sa.String(), nullable=False),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('name')
+        )
+    if 'permissions' not in existing:
+        op.create_table('permissions',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('name', sa.String(), nullable=False),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('name')
+        )
+    if 'role_permissions' not in existing:
+        op.create_table('role_permissions',
+            sa.Column('role_id', sa.Integer(), nullable=False),
+            sa.Column('permission_id', sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint(['permission_id'], ['permissions.id'], ),
+            sa.ForeignKeyConstraint(['role_id'], ['roles.id'], ),
+            sa.PrimaryKeyConstraint('role_id', 'permission_id')
+        )
+    if 'variant_attributes' not in existing:
+        op.create_table('variant_attributes',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('name', sa.String(), nullable=False),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('name')
+        )
+        op.create_index('ix_variant_attributes_id', 'variant_attributes', ['id'], unique=False)
+    if 'category_variant_attributes' not in existing:
+        op.create_table('category_variant_attributes',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('category_id', sa.Integer(), nullable=True),
+            sa.Column('attribute_id', sa.Integer(), nullable=True),
+            sa.ForeignKeyConstraint(['attribute_id'], ['variant_attributes.id'], ),
+            sa.ForeignKeyConstraint(['category_id'], ['categories.id'], ),
+            sa.PrimaryKeyConstraint('id')
+        )
+    if 'product_variants' not in existing:
+        op.create_table('product_variants',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('product_id', sa.Integer(), nullable=True),
+            sa.Column('price', sa.Float(), nullable=False),
+            sa.Column('stock', sa.Integer(), nullable=False),
+            sa.Column('discount', sa.Integer(), nullable=True),
+            sa.Column('shipping_time', sa.Integer(), nullable=True),
+            sa.Column('attributes', sa.JSON(), nullable=True),
+            sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+            sa.ForeignKeyConstraint(['product_id'], ['products.id'], ondelete='CASCADE'),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_product_variants_id', 'product_variants', ['id'], unique=False)
+        op.create_index('ix_product_variants_product_id', 'product_variants', ['product_id'], unique=False)
+        op.create_index('ix_product_variants_updated_at', 'product_variants', ['updated_at'], unique=False)
+    if 'payment_methods' not in existing:
+        op.create_table('payment_methods',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('method', sa.Enum('credit_card', 'debit_card', 'paypal', 'cash_on_delivery', name='paymentmode'), nullable=False),
+            sa.Column('enabled', sa.Boolean(), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('method')
+        )
+        op.create_index('ix_payment_methods_id', 'payment_methods', ['id'], unique=False)
+    if 'website_logo' not in existing:
+        op.create_table('website_logo',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('name', sa.String(), nullable=False),
+            sa.Column('logo_path', sa.String(), nullable=True),
+            sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+            sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_website_logo_id', 'website_logo', ['id'], unique=False)
+
+
+def downgrade() -> None:
+    # The tables predate this revision in every existing database, so they are kept
+    pass
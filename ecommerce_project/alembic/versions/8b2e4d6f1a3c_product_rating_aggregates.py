@@ -0,0 +1,39 @@
+"""product rating aggregates
+
+Revision ID: 8b2e4d6f1a3c
+Revises: 3f1c9a2b7d4e
+Create Date: 2026-10-16 11:02:17.553940
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b2e4d6f1a3c'
+down_revision: Union[str, None] = '3f1c9a2b7d4e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('products', sa.Column('rating_sum', sa.Integer(), server_default=sa.text('0'), nullable=False))
+    op.add_column('products', sa.Column('rating_count', sa.Integer(), server_default=sa.text('0'), nullable=False))
+    op.add_column('products', sa.Column('avg_rating', sa.Float(), nullable=True))
+    op.create_index('ix_products_avg_rating', 'products', ['avg_rating'], unique=False)
+    # backfill from existing reviews (same as app.product_stats.backfill_rating_aggregates)
+    op.execute(
+        "UPDATE products SET "
+        "rating_sum = coalesce((SELECT sum(rating) FROM reviews WHERE reviews.product_id = products.id), 0), "
+        "rating_count = (SELECT count(rating) FROM reviews WHERE reviews.product_id = products.id), "
+        "avg_rating = (SELECT avg(rating) FROM reviews WHERE reviews.product_id = products.id)"
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_products_avg_rating', table_name='products')
+    op.drop_column('products', 'avg_rating')
+    op.drop_column('products', 'rating_count')
+    op.drop_column('products', 'rating_sum')
@@ -0,0 +1,40 @@
+"""product price range
+
+Revision ID: a4c8e1f05b92
+Revises: 5d7a2c9e4b1f
+Create Date: 2026-10-16 15:12:48.903127
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4c8e1f05b92'
+down_revision: Union[str, None] = '5d7a2c9e4b1f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('products', sa.Column('min_price', sa.Float(), nullable=True))
+    op.add_column('products', sa.Column('max_price', sa.Float(), nullable=True))
+    op.create_index('ix_products_min_price', 'products', ['min_price'], unique=False)
+    op.create_index('ix_products_max_price', 'products', ['max_price'], unique=False)
+    # backfill from existing variants (same as app.product_stats.backfill_price_ranges)
+    op.execute(
+        "UPDATE products SET "
+        "min_price = (SELECT min(price * (100 - coalesce(discount, 0)) / 100.0) FROM product_variants "
+        "WHERE product_variants.product_id = products.id), "
+        "max_price = (SELECT max(price * (100 - coalesce(discount, 0)) / 100.0) FROM product_variants "
+        "WHERE product_variants.product_id = products.id)"
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_products_max_price', table_name='products')
+    op.drop_index('ix_products_min_price', table_name='products')
+    op.drop_column('products', 'max_price')
+    op.drop_column('products', 'min_price')
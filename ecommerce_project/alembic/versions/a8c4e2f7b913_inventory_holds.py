@@ -0,0 +1,34 @@
+"""inventory holds
+
+Revision ID: a8c4e2f7b913
+Revises: d3a7f1e9c2b6
+Create Date: 2026-10-17 14:22:05.736190
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a8c4e2f7b913'
+down_revision: Union[str, None] = 'd3a7f1e9c2b6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('inventory_holds',
+        sa.Column('order_id', sa.Integer(), nullable=False),
+        sa.Column('expires_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.ForeignKeyConstraint(['order_id'], ['orders.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('order_id')
+    )
+    op.create_index(op.f('ix_inventory_holds_expires_at'), 'inventory_holds', ['expires_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_inventory_holds_expires_at'), table_name='inventory_holds')
+    op.drop_table('inventory_holds')
@@ -0,0 +1,63 @@
+"""bulk import jobs
+
+Revision ID: b5d2e8f1c7a4
+Revises: 7c3e9d2a5b18
+Create Date: 2026-10-17 01:12:44.308167
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b5d2e8f1c7a4'
+down_revision: Union[str, None] = '7c3e9d2a5b18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('import_jobs',
+        sa.Column('id', sa.String(), nullable=False),
+        sa.Column('admin_id', sa.Integer(), nullable=True),
+        sa.Column('directory', sa.String(), nullable=False),
+        sa.Column('image_paths', sa.JSON(), nullable=False),
+        sa.Column('status', sa.Enum('queued', 'running', 'completed', 'failed', name='importstatus'), nullable=False),
+        sa.Column('total_rows', sa.Integer(), nullable=True),
+        sa.Column('chunk_count', sa.Integer(), nullable=True),
+        sa.Column('rows_done', sa.Integer(), server_default=sa.text('0'), nullable=False),
+        sa.Column('rows_failed', sa.Integer(), server_default=sa.text('0'), nullable=False),
+        sa.Column('error_file', sa.String(), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.Column('started_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(['admin_id'], ['users.id'], ondelete='SET NULL'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('import_chunks',
+        sa.Column('job_id', sa.String(), nullable=False),
+        sa.Column('chunk_index', sa.Integer(), nullable=False),
+        sa.Column('rows_done', sa.Integer(), nullable=False),
+        sa.Column('rows_failed', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['job_id'], ['import_jobs.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('job_id', 'chunk_index')
+    )
+    op.create_table('import_job_products',
+        sa.Column('job_id', sa.String(), nullable=False),
+        sa.Column('product_name', sa.String(), nullable=False),
+        sa.Column('category_id', sa.Integer(), nullable=False),
+        sa.Column('product_id', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['job_id'], ['import_jobs.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['product_id'], ['products.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('job_id', 'product_name', 'category_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('import_job_products')
+    op.drop_table('import_chunks')
+    op.drop_table('import_jobs')
+    sa.Enum(name='importstatus').drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,29 @@
+"""catalog filter indexes
+
+Revision ID: c2b7f3d81e06
+Revises: a4c8e1f05b92
+Create Date: 2026-10-16 16:30:22.417586
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c2b7f3d81e06'
+down_revision: Union[str, None] = 'a4c8e1f05b92'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_products_brand', 'products', ['brand'], unique=False)
+    op.create_index('ix_products_category_id', 'products', ['category_id'], unique=False)
+    op.create_index('ix_product_variants_product_id', 'product_variants', ['product_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_product_variants_product_id', table_name='product_variants')
+    op.drop_index('ix_products_category_id', table_name='products')
+    op.drop_index('ix_products_brand', table_name='products')
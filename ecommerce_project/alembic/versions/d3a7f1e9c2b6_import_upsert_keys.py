@@ -0,0 +1,33 @@
+"""import upsert keys
+
+Revision ID: d3a7f1e9c2b6
+Revises: b5d2e8f1c7a4
+Create Date: 2026-10-17 09:41:27.518402
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd3a7f1e9c2b6'
+down_revision: Union[str, None] = 'b5d2e8f1c7a4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('product_variants', sa.Column('sku', sa.String(), nullable=True))
+    op.create_unique_constraint('product_variants_sku_key', 'product_variants', ['sku'])
+    importmode = sa.Enum('create', 'upsert', name='importmode')
+    importmode.create(op.get_bind(), checkfirst=True)
+    op.add_column('import_jobs', sa.Column('mode', importmode, server_default='create', nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('import_jobs', 'mode')
+    sa.Enum(name='importmode').drop(op.get_bind(), checkfirst=True)
+    op.drop_constraint('product_variants_sku_key', 'product_variants', type_='unique')
+    op.drop_column('product_variants', 'sku')
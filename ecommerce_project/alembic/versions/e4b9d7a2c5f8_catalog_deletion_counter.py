@@ -0,0 +1,31 @@
+"""catalog deletion counter
+
+Revision ID: e4b9d7a2c5f8
+Revises: a8c4e2f7b913
+Create Date: 2026-10-17 17:48:19.042615
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e4b9d7a2c5f8'
+down_revision: Union[str, None] = 'a8c4e2f7b913'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    catalog_version = op.create_table('catalog_version',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('deletions', sa.Integer(), server_default=sa.text('0'), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.bulk_insert(catalog_version, [{'id': 1, 'deletions': 0}])
+
+
+def downgrade() -> None:
+    op.drop_table('catalog_version')
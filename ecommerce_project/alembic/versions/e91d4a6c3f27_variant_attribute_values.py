@@ -0,0 +1,62 @@
+"""variant attribute values
+
+Revision ID: e91d4a6c3f27
+Revises: c2b7f3d81e06
+Create Date: 2026-10-16 17:48:09.661502
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e91d4a6c3f27'
+down_revision: Union[str, None] = 'c2b7f3d81e06'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('variant_attribute_values',
+    sa.Column('attribute_id', sa.Integer(), nullable=False),
+    sa.Column('value', sa.String(), nullable=False),
+    sa.Column('variant_id', sa.Integer(), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['attribute_id'], ['variant_attributes.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['variant_id'], ['product_variants.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('attribute_id', 'value', 'variant_id')
+    )
+    op.create_index('ix_variant_attribute_values_variant_id', 'variant_attribute_values', ['variant_id'], unique=False)
+    op.create_index('ix_variant_attribute_values_product_id', 'variant_attribute_values', ['product_id'], unique=False)
+    # backfill from the attributes JSON (same as app.variant_attributes.backfill_variant_attributes)
+    op.execute(
+        "INSERT INTO variant_attributes (name) "
+        "SELECT DISTINCT trim(a.key) FROM product_variants v, json_each_text(v.attributes) a "
+        "WHERE v.attributes IS NOT NULL AND json_typeof(v.attributes) = 'object' "
+        "AND trim(coalesce(a.value, '')) <> '' "
+        "ON CONFLICT (name) DO NOTHING"
+    )
+    op.execute(
+        "INSERT INTO variant_attribute_values (attribute_id, value, variant_id, product_id) "
+        "SELECT DISTINCT va.id, trim(a.value), v.id, v.product_id "
+        "FROM product_variants v, json_each_text(v.attributes) a, variant_attributes va "
+        "WHERE v.attributes IS NOT NULL AND json_typeof(v.attributes) = 'object' AND v.product_id IS NOT NULL "
+        "AND va.name = trim(a.key) AND trim(coalesce(a.value, '')) <> ''"
+    )
+    op.execute(
+        "INSERT INTO category_variant_attributes (category_id, attribute_id) "
+        "SELECT DISTINCT p.category_id, vav.attribute_id "
+        "FROM variant_attribute_values vav JOIN products p ON p.id = vav.product_id "
+        "WHERE p.category_id IS NOT NULL AND NOT EXISTS ("
+        "SELECT 1 FROM category_variant_attributes c "
+        "WHERE c.category_id = p.category_id AND c.attribute_id = vav.attribute_id)"
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_variant_attribute_values_product_id', table_name='variant_attribute_values')
+    op.drop_index('ix_variant_attribute_values_variant_id', table_name='variant_attribute_values')
+    op.drop_table('variant_attribute_values')
@@ -0,0 +1,32 @@
+"""catalog version columns
+
+Revision ID: f6a9b2c4d8e1
+Revises: e91d4a6c3f27
+Create Date: 2026-10-16 19:05:37.120458
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f6a9b2c4d8e1'
+down_revision: Union[str, None] = 'e91d4a6c3f27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('product_variants', sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True))
+    op.create_index('ix_product_variants_updated_at', 'product_variants', ['updated_at'], unique=False)
+    op.create_index('ix_products_updated_at', 'products', ['updated_at'], unique=False)
+    op.create_index('ix_products_created_at', 'products', ['created_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_products_created_at', table_name='products')
+    op.drop_index('ix_products_updated_at', table_name='products')
+    op.drop_index('ix_product_variants_updated_at', table_name='product_variants')
+    op.drop_column('product_variants', 'updated_at')
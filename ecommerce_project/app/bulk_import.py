@@ -0,0 +1,746 @@
+import csv, io, os, shutil
+from datetime import datetime, timezone
+from typing import BinaryIO, Callable, Collection, Dict, Iterable, List, Mapping, NamedTuple, Optional
+from uuid import uuid4
+from sqlalchemy import select, update, delete, func, tuple_, bindparam
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.database import dialect_insert
+from app.serialization import loads
+from app.models import Product, ProductVariant, ProductImage, Category, ImportJob, ImportChunk, ImportJobProduct, ImportStatus, ImportMode
+from app.product_stats import refresh_price_range
+from app.variant_attributes import sync_product_attributes
+
+# Set-based CSV product import, shared by /products/bulk-upload and the Celery task.
+# The CSV is read incrementally, one chunk of rows at a time: the chunk is validated
+# in memory (category ids are loaded once per import), then written with one
+# multi-row INSERT each for products, variants and images, the denormalized columns
+# are refreshed for the chunk's products and the chunk is committed. A chunk the
+# database rejects is rolled back and written again in halves, each in a SAVEPOINT,
+# so only the rows it rejects land in the error CSV, next to the rows that failed
+# validation. Memory use is bounded by the chunk size, not by the file.
+#
+# Every row is one variant; rows with the same product key share a product, which
+# takes brand/description/is_feature from its first row. The product key is the
+# optional `sku` column, or product_name + category_id for rows without one.
+#
+# ImportMode.upsert makes re-importing a catalog feed idempotent: products and
+# variants that already exist are updated in place (price, stock, discount, ...)
+# instead of being added again. Products match on their key, variants on the
+# optional `variant_sku` column (INSERT ... ON CONFLICT (sku) DO UPDATE), or else on
+# product + attributes. Images are only attached to variants the import creates, so
+# image_filenames is optional in this mode.
+#
+# Uploads are first spooled to a staging directory (settings.bulk_import_dir, outside
+# the public media mount and shared with the Celery worker), so the worker receives
+# file paths instead of file contents.
+
+UPLOAD_DIR = "media/uploads"
+ERROR_DIR = "media/errors"
+CSV_NAME = "products.csv"
+COPY_BUFFER_SIZE = 1024 * 1024
+
+REQUIRED_FIELDS = ["product_name", "brand", "is_feature", "category_id", "description",
+                   "price", "stock", "attributes", "image_filenames"]
+UPSERT_REQUIRED_FIELDS = [field for field in REQUIRED_FIELDS if field != "image_filenames"]
+# Product columns an upsert overwrites, price and stock live on the variants
+PRODUCT_FIELDS = ["product_name", "brand", "is_feature", "category_id", "description"]
+VARIANT_FIELDS = ["price", "stock", "discount", "shipping_time", "attributes"]
+# Failed rows echoed back in the API response, all of them go to the error CSV
+SAMPLE_ERRORS = 5
+
+
+class ImportResult(NamedTuple):
+    success_count: int
+    error_count: int
+    error_file: Optional[str]
+    sample_errors: List[dict]
+
+
+class ValidationReport(NamedTuple):
+    rows: int
+    valid_rows: int
+    products: int
+    errors: List[dict]  # {"row", "product_name", "error"} for every row the import would reject
+    warnings: List[dict]  # rows the import accepts but that are probably mistakes
+    error_file: Optional[str]
+
+
+class StagedUpload(NamedTuple):
+    directory: str
+    image_paths: Dict[str, str]  # uploaded file name -> path of the spooled copy
+
+
+def _copy(source: BinaryIO, path: str):
+    with open(path, "wb") as f:
+        shutil.copyfileobj(source, f, COPY_BUFFER_SIZE)
+
+
+def stage_upload(csv_file: BinaryIO, images: Mapping[str, BinaryIO]) -> StagedUpload:
+    """Spool the CSV and the images to a fresh staging directory, without holding any of them in memory."""
+    directory = os.path.join(settings.bulk_import_dir, uuid4().hex)
+    os.makedirs(directory)
+    try:
+        _copy(csv_file, os.path.join(directory, CSV_NAME))
+        image_paths = {}
+        for position, (name, source) in enumerate(images.items()):
+            # the upload name only ever goes into the mapping, never into a path
+            path = os.path.join(directory, f"image_{position}")
+            _copy(source, path)
+            image_paths[name] = path
+    except BaseException:
+        shutil.rmtree(directory, ignore_errors=True)
+        raise
+    return StagedUpload(directory, image_paths)
+
+
+def parse_row(row: dict, required: List[str] = REQUIRED_FIELDS) -> dict:
+    """Typed values of one CSV row; raises ValueError with the message that goes into the error CSV."""
+    for field in required:
+        if not row.get(field):
+            raise ValueError(f"Missing required field '{field}'")
+    attributes = loads(row["attributes"])
+    if not isinstance(attributes, dict):
+        raise ValueError("attributes must be a JSON object")
+    return {
+        "product_name": row["product_name"].strip(),
+        "brand": row["brand"].strip(),
+        "is_feature": row["is_feature"].lower() == "true",
+        "category_id": int(row["category_id"]),
+        "description": row["description"].strip(),
+        "price": float(row["price"]),
+        "stock": int(row["stock"]),
+        "discount": int(row.get("discount") or 0),
+        "shipping_time": int(row.get("shipping_time") or 0),
+        "attributes": attributes,
+        "image_filenames": [name.strip() for name in (row.get("image_filenames") or "").split(",") if name.strip()],
+        "sku": (row.get("sku") or "").strip() or None,
+        "variant_sku": (row.get("variant_sku") or "").strip() or None,
+    }
+
+
+def product_key(item: dict):
+    """The caller's SKU, or (product_name, category_id) for rows without one."""
+    return item["sku"] or (item["product_name"], item["category_id"])
+
+
+def attributes_key(attributes: Optional[dict]) -> tuple:
+    """Order-insensitive form of a variant's attributes, to match variants without a SKU."""
+    return tuple(sorted((str(name), str(value)) for name, value in (attributes or {}).items()))
+
+
+def _row_number(index: int) -> int:
+    # as shown by a spreadsheet, the header is row 1
+    return index + 2
+
+
+def _error_file_path() -> str:
+    os.makedirs(ERROR_DIR, exist_ok=True)
+    return os.path.join(ERROR_DIR, f"errors_{uuid4().hex[:6]}.csv")
+
+
+def store_image(name: str, source_path: str) -> str:
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    filename = f"{uuid4().hex[:6]}_{os.path.basename(name)}"
+    shutil.copyfile(source_path, os.path.join(UPLOAD_DIR, filename))
+    return f"/media/uploads/{filename}"
+
+
+class _ErrorLog:
+    """Failed rows, written to the error CSV as they come in."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.count = 0
+        self.path = path
+        self.samples = []
+        self._file = None
+        self._writer = None
+
+    def add(self, fieldnames: List[str], row: dict, message: str):
+        row = {**row, "error": message}
+        if self._writer is None:
+            if self.path is None:
+                self.path = _error_file_path()
+            self._file = open(self.path, "w", newline="", encoding="utf-8")
+            self._writer = csv.DictWriter(self._file, fieldnames=fieldnames + ["error"])
+            self._writer.writeheader()
+        self._writer.writerow(row)
+        self.count += 1
+        if len(self.samples) < SAMPLE_ERRORS:
+            self.samples.append(row)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+class _Validator:
+    def __init__(self, category_ids: set, images: Collection[str], mode: ImportMode = ImportMode.create):
+        self.category_ids = category_ids
+        self.images = images
+        self.mode = mode
+        self.required = UPSERT_REQUIRED_FIELDS if mode == ImportMode.upsert else REQUIRED_FIELDS
+        self.variant_skus = {}  # variant_sku -> index of the row that uses it
+
+    def validate(self, rows: list):
+        valid, errors = [], []
+        for index, row in rows:
+            try:
+                item = parse_row(row, self.required)
+            except Exception as e:
+                errors.append((index, str(e)))
+                continue
+            missing = [name for name in item["image_filenames"] if name not in self.images]
+            first = self.variant_skus.setdefault(item["variant_sku"], index) if item["variant_sku"] else index
+            if item["category_id"] not in self.category_ids:
+                errors.append((index, f"Category ID {item['category_id']} does not exist"))
+            elif missing:
+                errors.append((index, f"Image file '{missing[0]}' not found in upload"))
+            elif first != index:
+                errors.append((index, f"variant_sku '{item['variant_sku']}' is already used by row {_row_number(first)}"))
+            else:
+                valid.append((index, item))
+        return valid, errors
+
+
+class _Importer(_Validator):
+    def __init__(self, db: Session, admin_id: int, images: Mapping[str, str], mode: ImportMode = ImportMode.create):
+        super().__init__(set(db.scalars(select(Category.id))), images, mode)
+        self.db = db
+        self.admin_id = admin_id
+        self.upsert = mode == ImportMode.upsert
+        self.image_urls = {}  # image name -> url, each uploaded image is stored once per import
+        self.product_ids = {}  # product key -> id of a committed product
+
+    def image_url(self, name: str) -> str:
+        if name not in self.image_urls:
+            self.image_urls[name] = store_image(name, self.images[name])
+        return self.image_urls[name]
+
+    def create_products(self, new_products: dict) -> dict:
+        """(product_name, category_id) -> id of the products of `new_products`, inserting them."""
+        products = Product.__table__
+        rows = self.db.execute(products.insert().returning(products.c.id, products.c.sku), list(new_products.values()))
+        ids_by_sku = {row.sku: row.id for row in rows}
+        return {key: ids_by_sku[values["sku"]] for key, values in new_products.items()}
+
+    def products_by_sku(self, new_products: dict) -> dict:
+        """sku -> product id for products with a caller-supplied SKU; an existing product is updated in upsert mode and reused as is otherwise."""
+        products = Product.__table__
+        insert = dialect_insert(self.db)
+        stmt = insert(products)
+        if self.upsert:
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[products.c.sku],
+                set_={**{name: stmt.excluded[name] for name in PRODUCT_FIELDS}, "updated_at": func.now()},
+            )
+        else:
+            stmt = stmt.on_conflict_do_nothing(index_elements=[products.c.sku])
+        # sorted, so chunks running in parallel lock the rows in the same order
+        rows = self.db.execute(stmt.returning(products.c.id, products.c.sku), [new_products[sku] for sku in sorted(new_products)])
+        ids = {row.sku: row.id for row in rows}
+        existing = [sku for sku in new_products if sku not in ids]
+        if existing:
+            rows = self.db.execute(select(products.c.sku, products.c.id).where(products.c.sku.in_(existing)))
+            ids.update({row.sku: row.id for row in rows})
+        return ids
+
+    def update_products(self, new_products: dict) -> dict:
+        """Upsert mode: (product_name, category_id) -> id of the products that already exist, updated in place."""
+        products = Product.__table__
+        rows = self.db.execute(
+            select(products.c.id, products.c.product_name, products.c.category_id)
+            .where(tuple_(products.c.product_name, products.c.category_id).in_(list(new_products)))
+            .order_by(products.c.id)
+        )
+        found = {}
+        for row in rows:
+            # the oldest product wins should earlier imports have created duplicates
+            found.setdefault((row.product_name, row.category_id), row.id)
+        if found:
+            self.db.execute(
+                products.update()
+                .where(products.c.id == bindparam("product_id"))
+                .values(
+                    brand=bindparam("new_brand"),
+                    description=bindparam("new_description"),
+                    is_feature=bindparam("new_is_feature"),
+                    updated_at=func.now(),
+                ),
+                [
+                    {
+                        "product_id": product_id,
+                        "new_brand": new_products[key]["brand"],
+                        "new_description": new_products[key]["description"],
+                        "new_is_feature": new_products[key]["is_feature"],
+                    }
+                    for key, product_id in sorted(found.items(), key=lambda entry: entry[1])
+                ],
+            )
+        return found
+
+    def resolve_products(self, chunk: list) -> dict:
+        """Product key -> id for the keys of `chunk` not seen in earlier chunks, creating (or updating) the products."""
+        new_products = {}
+        for _, item in chunk:
+            key = product_key(item)
+            if key not in self.product_ids and key not in new_products:
+                new_products[key] = {
+                    "sku": item["sku"] or str(uuid4()),
+                    **{name: item[name] for name in PRODUCT_FIELDS},
+                    "admin_id": self.admin_id,
+                }
+        with_sku = {key: values for key, values in new_products.items() if isinstance(key, str)}
+        natural = {key: values for key, values in new_products.items() if not isinstance(key, str)}
+        resolved = self.products_by_sku(with_sku) if with_sku else {}
+        if natural and self.upsert:
+            resolved.update(self.update_products(natural))
+        natural = {key: values for key, values in natural.items() if key not in resolved}
+        if natural:
+            resolved.update(self.create_products(natural))
+        return resolved
+
+    def insert_variants(self, variants: list) -> List[int]:
+        table = ProductVariant.__table__
+        return self.db.scalars(table.insert().returning(table.c.id, sort_by_parameter_order=True), variants).all()
+
+    def upsert_variants(self, chunk: list, variants: list) -> list:
+        """Upsert mode: update the variants that already exist, insert the others. Returns (variant id, item) of the inserted ones."""
+        table = ProductVariant.__table__
+        created = []
+        with_sku = sorted(
+            ((item, values) for (_, item), values in zip(chunk, variants) if values["sku"]),
+            key=lambda entry: entry[1]["sku"],
+        )
+        if with_sku:
+            skus = [values["sku"] for _, values in with_sku]
+            existing = set(self.db.scalars(select(table.c.sku).where(table.c.sku.in_(skus))))
+            insert = dialect_insert(self.db)
+            stmt = insert(table)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[table.c.sku],
+                # a variant named by its SKU is back in the feed, so it is listed again
+                set_={
+                    **{name: stmt.excluded[name] for name in ["product_id", *VARIANT_FIELDS]},
+                    "is_archived": False,
+                    "updated_at": func.now(),
+                },
+            )
+            rows = self.db.execute(stmt.returning(table.c.sku, table.c.id), [values for _, values in with_sku])
+            ids = {row.sku: row.id for row in rows}
+            created += [(ids[values["sku"]], item) for item, values in with_sku if values["sku"] not in existing]
+
+        without_sku = [(item, values) for (_, item), values in zip(chunk, variants) if not values["sku"]]
+        if without_sku:
+            current = {}
+            rows = self.db.execute(
+                select(table.c.id, table.c.product_id, table.c.attributes)
+                .where(table.c.product_id.in_({values["product_id"] for _, values in without_sku}), table.c.is_archived == False)
+                .order_by(table.c.id)
+            )
+            for row in rows:
+                current.setdefault((row.product_id, attributes_key(row.attributes)), row.id)
+            updates, inserts = [], []
+            for item, values in without_sku:
+                variant_id = current.get((values["product_id"], attributes_key(values["attributes"])))
+                if variant_id is None:
+                    inserts.append((item, values))
+                else:
+                    updates.append({"variant_id": variant_id, **{f"new_{name}": values[name] for name in VARIANT_FIELDS}})
+            if updates:
+                self.db.execute(
+                    table.update()
+                    .where(table.c.id == bindparam("variant_id"))
+                    .values(**{name: bindparam(f"new_{name}") for name in VARIANT_FIELDS}, updated_at=func.now()),
+                    sorted(updates, key=lambda values: values["variant_id"]),
+                )
+            if inserts:
+                ids = self.insert_variants([values for _, values in inserts])
+                created += [(variant_id, item) for variant_id, (item, _) in zip(ids, inserts)]
+        return created
+
+    def insert_chunk(self, chunk: list) -> dict:
+        """Write one chunk of validated rows and return the products it resolved. The caller commits."""
+        resolved = self.resolve_products(chunk)
+        product_ids = {**self.product_ids, **resolved}
+
+        variants = [
+            {
+                "product_id": product_ids[product_key(item)],
+                "sku": item["variant_sku"],
+                **{name: item[name] for name in VARIANT_FIELDS},
+            }
+            for _, item in chunk
+        ]
+        if self.upsert:
+            created = self.upsert_variants(chunk, variants)
+        else:
+            created = list(zip(self.insert_variants(variants), (item for _, item in chunk)))
+
+        images = [
+            {"variant_id": variant_id, "image_url": self.image_url(name)}
+            for variant_id, item in created
+            for name in item["image_filenames"]
+        ]
+        if images:
+            self.db.execute(ProductImage.__table__.insert(), images)
+
+        touched = {values["product_id"] for values in variants}
+        refresh_price_range(self.db, touched)
+        sync_product_attributes(self.db, touched)
+        return resolved
+
+    def write_rows(self, rows: list, failed: list) -> int:
+        """
+        Write validated rows in a SAVEPOINT. When the database rejects them the savepoint is rolled
+        back and each half is written again, down to single rows, so only the offending rows are
+        added to `failed`. Returns the number of rows written; the caller commits.
+        """
+        savepoint = self.db.begin_nested()
+        try:
+            resolved = self.insert_chunk(rows)
+            savepoint.commit()
+        except Exception as e:
+            savepoint.rollback()
+            if len(rows) == 1:
+                failed.append((rows[0][0], str(e)))
+                return 0
+            middle = len(rows) // 2
+            return self.write_rows(rows[:middle], failed) + self.write_rows(rows[middle:], failed)
+        # later rows of the chunk reuse these products; write_chunk forgets them if the chunk rolls back
+        self.product_ids.update(resolved)
+        return len(rows)
+
+    def write_chunk(self, rows: list, on_commit: Optional[Callable[[int, list], None]] = None):
+        """
+        Validate and write one chunk of (index, row) pairs and commit it. `on_commit(imported, failed)`
+        runs inside the chunk's transaction. Returns (imported, sorted list of (index, error)).
+        A row the database rejects fails the chunk's statements, the chunk is then written again
+        with write_rows so the other rows still go in.
+        """
+        valid, failed = self.validate(rows)
+        if valid:
+            try:
+                created = self.insert_chunk(valid)
+                if on_commit:
+                    on_commit(len(valid), sorted(failed))
+                self.db.commit()
+            except Exception:
+                self.db.rollback()
+            else:
+                self.product_ids.update(created)
+                return len(valid), sorted(failed)
+
+            known = dict(self.product_ids)
+            rejected = list(failed)
+            try:
+                # The enclosing savepoint also opens the transaction on SQLite, where pysqlite only
+                # begins one before DML and releasing the first inner savepoint would commit it
+                with self.db.begin_nested():
+                    imported = self.write_rows(valid, rejected)
+                    if on_commit:
+                        on_commit(imported, sorted(rejected))
+                self.db.commit()
+            except Exception as e:
+                self.db.rollback()
+                self.product_ids = known
+                failed.extend((index, str(e)) for index, _ in valid)
+            else:
+                return imported, sorted(rejected)
+        if on_commit:
+            on_commit(0, sorted(failed))
+            self.db.commit()
+        return 0, sorted(failed)
+
+
+def _chunks(reader, size: int):
+    chunk = []
+    for index, row in enumerate(reader):
+        chunk.append((index, row))
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def import_products(
+    db: Session,
+    lines: Iterable[str],
+    images: Mapping[str, str],
+    admin_id: int,
+    chunk_size: Optional[int] = None,
+    mode: ImportMode = ImportMode.create,
+) -> ImportResult:
+    """
+    Import a product CSV. `lines` may be an open text file, it is consumed one chunk at a time.
+    `images` maps the uploaded file names to the paths of their staged copies.
+    """
+    chunk_size = chunk_size or settings.bulk_import_chunk_size
+    reader = csv.DictReader(lines)
+    importer = _Importer(db, admin_id, images, mode)
+    errors = _ErrorLog()
+    success_count = 0
+    try:
+        for rows in _chunks(reader, chunk_size):
+            imported, failed = importer.write_chunk(rows)
+            success_count += imported
+            by_index = dict(rows)
+            for index, message in failed:
+                errors.add(reader.fieldnames, by_index[index], message)
+    finally:
+        errors.close()
+    return ImportResult(success_count, errors.count, errors.path, errors.samples)
+
+
+def import_staged(
+    db: Session,
+    directory: str,
+    image_paths: Mapping[str, str],
+    admin_id: int,
+    mode: ImportMode = ImportMode.create,
+) -> ImportResult:
+    """import_products() over a staged upload, the staging directory is removed afterwards."""
+    try:
+        with open(os.path.join(directory, CSV_NAME), newline="", encoding="utf-8") as csv_file:
+            return import_products(db, csv_file, image_paths, admin_id, mode=mode)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def validate_upload(
+    csv_file: BinaryIO,
+    image_names: Collection[str],
+    category_ids: set,
+    mode: ImportMode = ImportMode.create,
+) -> ValidationReport:
+    """
+    Dry run: check a whole product CSV the way the import would (required fields, numbers,
+    attributes JSON, categories, images) plus duplicate product keys, in one streaming pass
+    and without writing anything. `category_ids` are the existing categories.
+    """
+    validator = _Validator(category_ids, set(image_names), mode)
+    text = io.TextIOWrapper(csv_file, encoding="utf-8", newline="")
+    reader = csv.DictReader(text)
+    error_log = _ErrorLog()
+    errors, warnings = [], []
+    products = {}  # product key -> (row, *PRODUCT_FIELDS) of its first row
+    variants = {}  # (product key, attributes) -> row
+    total = valid_count = 0
+    try:
+        for rows in _chunks(reader, settings.bulk_import_chunk_size):
+            total += len(rows)
+            valid, failed = validator.validate(rows)
+            valid_count += len(valid)
+            by_index = dict(rows)
+            for index, message in failed:
+                row = by_index[index]
+                errors.append({"row": _row_number(index), "product_name": row.get("product_name"), "error": message})
+                error_log.add(reader.fieldnames, row, message)
+
+            for index, item in valid:
+                number = _row_number(index)
+                key = product_key(item)
+                fields = tuple(item[name] for name in PRODUCT_FIELDS)
+                first = products.setdefault(key, (number, *fields))
+                if first[1:] != fields:
+                    warnings.append({
+                        "row": number, "product_name": item["product_name"],
+                        "warning": f"product fields differ from row {first[0]}, the values of row {first[0]} are used",
+                    })
+                if item["variant_sku"]:
+                    continue  # duplicates are errors, reported by the validator
+                duplicate_of = variants.setdefault((key, attributes_key(item["attributes"])), number)
+                if duplicate_of != number:
+                    consequence = "it overwrites that variant" if mode == ImportMode.upsert else "a duplicate variant would be created"
+                    warnings.append({
+                        "row": number, "product_name": item["product_name"],
+                        "warning": f"same product and attributes as row {duplicate_of}, {consequence}",
+                    })
+    finally:
+        error_log.close()
+        text.detach()
+    return ValidationReport(total, valid_count, len(products), errors, warnings, error_log.path)
+
+
+# ---- chunked jobs (Celery) ----
+#
+# start_bulk_import splits the staged CSV into chunk files, a chord of import_bulk_chunk
+# tasks writes them on any number of workers and finish_bulk_import merges the error
+# files. Each chunk commits its rows, its ImportChunk marker and the job counters in one
+# transaction, so re-running a job (a redelivered task, or /bulk-upload/{id}/resume
+# after a crash) only redoes the chunks that never committed.
+
+
+def _chunk_path(directory: str, index: int) -> str:
+    return os.path.join(directory, f"chunk_{index}.csv")
+
+
+def _chunk_errors_path(directory: str, index: int) -> str:
+    return os.path.join(directory, f"errors_{index}.csv")
+
+
+def split_upload(directory: str, chunk_size: int):
+    """Split the staged CSV into chunk files of `chunk_size` rows. Returns (rows, chunks)."""
+    total_rows = chunk_count = 0
+    out = writer = None
+    with open(os.path.join(directory, CSV_NAME), newline="", encoding="utf-8") as source:
+        reader = csv.reader(source)
+        header = next(reader, None)
+        try:
+            for row in reader:
+                if total_rows % chunk_size == 0:
+                    if out is not None:
+                        out.close()
+                    out = open(_chunk_path(directory, chunk_count), "w", newline="", encoding="utf-8")
+                    writer = csv.writer(out)
+                    writer.writerow(header)
+                    chunk_count += 1
+                writer.writerow(row)
+                total_rows += 1
+        finally:
+            if out is not None:
+                out.close()
+    return total_rows, chunk_count
+
+
+def prepare_job(db: Session, job_id: str) -> List[int]:
+    """Split the job's upload on its first run; returns the indexes of the chunks still to import."""
+    job = db.get(ImportJob, job_id)
+    if job.chunk_count is None:
+        job.total_rows, job.chunk_count = split_upload(job.directory, settings.bulk_import_chunk_size)
+        job.started_at = datetime.now(timezone.utc)
+    job.status = ImportStatus.running
+    job.error = None
+    db.commit()
+    done = set(db.scalars(select(ImportChunk.chunk_index).where(ImportChunk.job_id == job_id)))
+    return [index for index in range(job.chunk_count) if index not in done]
+
+
+class _JobImporter(_Importer):
+    def __init__(self, db: Session, job: ImportJob):
+        super().__init__(db, job.admin_id, job.image_paths, job.mode)
+        self.job_id = job.id
+
+    def create_products(self, new_products: dict) -> dict:
+        # Claim the keys first (in a fixed order, so concurrent chunks cannot deadlock). A key
+        # another chunk holds makes this INSERT wait for that chunk's commit, then its product is reused.
+        claims = ImportJobProduct.__table__
+        keys = sorted(new_products)
+        insert = dialect_insert(self.db)
+        claimed = self.db.execute(
+            insert(claims)
+            .values([{"job_id": self.job_id, "product_name": name, "category_id": category_id} for name, category_id in keys])
+            .on_conflict_do_nothing()
+            .returning(claims.c.product_name, claims.c.category_id)
+        )
+        claimed = {(row.product_name, row.category_id) for row in claimed}
+
+        created = super().create_products({key: new_products[key] for key in keys if key in claimed}) if claimed else {}
+        if created:
+            self.db.execute(
+                claims.update()
+                .where(
+                    claims.c.job_id == self.job_id,
+                    claims.c.product_name == bindparam("name"),
+                    claims.c.category_id == bindparam("category"),
+                )
+                .values(product_id=bindparam("product_id")),
+                [{"name": name, "category": category_id, "product_id": pid} for (name, category_id), pid in created.items()],
+            )
+        others = [key for key in keys if key not in claimed]
+        if others:
+            rows = self.db.execute(
+                select(claims.c.product_name, claims.c.category_id, claims.c.product_id)
+                .where(claims.c.job_id == self.job_id, tuple_(claims.c.product_name, claims.c.category_id).in_(others))
+            )
+            created.update({(row.product_name, row.category_id): row.product_id for row in rows})
+        return created
+
+
+def import_job_chunk(db: Session, job_id: str, index: int) -> dict:
+    """Import one chunk of a job; a chunk that already committed is skipped."""
+    finished = db.get(ImportChunk, (job_id, index))
+    if finished is not None:
+        return {"chunk": index, "rows_done": finished.rows_done, "rows_failed": finished.rows_failed, "skipped": True}
+
+    job = db.get(ImportJob, job_id)
+    importer = _JobImporter(db, job)
+
+    with open(_chunk_path(job.directory, index), newline="", encoding="utf-8") as chunk_file:
+        reader = csv.DictReader(chunk_file)
+        rows = list(enumerate(reader))
+
+    def record(imported: int, failed: list):
+        # the error file is (re)written before the commit, so a committed chunk always has it
+        errors_path = _chunk_errors_path(job.directory, index)
+        if os.path.exists(errors_path):
+            os.remove(errors_path)
+        errors = _ErrorLog(errors_path)
+        try:
+            by_index = dict(rows)
+            for row_index, message in failed:
+                errors.add(reader.fieldnames, by_index[row_index], message)
+        finally:
+            errors.close()
+        db.add(ImportChunk(job_id=job_id, chunk_index=index, rows_done=imported, rows_failed=len(failed)))
+        db.execute(
+            update(ImportJob)
+            .where(ImportJob.id == job_id)
+            .values(rows_done=ImportJob.rows_done + imported, rows_failed=ImportJob.rows_failed + len(failed))
+            .execution_options(synchronize_session=False)
+        )
+
+    imported, failed = importer.write_chunk(rows, on_commit=record)
+    return {"chunk": index, "rows_done": imported, "rows_failed": len(failed), "skipped": False}
+
+
+def finish_job(db: Session, job_id: str) -> ImportJob:
+    """Merge the chunk error files into one error CSV, mark the job completed and drop the staging directory."""
+    job = db.get(ImportJob, job_id)
+    parts = [path for path in (_chunk_errors_path(job.directory, i) for i in range(job.chunk_count or 0)) if os.path.exists(path)]
+    if parts:
+        job.error_file = _error_file_path()
+        with open(job.error_file, "w", newline="", encoding="utf-8") as out:
+            for position, part in enumerate(parts):
+                with open(part, newline="", encoding="utf-8") as f:
+                    header = f.readline()
+                    if position == 0:
+                        out.write(header)
+                    shutil.copyfileobj(f, out, COPY_BUFFER_SIZE)
+    job.status = ImportStatus.completed
+    job.finished_at = datetime.now(timezone.utc)
+    db.execute(delete(ImportJobProduct).where(ImportJobProduct.job_id == job_id))
+    db.commit()
+    shutil.rmtree(job.directory, ignore_errors=True)
+    return job
+
+
+def fail_job(db: Session, job_id: str, error: str):
+    """Mark the job failed. Committed chunks stay, so /bulk-upload/{id}/resume picks up the rest."""
+    db.rollback()
+    db.execute(update(ImportJob).where(ImportJob.id == job_id).values(status=ImportStatus.failed, error=error))
+    db.commit()
+
+
+def job_progress(db: Session, job: ImportJob) -> dict:
+    processed = job.rows_done + job.rows_failed
+    eta = None
+    if job.status == ImportStatus.running and job.started_at and job.total_rows and processed:
+        started_at = job.started_at if job.started_at.tzinfo else job.started_at.replace(tzinfo=timezone.utc)
+        elapsed = (datetime.now(timezone.utc) - started_at).total_seconds()
+        eta = round(elapsed / processed * (job.total_rows - processed), 1)
+    chunks_done = db.scalar(select(func.count()).select_from(ImportChunk).where(ImportChunk.job_id == job.id))
+    return {
+        "task_id": job.id,
+        "status": job.status.value,
+        "total_rows": job.total_rows,
+        "rows_done": job.rows_done,
+        "rows_failed": job.rows_failed,
+        "chunks_done": chunks_done,
+        "chunk_count": job.chunk_count,
+        "percent": round(100 * processed / job.total_rows, 1) if job.total_rows else None,
+        "eta_seconds": eta,
+        "error_file": job.error_file,
+        "error": job.error,
+    }
@@ -0,0 +1,336 @@
+import json, logging, threading, time
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+from typing import Any, Callable, Optional
+from app.config import settings
+from app.serialization import dumps
+
+try:
+    import redis
+except ImportError:  # only needed for cache_backend = "redis"
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+# What a backend raises when it cannot be reached
+BACKEND_ERRORS = (redis.RedisError, OSError) if redis is not None else (OSError,)
+
+# Cache for hot, rarely changing storefront reads (featured products, category lists,
+# brands, enabled payment methods, website logo, catalog facets).
+#
+# Keys are tuples whose first element is a namespace. Every namespace has a version
+# counter in the backend and the version is part of the stored key, so
+# invalidate(<namespace>) is a single INCR: old entries become unreachable and
+# expire on their own. Workers keep the versions in memory for a few seconds and
+# drop them as soon as an invalidation is published, so an admin edit shows up in
+# every uvicorn worker (and the Celery worker) right away.
+#
+# Values are stored as JSON, so loaders must return plain data, never ORM instances.
+#
+# The cache is never the reason a request fails: when the backend is unreachable, reads
+# call their loader directly (and skip the backend for RETRY_AFTER seconds instead of
+# waiting on it every time), and a failed invalidation is logged, leaving the stale
+# entries to expire with their TTL.
+
+# Namespaces
+FEATURED_PRODUCTS = "featured_products"
+BRANDS = "brands"
+CATEGORIES = "categories"
+PAYMENT_METHODS = "payment_methods"
+WEBSITE_LOGO = "website_logo"
+CATALOG_FACETS = "catalog_facets"
+ALL_NAMESPACES = (FEATURED_PRODUCTS, BRANDS, CATEGORIES, PAYMENT_METHODS, WEBSITE_LOGO, CATALOG_FACETS)
+# Product writes change everything derived from the products table
+PRODUCT_NAMESPACES = (FEATURED_PRODUCTS, BRANDS, CATALOG_FACETS)
+
+INVALIDATION_CHANNEL = "cache:invalidate"
+
+
+class MemoryBackend:
+    """Process-local stand-in for RedisBackend: bounded LRU with per-key TTL. Used for single worker runs and tests."""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._counters = {}
+        self._subscribers = defaultdict(list)
+
+    def _live(self, key: str, now: float):
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] <= now:
+            del self._entries[key]
+            return None
+        return entry
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._live(key, time.monotonic())
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, value: bytes, ttl: float):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def add(self, key: str, value: bytes, ttl: float) -> bool:
+        """SET NX: False when the key already exists."""
+        with self._lock:
+            if self._live(key, time.monotonic()) is not None:
+                return False
+            self._entries[key] = (time.monotonic() + ttl, value)
+            return True
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def get_counter(self, key: str) -> int:
+        with self._lock:
+            return self._counters.get(key, 0)
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def publish(self, channel: str, message: str):
+        for callback in list(self._subscribers[channel]):
+            callback(message)
+
+    def subscribe(self, channel: str, callback: Callable[[str], None]):
+        self._subscribers[channel].append(callback)
+
+    def info(self) -> dict:
+        with self._lock:
+            return {"backend": "memory", "entries": len(self._entries), "max_entries": self.max_entries, "evictions": self.evictions}
+
+
+class RedisBackend:
+    """Shared backend for multi-worker deployments, reuses the Redis that Celery already needs."""
+
+    def __init__(self, url: str):
+        if redis is None:
+            raise RuntimeError("cache_backend 'redis' requires the redis package")
+        self.url = url
+        self.client = redis.Redis.from_url(url)
+        self._listener = None
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(key)
+
+    def set(self, key: str, value: bytes, ttl: float):
+        self.client.set(key, value, px=int(ttl * 1000))
+
+    def add(self, key: str, value: bytes, ttl: float) -> bool:
+        return bool(self.client.set(key, value, px=int(ttl * 1000), nx=True))
+
+    def delete(self, key: str):
+        self.client.delete(key)
+
+    def get_counter(self, key: str) -> int:
+        value = self.client.get(key)
+        return int(value) if value is not None else 0
+
+    def incr(self, key: str) -> int:
+        return self.client.incr(key)
+
+    def publish(self, channel: str, message: str):
+        self.client.publish(channel, message)
+
+    def subscribe(self, channel: str, callback: Callable[[str], None]):
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(**{channel: lambda message: callback(message["data"].decode())})
+        self._listener = pubsub.run_in_thread(sleep_time=1.0, daemon=True)
+
+    def info(self) -> dict:
+        return {"backend": "redis", "url": self.url}
+
+
+class Cache:
+    # Local copy of the namespace versions; pub/sub normally refreshes them much sooner
+    VERSION_TTL = 5.0
+    # Upper bound for one recompute; other callers wait for it at most this long
+    LOCK_TTL = 10.0
+    LOCK_POLL_INTERVAL = 0.05
+    # After a backend error, reads bypass the backend for this long
+    RETRY_AFTER = 5.0
+
+    def __init__(self, backend, default_ttl: float = 300.0, prefix: str = "cache"):
+        self.backend = backend
+        self.default_ttl = default_ttl
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._versions = {}  # namespace -> (checked_at, version)
+        self._flights = {}  # storage key -> threading.Lock
+        self._stats = defaultdict(lambda: {"hits": 0, "misses": 0, "coalesced": 0, "invalidations": 0, "errors": 0})
+        self._subscribed = False
+        self._down_until = 0.0
+
+    def _subscribe(self):
+        # lazily, so importing the module never opens a connection
+        if self._subscribed:
+            return
+        with self._lock:
+            if self._subscribed:
+                return
+            try:
+                self.backend.subscribe(INVALIDATION_CHANNEL, self._on_invalidate)
+            except Exception:
+                logger.exception("Cache invalidation subscription failed, falling back to version polling")
+            self._subscribed = True
+
+    def _on_invalidate(self, message: str):
+        for namespace in json.loads(message):
+            self._versions.pop(namespace, None)
+
+    def _version_key(self, namespace: str) -> str:
+        return f"{self.prefix}:version:{namespace}"
+
+    def _version(self, namespace: str) -> int:
+        now = time.monotonic()
+        cached = self._versions.get(namespace)
+        if cached and now - cached[0] < self.VERSION_TTL:
+            return cached[1]
+        version = self.backend.get_counter(self._version_key(namespace))
+        self._versions[namespace] = (now, version)
+        return version
+
+    def _storage_key(self, key: tuple) -> str:
+        namespace = key[0]
+        parts = ":".join(str(part) for part in key[1:])
+        return f"{self.prefix}:{namespace}:v{self._version(namespace)}:{parts}"
+
+    def _read(self, storage_key: str):
+        raw = self.backend.get(storage_key)
+        if raw is None:
+            return False, None
+        return True, json.loads(raw)
+
+    @contextmanager
+    def _single_flight(self, storage_key: str):
+        with self._lock:
+            lock = self._flights.setdefault(storage_key, threading.Lock())
+        with lock:
+            try:
+                yield
+            finally:
+                with self._lock:
+                    if self._flights.get(storage_key) is lock:
+                        del self._flights[storage_key]
+
+    def _backend_failed(self, namespace: str, action: str, error: Exception):
+        self._down_until = time.monotonic() + self.RETRY_AFTER
+        self._stats[namespace]["errors"] += 1
+        logger.warning("Cache %s failed for %s, bypassing the cache for %.0fs: %r", action, namespace, self.RETRY_AFTER, error)
+
+    @staticmethod
+    def _load(loader: Callable[[], Any]):
+        # the same plain JSON data a cache hit returns
+        return json.loads(dumps(loader()))
+
+    def get_or_set(self, key: tuple, loader: Callable[[], Any], ttl: Optional[float] = None):
+        """Cached value of `key`, computing it with `loader` at most once at a time across all workers."""
+        if time.monotonic() < self._down_until:
+            return self._load(loader)
+        self._subscribe()
+        stats = self._stats[key[0]]
+        try:
+            storage_key = self._storage_key(key)
+            found, value = self._read(storage_key)
+        except BACKEND_ERRORS as e:
+            self._backend_failed(key[0], "read", e)
+            return self._load(loader)
+        if found:
+            stats["hits"] += 1
+            return value
+        stats["misses"] += 1
+
+        # one loader per key in this process ...
+        with self._single_flight(storage_key):
+            lock_key = f"{storage_key}:lock"
+            acquired = False
+            try:
+                found, value = self._read(storage_key)
+                if found:
+                    stats["coalesced"] += 1
+                    return value
+
+                # ... and across processes: whoever takes the lock computes, the others wait for its result
+                acquired = self.backend.add(lock_key, b"1", self.LOCK_TTL)
+                if not acquired:
+                    deadline = time.monotonic() + self.LOCK_TTL
+                    while time.monotonic() < deadline:
+                        time.sleep(self.LOCK_POLL_INTERVAL)
+                        found, value = self._read(storage_key)
+                        if found:
+                            stats["coalesced"] += 1
+                            return value
+                        if self.backend.get(lock_key) is None:
+                            break
+            except BACKEND_ERRORS as e:
+                self._backend_failed(key[0], "read", e)
+                return self._load(loader)
+
+            try:
+                raw = dumps(loader())
+                try:
+                    self.backend.set(storage_key, raw, self.default_ttl if ttl is None else ttl)
+                except BACKEND_ERRORS as e:
+                    self._backend_failed(key[0], "write", e)
+                return json.loads(raw)
+            finally:
+                if acquired:
+                    try:
+                        self.backend.delete(lock_key)
+                    except BACKEND_ERRORS as e:
+                        # the lock expires after LOCK_TTL
+                        self._backend_failed(key[0], "unlock", e)
+
+    def invalidate(self, *namespaces: str):
+        """
+        Invalidate every entry of the given namespaces (all of them when called without
+        arguments), in all workers. Runs after the caller's commit, so it never raises:
+        when the backend is down the entries expire with their TTL instead.
+        """
+        namespaces = namespaces or ALL_NAMESPACES
+        now = time.monotonic()
+        for namespace in namespaces:
+            try:
+                self._versions[namespace] = (now, self.backend.incr(self._version_key(namespace)))
+            except BACKEND_ERRORS as e:
+                # re-read the versions once the backend is back
+                for name in namespaces:
+                    self._versions.pop(name, None)
+                self._backend_failed(namespace, "invalidation", e)
+                return
+            self._stats[namespace]["invalidations"] += 1
+        try:
+            self.backend.publish(INVALIDATION_CHANNEL, json.dumps(list(namespaces)))
+        except Exception:
+            # the version bump already happened, other workers pick it up within VERSION_TTL
+            logger.exception("Cache invalidation publish failed")
+
+    def stats(self) -> dict:
+        with self._lock:
+            namespaces = {name: dict(values) for name, values in self._stats.items()}
+        for values in namespaces.values():
+            lookups = values["hits"] + values["misses"]
+            values["hit_ratio"] = round(values["hits"] / lookups, 4) if lookups else None
+        return {**self.backend.info(), "namespaces": namespaces}
+
+
+def create_backend():
+    if settings.cache_backend == "redis":
+        return RedisBackend(settings.cache_redis_url)
+    return MemoryBackend(settings.cache_max_entries)
+
+
+catalog_cache = Cache(create_backend(), settings.cache_default_ttl)
@@ -0,0 +1,55 @@
+from decimal import Decimal
+from sqlalchemy.orm import Session, selectinload
+from app.models import Product, ProductVariant
+
+
+# Shared read path for every catalog listing.
+# Variants and their images are fetched with selectinload, so a page of N products
+# always costs 3 statements (products, variants IN (...), images IN (...)) instead of 1 + N + N*V.
+# Archived variants only exist for the orders that reference them and are not loaded.
+def catalog_query(db: Session):
+    return db.query(Product).options(
+        selectinload(Product.variants.and_(ProductVariant.is_archived == False)).selectinload(ProductVariant.images)
+    )
+
+
+# The serializers below produce exactly what ProductResponse / ProductVariantResponse
+# would (same keys and order, Decimal price as a string, quotes stripped from the text
+# fields), so the rows can go straight to app.responses.catalog_response.
+
+def _price(value):
+    return None if value is None else str(Decimal(str(value)))
+
+
+def _text(value):
+    return value.strip('"') if isinstance(value, str) else value
+
+
+def serialize_variant(variant: ProductVariant) -> dict:
+    return {
+        "price": _price(variant.price),
+        "stock": variant.stock,
+        "discount": variant.discount,
+        "shipping_time": variant.shipping_time,
+        "attributes": variant.attributes or {},
+        "id": variant.id,
+        "sku": variant.sku,
+        "images": [img.image_url for img in variant.images],
+    }
+
+
+def serialize_product(product: Product) -> dict:
+    return {
+        "product_name": _text(product.product_name),
+        "brand": _text(product.brand),
+        "category_id": product.category_id,
+        "description": _text(product.description),
+        "id": product.id,
+        "sku": product.sku,
+        "admin_id": product.admin_id,
+        "created_at": product.created_at,
+        "updated_at": product.updated_at,
+        "min_price": product.min_price,
+        "max_price": product.max_price,
+        "variants": [serialize_variant(v) for v in product.variants],
+    }
@@ -1,7 +1,20 @@
 from celery import Celery
+from celery.schedules import crontab
 
 celery_app = Celery(
     "worker",
     broker="redis://localhost:6379/0",
-    backend="redis://localhost:6379/0"
+    backend="redis://localhost:6379/0",
+    include=["app.tasks"]
 )
+
+celery_app.conf.beat_schedule = {
+    "refresh-product-sales-windows": {
+        "task": "refresh_product_sales_windows",
+        "schedule": crontab(hour=0, minute=5),
+    },
+    "release-expired-inventory-holds": {
+        "task": "release_expired_inventory_holds",
+        "schedule": crontab(),  # every minute
+    },
+}
@@ -17,6 +17,17 @@ class Settings(BaseSettings):
     google_client_id: str
     google_client_secret: str
     google_redirect_uri: str
+    page_size_default: int = 50
+    page_size_max: int = 200
+    cache_max_entries: int = 1024
+    cache_default_ttl: float = 300.0
+    cache_backend: str = "memory"  # "memory" (per process) or "redis" (shared by all workers)
+    cache_redis_url: str = "redis://localhost:6379/0"
+    catalog_cache_max_age: int = 30  # Cache-Control max-age of conditional catalog responses
+    bulk_import_chunk_size: int = 1000  # CSV rows written per transaction by app.bulk_import
+    bulk_import_dir: str = "imports"  # staging area for bulk uploads, must be shared with the Celery worker
+    inventory_hold_minutes: int = 30  # how long an unpaid order keeps its stock
+    inventory_hold_sweep_batch: int = 500  # expired holds released per transaction
 
 class Config:
         env_file = ".env"
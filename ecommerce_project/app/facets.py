@@ -0,0 +1,201 @@
+import json
+from collections import defaultdict
+from enum import Enum
+from typing import List, Optional
+from fastapi import HTTPException, Query
+from sqlalchemy import select, func, case, cast, literal, literal_column, union_all, String
+from sqlalchemy.orm import Session
+from app.models import Product, VariantAttribute, VariantAttributeValue
+from app.variant_attributes import parse_attribute_filters, matching_product_ids
+
+# Composable catalog filters + facet counts for /products/query.
+# Facets are "disjunctive": the counts of a dimension ignore that dimension's own
+# filter, so picking brand=Nike still shows how many products the other brands have.
+# All facets come back from a single UNION ALL statement.
+
+# Price bucket boundaries (after discount), the last bucket is open ended
+PRICE_BUCKETS = (0, 25, 50, 100, 250, 500, 1000)
+# Values returned per facet, most frequent first
+FACET_VALUE_LIMIT = 50
+# Facet counts also move with reviews, so they are only cached briefly
+FACET_CACHE_TTL = 60
+
+
+class CatalogSortEnum(str, Enum):
+    newest = "newest"
+    price_asc = "price_asc"
+    price_desc = "price_desc"
+    popularity = "popularity"
+
+
+# sort -> (keyset columns, descending)
+SORT_KEYS = {
+    CatalogSortEnum.newest: ([Product.id], True),
+    CatalogSortEnum.price_asc: ([Product.min_price, Product.id], False),
+    CatalogSortEnum.price_desc: ([Product.max_price, Product.id], True),
+    CatalogSortEnum.popularity: ([Product.units_sold, Product.id], True),
+}
+
+
+def _parse_attributes(values: Optional[List[str]]) -> dict:
+    try:
+        return parse_attribute_filters(values)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _bucket_label(index: int) -> str:
+    if index == len(PRICE_BUCKETS) - 1:
+        return f"{PRICE_BUCKETS[index]}+"
+    return f"{PRICE_BUCKETS[index]}-{PRICE_BUCKETS[index + 1]}"
+
+
+def _label(index: int):
+    # inlined rather than bound so the SELECT and GROUP BY expressions are textually identical
+    return literal_column(f"'{_bucket_label(index)}'", String)
+
+
+PRICE_BUCKET = case(
+    *[(Product.min_price < upper, _label(i)) for i, upper in enumerate(PRICE_BUCKETS[1:])],
+    else_=_label(len(PRICE_BUCKETS) - 1),
+)
+
+
+class CatalogFilters:
+    """
+    Query parameters of /products/query. Values of one dimension are OR-ed,
+    dimensions are AND-ed. Attribute filters must all hold on the same variant.
+    """
+
+    def __init__(
+        self,
+        brand: Optional[List[str]] = Query(None),
+        category_id: Optional[List[int]] = Query(None),
+        min_price: Optional[float] = Query(None, ge=0),
+        max_price: Optional[float] = Query(None, ge=0),
+        min_rating: Optional[float] = Query(None, ge=0, le=5),
+        attr: Optional[List[str]] = Query(None, description="Variant attribute as name:value, e.g. color:red. Repeatable"),
+        sort: CatalogSortEnum = Query(CatalogSortEnum.newest),
+    ):
+        self.brands = brand or []
+        self.category_ids = category_id or []
+        self.min_price = min_price
+        self.max_price = max_price
+        self.min_rating = min_rating
+        self.attributes = _parse_attributes(attr)
+        self.sort = sort
+
+    def _attribute_condition(self, exclude: Optional[str] = None):
+        wanted = {name: values for name, values in self.attributes.items() if name != exclude}
+        if not wanted:
+            return None
+        return Product.id.in_(matching_product_ids(wanted))
+
+    def conditions(self, exclude: Optional[str] = None) -> list:
+        """WHERE clauses on Product; `exclude` drops one dimension ("brand", "category", "price" or "attr:<name>")."""
+        clauses = []
+        if self.brands and exclude != "brand":
+            clauses.append(Product.brand.in_(self.brands))
+        if self.category_ids and exclude != "category":
+            clauses.append(Product.category_id.in_(self.category_ids))
+        if exclude != "price":
+            # products whose variant price range overlaps the requested range
+            if self.min_price is not None:
+                clauses.append(Product.max_price >= self.min_price)
+            if self.max_price is not None:
+                clauses.append(Product.min_price <= self.max_price)
+        if self.min_rating:
+            clauses.append(Product.avg_rating >= self.min_rating)
+        attribute_exclude = exclude[len("attr:"):] if exclude and exclude.startswith("attr:") else None
+        attribute_condition = self._attribute_condition(attribute_exclude)
+        if attribute_condition is not None:
+            clauses.append(attribute_condition)
+        return clauses
+
+    def cache_key(self) -> str:
+        """Canonical form of the filters (sort excluded), used as the facet cache key."""
+        return json.dumps([
+            sorted(self.brands), sorted(self.category_ids), self.min_price, self.max_price, self.min_rating,
+            sorted((name, sorted(values)) for name, values in self.attributes.items()),
+        ], separators=(",", ":"))
+
+    def sort_keys(self):
+        keys, descending = SORT_KEYS[self.sort]
+        extra = []
+        if self.sort == CatalogSortEnum.price_asc:
+            extra.append(Product.min_price.isnot(None))
+        elif self.sort == CatalogSortEnum.price_desc:
+            extra.append(Product.max_price.isnot(None))
+        return keys, descending, extra
+
+
+def _facet_select(facet: str, name, value, conditions: list):
+    return (
+        select(
+            literal(facet, String).label("facet"),
+            name.label("name"),
+            value.label("value"),
+            func.count().label("count"),
+        )
+        .where(*conditions)
+        .group_by(value)
+    )
+
+
+def _attribute_facet(filters: CatalogFilters, names: list, exclude_names: list, exclude: Optional[str]):
+    name, value = VariantAttribute.name, VariantAttributeValue.value
+    conditions = [name.in_(names)] if names else []
+    if exclude_names:
+        conditions.append(name.not_in(exclude_names))
+    return (
+        select(
+            literal("attribute", String).label("facet"),
+            name.label("name"),
+            value.label("value"),
+            func.count(func.distinct(VariantAttributeValue.product_id)).label("count"),
+        )
+        .select_from(VariantAttributeValue)
+        .join(VariantAttribute, VariantAttribute.id == VariantAttributeValue.attribute_id)
+        .join(Product, Product.id == VariantAttributeValue.product_id)
+        .where(*conditions, *filters.conditions(exclude))
+        .group_by(name, value)
+    )
+
+
+def facet_counts(db: Session, filters: CatalogFilters) -> dict:
+    no_name = literal("", String)
+    branches = [
+        _facet_select("brand", no_name, Product.brand, filters.conditions("brand")),
+        _facet_select("category", no_name, cast(Product.category_id, String), filters.conditions("category")),
+        _facet_select("price", no_name, PRICE_BUCKET, [Product.min_price.isnot(None), *filters.conditions("price")]),
+    ]
+    # attributes nobody filters on share one branch; each filtered attribute ignores its own filter
+    filtered_names = sorted(filters.attributes)
+    branches.append(_attribute_facet(filters, [], filtered_names, None))
+    for name in filtered_names:
+        branches.append(_attribute_facet(filters, [name], [], f"attr:{name}"))
+
+    facets = {"brands": [], "categories": [], "price": [], "attributes": defaultdict(list)}
+    for row in db.execute(union_all(*branches)):
+        if row.value is None:
+            continue
+        entry = {"value": row.value, "count": row.count}
+        if row.facet == "brand":
+            facets["brands"].append(entry)
+        elif row.facet == "category":
+            facets["categories"].append(entry)
+        elif row.facet == "price":
+            facets["price"].append(entry)
+        else:
+            facets["attributes"][row.name].append(entry)
+
+    def top(entries):
+        return sorted(entries, key=lambda e: (-e["count"], e["value"]))[:FACET_VALUE_LIMIT]
+
+    bucket_order = {_bucket_label(i): i for i in range(len(PRICE_BUCKETS))}
+    return {
+        "brands": top(facets["brands"]),
+        "categories": top(facets["categories"]),
+        "price": sorted(facets["price"], key=lambda e: bucket_order.get(e["value"], len(bucket_order))),
+        "attributes": {name: top(entries) for name, entries in sorted(facets["attributes"].items())},
+    }
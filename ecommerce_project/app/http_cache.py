@@ -0,0 +1,125 @@
+import hashlib, json
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import NamedTuple, Optional
+from fastapi import Request, Response
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.database import dialect_insert
+from app.models import Product, ProductVariant, CatalogVersion
+
+# HTTP conditional caching for catalog reads.
+# The listing validator is one statement of indexed max() lookups over the version
+# columns (products.id/updated_at/created_at, product_variants.id/updated_at) plus
+# the catalog_version deletion counter, so a matching If-None-Match /
+# If-Modified-Since is answered with a 304 before the page is loaded or serialized,
+# without scanning the tables.
+
+
+class Validator(NamedTuple):
+    etag: str
+    last_modified: Optional[datetime]
+
+
+def _utc(value: Optional[datetime]) -> Optional[datetime]:
+    if value is None:
+        return None
+    if value.tzinfo is None:  # SQLite returns naive UTC timestamps
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).replace(microsecond=0)
+
+
+def _latest(*values) -> Optional[datetime]:
+    values = [_utc(v) for v in values if v is not None]
+    return max(values) if values else None
+
+
+def _validator(request: Request, version: list, last_modified: Optional[datetime]) -> Validator:
+    # the representation depends on the path and every query parameter (filters, cursor, limit)
+    query = sorted(request.query_params.multi_items())
+    payload = json.dumps([request.url.path, query, version], default=str, separators=(",", ":"))
+    return Validator(f'"{hashlib.sha1(payload.encode()).hexdigest()}"', last_modified)
+
+
+def _max(column):
+    return select(func.max(column)).scalar_subquery()
+
+
+def catalog_validator(db: Session, request: Request) -> Validator:
+    """Validator for listings: changes whenever any product or variant is added, changed or removed."""
+    version = db.execute(select(
+        _max(Product.id), _max(Product.updated_at), _max(Product.created_at),
+        _max(ProductVariant.id), _max(ProductVariant.updated_at),
+        select(CatalogVersion.deletions).where(CatalogVersion.id == 1).scalar_subquery(),
+    )).one()
+    last_modified = _latest(version[1], version[2], version[4])
+    return _validator(request, list(version), last_modified)
+
+
+def note_catalog_deletion(db: Session):
+    """Call in the transaction that deletes products or variants, so the listing validators change."""
+    table = CatalogVersion.__table__
+    db.execute(
+        dialect_insert(db)(table)
+        .values(id=1, deletions=1)
+        .on_conflict_do_update(index_elements=[table.c.id], set_={"deletions": table.c.deletions + 1})
+    )
+
+
+def product_validator(db: Session, request: Request, product_id: int) -> Optional[Validator]:
+    """Validator for one product and its variants, None when the product does not exist."""
+    product = db.query(Product.updated_at, Product.created_at).filter(Product.id == product_id).first()
+    if product is None:
+        return None
+    variants = (
+        db.query(func.count(ProductVariant.id), func.sum(ProductVariant.id), func.max(ProductVariant.updated_at))
+        .filter(ProductVariant.product_id == product_id)
+        .one()
+    )
+    last_modified = _latest(product.updated_at, product.created_at, variants[2])
+    return _validator(request, [product_id, *product, *variants], last_modified)
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    # If-None-Match uses the weak comparison
+    if header.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in header.split(",")]
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+def _not_modified_since(header: str, last_modified: Optional[datetime]) -> bool:
+    if last_modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return last_modified <= since
+
+
+def conditional_response(request: Request, response: Response, validator: Validator) -> Optional[Response]:
+    """
+    Set ETag / Last-Modified / Cache-Control on `response`.
+    Returns a 304 response to send instead of the body when the client copy is still current.
+    """
+    headers = {
+        "ETag": validator.etag,
+        "Cache-Control": f"public, max-age={settings.catalog_cache_max_age}",
+    }
+    if validator.last_modified is not None:
+        headers["Last-Modified"] = format_datetime(validator.last_modified, usegmt=True)
+    response.headers.update(headers)
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        fresh = _etag_matches(if_none_match, validator.etag)
+    else:
+        if_modified_since = request.headers.get("if-modified-since")
+        fresh = if_modified_since is not None and _not_modified_since(if_modified_since, validator.last_modified)
+    if fresh:
+        return Response(status_code=304, headers=headers)
+    return None
@@ -0,0 +1,373 @@
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, List, Mapping, NamedTuple, Optional, Set, Union
+from sqlalchemy import select, insert, update, delete, func, exists, cast, case, bindparam, Integer, Float
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.orm import Session, selectinload
+from app.config import settings
+from app.models import Product, ProductVariant, Order, OrderStatus, InventoryHold, Payment, PaymentLog, Refund, RefundStatus
+from app.product_stats import refresh_price_range, is_cancelled_status, is_pending_status, order_status_changed
+from app.schemas import InventoryDelta
+
+logger = logging.getLogger(__name__)
+
+# Price / stock feed for the warehouse sync.
+# Deltas address variants by id or by their SKU and carry only the fields that changed.
+# On PostgreSQL the whole feed is one UPDATE ... FROM unnest(<one array per column>)
+# RETURNING product_id: a fixed statement whatever the feed size, so thousands of
+# deltas cost one round trip instead of one (or a delete/re-create of the product)
+# each. Other databases get an executemany of single-row UPDATEs.
+
+# Variants per SKU lookup / existence check, well below SQLite's bound parameter limit
+BATCH_SIZE = 1000
+FIELDS = ("price", "stock", "discount")
+FIELD_TYPES = {"id": Integer, "price": Float, "stock": Integer, "discount": Integer}
+
+
+class InventoryResult(NamedTuple):
+    updated: int
+    not_found: List[Union[int, str]]
+    product_ids: Set[int]  # products whose variants changed
+    price_changed: bool  # price or discount, i.e. the products' min/max price may have moved
+
+
+def _batches(items: list, size: int = BATCH_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _update_postgresql(db: Session, changes: list) -> list:
+    """One UPDATE for all (variant id, changes); returns the (id, product_id) rows it changed."""
+    variants = ProductVariant.__table__
+    arrays = {
+        "id": [variant_id for variant_id, _ in changes],
+        **{name: [fields.get(name) for _, fields in changes] for name in FIELDS},
+    }
+    deltas = func.unnest(
+        *(cast(bindparam(f"{name}s", values), ARRAY(FIELD_TYPES[name])) for name, values in arrays.items())
+    ).table_valued(*arrays).render_derived(name="deltas")
+    return db.execute(
+        variants.update()
+        .where(variants.c.id == deltas.c.id)
+        .values(
+            **{name: func.coalesce(deltas.c[name], variants.c[name]) for name in FIELDS},
+            updated_at=func.now(),
+        )
+        .returning(variants.c.id, variants.c.product_id)
+    ).all()
+
+
+def _update_generic(db: Session, changes: list) -> list:
+    variants = ProductVariant.__table__
+    found = []
+    for batch in _batches(changes):
+        found += db.execute(
+            select(variants.c.id, variants.c.product_id).where(variants.c.id.in_([variant_id for variant_id, _ in batch]))
+        ).all()
+    if found:
+        fields = dict(changes)
+        db.execute(
+            variants.update()
+            .where(variants.c.id == bindparam("variant_id"))
+            .values(
+                **{name: func.coalesce(bindparam(f"new_{name}", type_=FIELD_TYPES[name]), variants.c[name]) for name in FIELDS},
+                updated_at=func.now(),
+            ),
+            [
+                {"variant_id": row.id, **{f"new_{name}": fields[row.id].get(name) for name in FIELDS}}
+                for row in sorted(found)
+            ],
+        )
+    return found
+
+
+def _variant_ids_by_sku(db: Session, skus: list) -> dict:
+    ids = {}
+    for batch in _batches(skus):
+        rows = db.execute(select(ProductVariant.sku, ProductVariant.id).where(ProductVariant.sku.in_(batch)))
+        ids.update({row.sku: row.id for row in rows})
+    return ids
+
+
+def apply_inventory_deltas(db: Session, deltas: Iterable[InventoryDelta]) -> InventoryResult:
+    """Apply a price / stock feed and commit. Unknown variant ids and SKUs are reported, not fatal."""
+    deltas = list(deltas)
+    ids_by_sku = _variant_ids_by_sku(db, sorted({delta.sku for delta in deltas if delta.variant_id is None}))
+    by_id, not_found = {}, []
+    for delta in deltas:
+        variant_id = delta.variant_id if delta.variant_id is not None else ids_by_sku.get(delta.sku)
+        if variant_id is None:
+            not_found.append(delta.sku)
+            continue
+        # a variant sent twice gets the later values
+        by_id.setdefault(variant_id, {}).update(
+            {name: getattr(delta, name) for name in FIELDS if getattr(delta, name) is not None}
+        )
+
+    # in id order, so concurrent feeds lock the rows in the same order
+    changes = sorted(by_id.items())
+    updated, product_ids = set(), set()
+    if changes:
+        update_rows = _update_postgresql if db.get_bind().dialect.name == "postgresql" else _update_generic
+        for row in update_rows(db, changes):
+            updated.add(row.id)
+            product_ids.add(row.product_id)
+    not_found.extend(variant_id for variant_id, _ in changes if variant_id not in updated)
+
+    price_changed = any("price" in fields or "discount" in fields for _, fields in changes)
+    if price_changed:
+        refresh_price_range(db, product_ids)
+    db.commit()
+    return InventoryResult(len(updated), list(dict.fromkeys(not_found)), product_ids, price_changed)
+
+
+def touches_featured(db: Session, product_ids: Set[int]) -> bool:
+    return bool(product_ids) and db.scalar(
+        select(exists().where(Product.id.in_(product_ids), Product.is_feature == True))
+    )
+
+
+# ---- stock reservation for orders ----
+#
+# An order takes its units off ProductVariant.stock when it is created and gives them back
+# when it is cancelled. The decrement is one conditional UPDATE for all the order's
+# variants, SET stock = stock - qty WHERE stock >= qty: there is no read-then-write
+# window to oversell in, a concurrent checkout that gets the row after another one
+# commits re-checks the condition against the new stock, and nothing locks the rows
+# with SELECT ... FOR UPDATE. The statement is the last one before the commit, so each
+# checkout holds the variant's row lock only for its commit and simultaneous checkouts
+# of a hot variant do not queue up behind whole transactions.
+
+
+class OutOfStock(Exception):
+    def __init__(self, variant_ids: List[int]):
+        super().__init__(f"Not enough stock for variant(s) {', '.join(map(str, variant_ids))}")
+        self.variant_ids = variant_ids
+
+
+def _quantity_case(quantities: Mapping[int, int]):
+    return case(dict(quantities), value=ProductVariant.__table__.c.id)
+
+
+def reserve_stock(db: Session, quantities: Mapping[int, int]):
+    """
+    Take {variant_id: quantity} off the stock in one statement, either all of it or nothing:
+    raises OutOfStock (the caller rolls back) when a variant has too little stock, is archived
+    or does not exist. Run it right before the commit.
+    """
+    if not quantities:
+        return
+    variants = ProductVariant.__table__
+    needed = _quantity_case(quantities)
+    reserved = set(db.scalars(
+        variants.update()
+        .where(variants.c.id.in_(sorted(quantities)), variants.c.stock >= needed, variants.c.is_archived == False)
+        .values(stock=variants.c.stock - needed)
+        .returning(variants.c.id)
+    ))
+    missing = sorted(set(quantities) - reserved)
+    if missing:
+        raise OutOfStock(missing)
+
+
+def release_stock(db: Session, quantities: Mapping[int, int]):
+    """Put {variant_id: quantity} back on the stock."""
+    if not quantities:
+        return
+    variants = ProductVariant.__table__
+    db.execute(
+        variants.update()
+        .where(variants.c.id.in_(sorted(quantities)))
+        .values(stock=variants.c.stock + _quantity_case(quantities))
+    )
+
+
+def order_quantities(items) -> dict:
+    """items: iterable of (variant_id, quantity), summed per variant."""
+    quantities = defaultdict(int)
+    for variant_id, quantity in items:
+        quantities[variant_id] += quantity
+    return dict(quantities)
+
+
+def order_stock_changed(db: Session, order: Order, old_status, new_status):
+    """Give the order's units back when it gets cancelled, take them again (or raise OutOfStock) if it is revived."""
+    if is_pending_status(old_status) and not is_pending_status(new_status):
+        drop_hold(db, order.id)
+    was_cancelled, is_cancelled = is_cancelled_status(old_status), is_cancelled_status(new_status)
+    if was_cancelled == is_cancelled:
+        return
+    quantities = order_quantities((item.variant_id, item.quantity) for item in order.order_items)
+    if is_cancelled:
+        release_stock(db, quantities)
+    else:
+        reserve_stock(db, quantities)
+
+
+def set_order_status(db: Session, order: Order, new_status):
+    """Move the order to new_status along with its stock, sales counters and hold. May raise OutOfStock."""
+    order_stock_changed(db, order, order.order_status, new_status)
+    order_status_changed(db, order, order.order_status, new_status)
+    order.order_status = new_status
+
+
+# ---- holds on unpaid orders ----
+#
+# The units of a pending order are only held for it: checkout adds an InventoryHold that
+# expires inventory_hold_minutes later. The payment webhooks settle the hold, confirming
+# the order or cancelling it and putting the units back, and a Celery beat task cancels
+# the orders whose hold ran out. Any other way out of pending (an admin confirming a
+# cash on delivery order, the customer cancelling) drops the hold in order_stock_changed.
+#
+# The sweeper locks holds, then their orders; the webhooks take the same locks in the
+# same order, so a payment landing while its hold expires waits for the sweep and then
+# sees the cancelled order. Orders we cancelled ourselves are revived by a late payment
+# if their units are still in stock; otherwise the payment gets a refund request for an
+# admin to approve. Payment pages close when the hold expires, so that is the rare case.
+
+HOLD_EXPIRED_REASON = "Payment not received in time"
+PAYMENT_FAILED_REASON = "Payment failed"
+SOLD_OUT_REFUND_REASON = "Paid after the order's stock hold expired and the items sold out"
+# The hold outlives the payment page by this much, so a payment made at the last moment is
+# settled by its webhook before the sweeper gets to the hold
+PAYMENT_GRACE = timedelta(minutes=5)
+
+
+def place_hold(db: Session, order_id: int):
+    """Hold a new pending order's stock until its payment completes. Call before reserve_stock."""
+    expires_at = datetime.now(timezone.utc) + timedelta(minutes=settings.inventory_hold_minutes)
+    db.execute(insert(InventoryHold).values(order_id=order_id, expires_at=expires_at))
+
+
+def drop_hold(db: Session, order_id: int):
+    db.execute(delete(InventoryHold).where(InventoryHold.order_id == order_id))
+
+
+def hold_checkout_deadline(db: Session, order_id: int, minimum: timedelta) -> datetime:
+    """
+    When a payment page opened now for the order should close: when its hold expires, or
+    `minimum` from now if the gateway keeps pages open at least that long. The hold is
+    extended to last PAYMENT_GRACE longer. Call before the commit.
+    """
+    now = datetime.now(timezone.utc)
+    hold_expires = db.scalar(select(InventoryHold.expires_at).where(InventoryHold.order_id == order_id))
+    if hold_expires is None:
+        hold_expires = now + timedelta(minutes=settings.inventory_hold_minutes)
+    elif hold_expires.tzinfo is None:
+        hold_expires = hold_expires.replace(tzinfo=timezone.utc)
+    closes_at = max(hold_expires, now + minimum)
+    db.execute(
+        update(InventoryHold)
+        .where(InventoryHold.order_id == order_id)
+        .values(expires_at=closes_at + PAYMENT_GRACE)
+    )
+    return closes_at
+
+
+def lock_order(db: Session, order_id: int) -> Optional[Order]:
+    """Load the order for a status change, locking its hold and then the order row, the sweeper's lock order."""
+    db.execute(select(InventoryHold.order_id).where(InventoryHold.order_id == order_id).with_for_update())
+    return db.scalars(
+        select(Order)
+        .where(Order.id == order_id)
+        .options(selectinload(Order.order_items))
+        .with_for_update()
+        .execution_options(populate_existing=True)
+    ).first()
+
+
+def payment_completed(db: Session, order_id: int) -> Optional[Order]:
+    """
+    Confirm a paid order and drop its hold, then commit. Returns None when there is no such
+    order, or when its hold had expired and its units have been sold in the meantime.
+    """
+    order = lock_order(db, order_id)
+    if order is None:
+        return None
+    revive = is_cancelled_status(order.order_status) and order.cancel_reason in (HOLD_EXPIRED_REASON, PAYMENT_FAILED_REASON)
+    if is_pending_status(order.order_status) or revive:
+        try:
+            set_order_status(db, order, OrderStatus.confirmed)
+        except OutOfStock as e:
+            db.rollback()
+            logger.warning("Order %s was paid after its hold ran out and cannot be confirmed: %s", order_id, e)
+            _request_sold_out_refund(db, order_id, e)
+            db.commit()
+            return None
+        order.cancel_reason = None
+    db.commit()
+    return order
+
+
+def _request_sold_out_refund(db: Session, order_id: int, error: OutOfStock):
+    """Queue the refund of a payment whose order could not be confirmed; an admin approves it under /refunds."""
+    payment = db.scalar(select(Payment).where(Payment.order_id == order_id).limit(1))
+    if payment is None:
+        return
+    db.add(PaymentLog(payment_id=payment.id, status="refund_required", message=str(error)))
+    if not db.scalar(select(exists().where(Refund.order_id == order_id))):
+        db.add(Refund(
+            order_id=order_id,
+            stripe_refund_id="pending",
+            amount=payment.amount,
+            reason=SOLD_OUT_REFUND_REASON,
+            status=RefundStatus.requested,
+        ))
+
+
+def payment_failed(db: Session, order_id: int) -> Optional[Order]:
+    """Cancel a pending order whose payment failed and give its units back, then commit."""
+    order = lock_order(db, order_id)
+    if order is not None and is_pending_status(order.order_status):
+        set_order_status(db, order, OrderStatus.cancelled)
+        order.cancel_reason = PAYMENT_FAILED_REASON
+    db.commit()
+    return order
+
+
+def release_expired_holds(db: Session, batch_size: Optional[int] = None) -> int:
+    """
+    Cancel the pending orders whose hold has expired and put their units back, oldest hold
+    first, batch_size holds per transaction. Returns the number of orders cancelled.
+    """
+    batch_size = batch_size or settings.inventory_hold_sweep_batch
+    expired = (
+        select(InventoryHold.order_id)
+        .where(InventoryHold.expires_at <= datetime.now(timezone.utc))
+        .order_by(InventoryHold.expires_at)
+        .limit(batch_size)
+    )
+    if db.get_bind().dialect.name == "postgresql":
+        # holds a webhook is settling right now are left to it, and parallel sweeps split the work
+        expired = expired.with_for_update(skip_locked=True)
+
+    cancelled = 0
+    while True:
+        order_ids = db.scalars(expired).all()
+        if not order_ids:
+            break
+        orders = db.scalars(
+            select(Order)
+            .where(Order.id.in_(order_ids))
+            .options(selectinload(Order.order_items))
+            .order_by(Order.id)
+            .with_for_update()
+        ).all()
+        # a hold left behind by an order that is no longer pending only needs deleting
+        orders = [order for order in orders if is_pending_status(order.order_status)]
+        db.execute(delete(InventoryHold).where(InventoryHold.order_id.in_(order_ids)))
+        # the whole batch's units go back in one statement, before the sales counters are
+        # touched: checkout locks variants before products too
+        release_stock(db, order_quantities(
+            (item.variant_id, item.quantity) for order in orders for item in order.order_items
+        ))
+        for order in orders:
+            order_status_changed(db, order, order.order_status, OrderStatus.cancelled)
+            order.order_status = OrderStatus.cancelled
+            order.cancel_reason = HOLD_EXPIRED_REASON
+        cancelled += len(orders)
+        db.commit()
+        if len(order_ids) < batch_size:
+            break
+    return cancelled
@@ -1,8 +1,13 @@
 from fastapi import FastAPI, HTTPException, status, Depends, BackgroundTasks, Request
+from fastapi.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager
 from fastapi_mail import FastMail, MessageSchema
 from pydantic import EmailStr
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from app.database import get_db, Base , engine
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_db, get_async_db, engine, async_engine, session_router, client_key
+from app.cache import catalog_cache
 from app.models import User,ProductVariant
 from app.schemas import UserCreate, UserLogin,ResetPasswordRequest
 from app.utils import hash_password, verify_password , pwd_context, create_reset_token, verify_reset_token
@@ -41,12 +46,28 @@ from app.routers.reviews import router as review_router
 from app.routers.shipping_details import router as shippingdetails_router
 from app.routers.refund import router as refund
 from app.routers.website_logo import router as website_logo_router
+from app.routers import productroute, website_logo
 
+# Upload targets, created at startup rather than when the routers are imported
+MEDIA_DIRS = [productroute.UPLOAD_DIR, productroute.ERROR_DIR, website_logo.UPLOAD_DIR]
 
-app=FastAPI()
+
+# Startup does no database work: the schema is managed by Alembic (`python -m app.migrate`
+# runs before the server in nixpacks.toml), connections are opened by the pools on first use and the payment
+# SDKs are configured on first use (app.payment_gateways).
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    for directory in MEDIA_DIRS:
+        os.makedirs(directory, exist_ok=True)
+    yield
+    engine.dispose()
+    await async_engine.dispose()
+
+
+app=FastAPI(lifespan=lifespan)
 
 app.add_middleware(SessionMiddleware, secret_key=os.getenv("SESSION_SECRET_KEY"))
-app.mount("/media", StaticFiles(directory="media"), name="media")
+app.mount("/media", StaticFiles(directory="media", check_dir=False), name="media")
 app.add_middleware(SessionMiddleware, secret_key=os.getenv("SECRET_KEY", "default_secret_key"))
 templates = Jinja2Templates(directory="static/")
 
@@ -63,10 +84,22 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  
     allow_headers=["*"],  
+    expose_headers=["X-Next-Cursor", "ETag", "Last-Modified"],
 )
 
+# Read-your-writes for replica routing: after a successful write the client reads from the
+# primary for a few seconds, tracked in the shared cache backend so every worker knows
+session_router.store = catalog_cache.backend
+READ_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+@app.middleware("http")
+async def mark_writes(request: Request, call_next):
+    response = await call_next(request)
+    if session_router.replicas and request.method not in READ_METHODS and response.status_code < 400:
+        await run_in_threadpool(session_router.mark_write, client_key(request))
+    return response
+
 setup_rate_limiting(app)
-Base.metadata.create_all(bind=engine)
 
 #register & login start
 @app.post("/register/")
@@ -119,9 +152,9 @@ def login(user: UserLogin, db: Session = Depends(get_db)):
 FRONTEND_BASE_URL = os.getenv("FRONTEND_URL", "http://127.0.0.1:5173")
 from app.send_email import conf
 @app.post("/forgot-password/")
-async def forgot_password(email: EmailStr, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+async def forgot_password(email: EmailStr, background_tasks: BackgroundTasks, db: AsyncSession = Depends(get_async_db)):
     """User ko password reset email send karega, token save nahi hoga"""
-    user = db.query(User).filter(User.email == email).first()
+    user = await db.scalar(select(User).where(User.email == email).limit(1))
     if not user:
         raise HTTPException(status_code=404, detail="Email not found")
     reset_token = create_reset_token(user.id)
@@ -152,7 +185,7 @@ async def validate_token(token: str):
     frontend_url = f"{"http://localhost:5173"}/reset-password?token={token}"
     return RedirectResponse(url=frontend_url)
 @app.post("/reset-password/")
-async def reset_password(data: ResetPasswordRequest, db: Session = Depends(get_db)):
+async def reset_password(data: ResetPasswordRequest, db: AsyncSession = Depends(get_async_db)):
     user_id = verify_reset_token(data.token)
     if not user_id:
         raise HTTPException(status_code=400, detail="Invalid or expired token")
@@ -160,13 +193,14 @@ async def reset_password(data: ResetPasswordRequest, db: Session = Depends(get_d
     if data.new_password != data.confirm_password:
         raise HTTPException(status_code=400, detail="Passwords do not match")
 
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    user.hashed_password = hash_password(data.new_password)
+    # bcrypt is deliberately slow, hash in the threadpool
+    user.hashed_password = await run_in_threadpool(hash_password, data.new_password)
     db.add(user)
-    db.commit()
+    await db.commit()
 
     return {"message": "Password updated successfully"}
 
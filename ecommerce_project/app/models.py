@@ -145,6 +145,19 @@ class CategoryVariantAttribute(Base):
     category = relationship("Category", back_populates="variant_attributes")
     attribute = relationship("VariantAttribute", back_populates="categories")
 
+
+# Variant attributes normalized out of ProductVariant.attributes, kept in sync by app.variant_attributes.
+# The primary key doubles as the (attribute, value) -> variant lookup index.
+class VariantAttributeValue(Base):
+    __tablename__ = "variant_attribute_values"
+
+    attribute_id = Column(Integer, ForeignKey("variant_attributes.id", ondelete="CASCADE"), primary_key=True)
+    value = Column(String, primary_key=True)
+    variant_id = Column(Integer, ForeignKey("product_variants.id", ondelete="CASCADE"), primary_key=True, index=True)
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), nullable=False, index=True)
+
+    attribute = relationship("VariantAttribute")
+
 from sqlalchemy.dialects.postgresql import ARRAY
 # Product Table 
 class Product(Base):
@@ -154,12 +167,24 @@ class Product(Base):
     sku = Column(String, nullable=False, unique=True)
     product_name = Column(String, nullable=False)
     description = Column(Text)
-    brand = Column(String, nullable=False)
-    category_id = Column(Integer, ForeignKey("categories.id"))
+    brand = Column(String, nullable=False, index=True)
+    category_id = Column(Integer, ForeignKey("categories.id"), index=True)
     admin_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"))
     is_feature = Column(Boolean, default=False)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now(), index=True)
+
+    # Review aggregates, kept in sync by app.product_stats
+    rating_sum = Column(Integer, nullable=False, default=0, server_default=text("0"))
+    rating_count = Column(Integer, nullable=False, default=0, server_default=text("0"))
+    avg_rating = Column(Float, nullable=True, index=True)
+    # Units sold, kept in sync by app.product_stats; the windows are re-derived daily from ProductSalesDaily
+    units_sold = Column(Integer, nullable=False, default=0, server_default=text("0"), index=True)
+    units_sold_7d = Column(Integer, nullable=False, default=0, server_default=text("0"), index=True)
+    units_sold_30d = Column(Integer, nullable=False, default=0, server_default=text("0"), index=True)
+    # Cheapest / dearest variant price after discount, refreshed by app.product_stats on every variant write
+    min_price = Column(Float, nullable=True, index=True)
+    max_price = Column(Float, nullable=True, index=True)
 
     # Relationships
     category = relationship("Category", back_populates="products")
@@ -168,6 +193,25 @@ class Product(Base):
     reviews = relationship("Review", back_populates="product")
     order_items = relationship("OrderItem", back_populates="product")
 
+
+# Units sold per product per day, source for the rolling popularity windows
+class ProductSalesDaily(Base):
+    __tablename__ = "product_sales_daily"
+
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), primary_key=True)
+    day = Column(Date, primary_key=True, index=True)
+    units = Column(Integer, nullable=False, default=0)
+
+
+# One row, bumped in the transaction that deletes products or variants. The listing
+# ETags come from indexed max(id) / max(updated_at) lookups, which cannot see a row
+# that is gone (app.http_cache).
+class CatalogVersion(Base):
+    __tablename__ = "catalog_version"
+
+    id = Column(Integer, primary_key=True)
+    deletions = Column(Integer, nullable=False, default=0, server_default=text("0"))
+
    
 # PorductImage Table
 class ProductImage(Base):
@@ -185,13 +229,20 @@ class ProductVariant(Base):
     __tablename__ = "product_variants"
 
     id = Column(Integer, primary_key=True, index=True)
-    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"))
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), index=True)
+    # Optional caller-supplied key, bulk re-imports update the variant that carries it
+    sku = Column(String, nullable=True, unique=True)
 
     price = Column(Float, nullable=False)
     stock = Column(Integer, nullable=False)
     discount = Column(Integer, default=0)
     shipping_time = Column(Integer, nullable=True)
     attributes = Column(JSON, nullable=True, default={})
+    # Bumped on every change (stock included), feeds the catalog ETags in app.http_cache
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), index=True)
+    # Removed from its product while order items still point to it: kept for the orders,
+    # left out of listings, facets, price ranges and checkout
+    is_archived = Column(Boolean, nullable=False, default=False, server_default=text("false"))
 
 
     # Relationships
@@ -298,6 +349,16 @@ class OrderItem(Base):
         product = relationship("Product", back_populates="order_items")
         variant = relationship("ProductVariant", back_populates="order_items")
 
+# Stock a pending order took off the shelf, held until its payment completes or the
+# hold expires (app.inventory.release_expired_holds). The sweeper walks expires_at in
+# order, so the column is indexed.
+class InventoryHold(Base):
+    __tablename__ = "inventory_holds"
+
+    order_id = Column(Integer, ForeignKey("orders.id", ondelete="CASCADE"), primary_key=True)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
        
 
 # Review Table
@@ -430,4 +491,56 @@ class PaymentMethod(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     method = Column(Enum(PaymentMode), unique=True, nullable=False)
-    enabled = Column(Boolean, default=True)
\ No newline at end of file
+    enabled = Column(Boolean, default=True)
+
+# Bulk product imports, run as a Celery chord of chunk tasks (app.tasks, app.bulk_import)
+class ImportStatus(str, enum.Enum):
+    queued = "queued"
+    running = "running"
+    completed = "completed"
+    failed = "failed"
+
+class ImportMode(str, enum.Enum):
+    create = "create"  # every row adds a variant
+    upsert = "upsert"  # rows update the product / variant with the same key in place
+
+class ImportJob(Base):
+    __tablename__ = "import_jobs"
+
+    id = Column(String, primary_key=True)  # uuid hex, also the name of the staging directory
+    admin_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
+    directory = Column(String, nullable=False)
+    image_paths = Column(JSON, nullable=False, default={})
+    status = Column(Enum(ImportStatus), nullable=False, default=ImportStatus.queued)
+    mode = Column(Enum(ImportMode), nullable=False, default=ImportMode.create, server_default="create")
+    total_rows = Column(Integer, nullable=True)
+    chunk_count = Column(Integer, nullable=True)
+    # Bumped by every chunk in the transaction that writes its rows
+    rows_done = Column(Integer, nullable=False, default=0, server_default=text("0"))
+    rows_failed = Column(Integer, nullable=False, default=0, server_default=text("0"))
+    error_file = Column(String, nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+# One row per finished chunk, committed together with the chunk's products, so a
+# re-delivered chunk task sees it and skips the chunk
+class ImportChunk(Base):
+    __tablename__ = "import_chunks"
+
+    job_id = Column(String, ForeignKey("import_jobs.id", ondelete="CASCADE"), primary_key=True)
+    chunk_index = Column(Integer, primary_key=True)
+    rows_done = Column(Integer, nullable=False)
+    rows_failed = Column(Integer, nullable=False)
+
+# Which chunk created the product of a (product_name, category_id) key. Chunks run in
+# parallel and a product's rows can span two of them; the primary key makes the second
+# chunk wait for the first one and reuse its product.
+class ImportJobProduct(Base):
+    __tablename__ = "import_job_products"
+
+    job_id = Column(String, ForeignKey("import_jobs.id", ondelete="CASCADE"), primary_key=True)
+    product_name = Column(String, primary_key=True)
+    category_id = Column(Integer, primary_key=True)
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), nullable=True)
@@ -0,0 +1,82 @@
+import base64, json
+from datetime import datetime
+from typing import Optional
+from fastapi import HTTPException, Query, Response
+from sqlalchemy import tuple_
+from app.config import settings
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+# Opaque cursor = urlsafe base64 of the JSON list of key values of the last row on the page
+def encode_cursor(values: list) -> str:
+    payload = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _coerce(key, value):
+    # None passes through: a nullable key (e.g. avg_rating) can end a page
+    if value is None:
+        return None
+    expected = key.type.python_type
+    if expected is datetime:
+        return datetime.fromisoformat(value)
+    if isinstance(value, bool):
+        raise ValueError("boolean cursor value")
+    if expected is float and isinstance(value, int):
+        return float(value)
+    if not isinstance(value, expected):
+        raise ValueError(f"{key.key} expects {expected.__name__}")
+    return value
+
+
+def decode_cursor(cursor: str, keys: list) -> list:
+    """Decode a cursor back into key values, checked against the key column types. Any malformed cursor is a 400."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(keys):
+            raise ValueError("cursor does not match the sort keys")
+        return [_coerce(key, value) for key, value in zip(keys, values)]
+    except (ValueError, TypeError, NotImplementedError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+class PageParams:
+    def __init__(
+        self,
+        cursor: Optional[str] = Query(None, description="next_cursor returned by the previous page"),
+        limit: Optional[int] = Query(None, ge=1, description="Page size, capped at the configured maximum"),
+    ):
+        self.cursor = cursor
+        self.limit = min(limit or settings.page_size_default, settings.page_size_max)
+
+
+def paginate(query, page: PageParams, keys: list, descending: bool = False):
+    """
+    Keyset pagination: seeks past the cursor with WHERE (keys) > (cursor) instead of OFFSET,
+    so every page is an index range scan no matter how deep it is.
+    The last key must be unique (normally the primary key). Returns (rows, next_cursor).
+    """
+    if page.cursor:
+        values = decode_cursor(page.cursor, keys)
+        if len(keys) == 1:
+            left, right = keys[0], values[0]
+        else:
+            left, right = tuple_(*keys), tuple_(*values)
+        query = query.filter(left < right if descending else left > right)
+
+    query = query.order_by(*[k.desc() if descending else k.asc() for k in keys])
+    rows = query.limit(page.limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > page.limit:
+        rows = rows[:page.limit]
+        next_cursor = encode_cursor([getattr(rows[-1], k.key) for k in keys])
+    return rows, next_cursor
+
+
+def set_next_cursor(response: Response, next_cursor: Optional[str]):
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
@@ -0,0 +1,24 @@
+from functools import lru_cache
+from app.config import settings
+
+# Payment SDKs are imported and configured on first use, not when the routers are
+# imported: importing stripe alone adds about a second to every worker boot.
+# Call these inside the request handlers, e.g. `stripe = stripe_client()`.
+
+
+@lru_cache(maxsize=None)
+def stripe_client():
+    import stripe
+    stripe.api_key = settings.stripe_secret_key
+    return stripe
+
+
+@lru_cache(maxsize=None)
+def paypal_client():
+    import paypalrestsdk
+    paypalrestsdk.configure({
+        "mode": "sandbox",  # Set to "live" for production
+        "client_id": settings.paypal_client_id,
+        "client_secret": settings.paypal_client_secret
+    })
+    return paypalrestsdk
@@ -0,0 +1,257 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+from sqlalchemy import update, select, delete, case, cast, func, or_, bindparam, Float
+from sqlalchemy.orm import Session
+from app.database import dialect_insert
+from app.variant_attributes import backfill_variant_attributes
+from app.models import Product, ProductVariant, Review, ProductSalesDaily, Order, OrderItem, OrderStatus
+
+# Denormalized per-product aggregates.
+# Every review write adjusts the owning product row with a relative UPDATE in the same
+# transaction, so reads can filter and sort on indexed columns instead of
+# running AVG(...) GROUP BY over the whole reviews table.
+
+
+def apply_rating_change(db: Session, product_id: int, sum_delta: int, count_delta: int):
+    if not product_id or (not sum_delta and not count_delta):
+        return
+    new_sum = Product.rating_sum + sum_delta
+    new_count = Product.rating_count + count_delta
+    db.execute(
+        update(Product)
+        .where(Product.id == product_id)
+        .values(
+            rating_sum=new_sum,
+            rating_count=new_count,
+            avg_rating=case((new_count > 0, cast(new_sum, Float) / new_count), else_=None),
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+def review_added(db: Session, review: Review):
+    if review.rating is not None:
+        apply_rating_change(db, review.product_id, review.rating, 1)
+
+
+def review_removed(db: Session, review: Review):
+    if review.rating is not None:
+        apply_rating_change(db, review.product_id, -review.rating, -1)
+
+
+def review_rating_changed(db: Session, product_id: int, old_rating, new_rating):
+    apply_rating_change(
+        db,
+        product_id,
+        (new_rating or 0) - (old_rating or 0),
+        (new_rating is not None) - (old_rating is not None),
+    )
+
+
+def backfill_rating_aggregates(db: Session) -> int:
+    """Recompute the rating columns of every product from the reviews table."""
+    def per_product(expr):
+        return select(expr).where(Review.product_id == Product.id).scalar_subquery()
+
+    result = db.execute(
+        update(Product)
+        .values(
+            rating_sum=func.coalesce(per_product(func.sum(Review.rating)), 0),
+            rating_count=per_product(func.count(Review.rating)),
+            avg_rating=per_product(func.avg(Review.rating)),
+        )
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount
+
+
+# ---- popularity ----
+
+# Daily buckets older than this are pruned; lifetime totals live on Product.units_sold
+SALES_RETENTION_DAYS = 35
+
+
+def is_cancelled_status(status) -> bool:
+    # accepts models.OrderStatus, schemas.OrderStatus or the raw string
+    return str(getattr(status, "name", status) or "").lower() == "cancelled"
+
+
+def is_pending_status(status) -> bool:
+    return str(getattr(status, "name", status) or "").lower() == "pending"
+
+
+def _units_by_product(items) -> dict:
+    units = defaultdict(int)
+    for product_id, quantity in items:
+        units[product_id] += quantity
+    return units
+
+
+def _apply_sales(db: Session, units: dict, day, sign: int):
+    if not units:
+        return
+    age = (datetime.utcnow().date() - day).days
+    products = Product.__table__
+    db.execute(
+        products.update()
+        .where(products.c.id == bindparam("pid"))
+        .values(
+            units_sold=products.c.units_sold + bindparam("units"),
+            units_sold_7d=products.c.units_sold_7d + bindparam("units_7d"),
+            units_sold_30d=products.c.units_sold_30d + bindparam("units_30d"),
+        ),
+        [
+            {
+                "pid": pid,
+                "units": sign * qty,
+                "units_7d": sign * qty if age < 7 else 0,
+                "units_30d": sign * qty if age < 30 else 0,
+            }
+            for pid, qty in units.items()
+        ],
+    )
+
+    daily = ProductSalesDaily.__table__
+    if sign > 0:
+        insert = dialect_insert(db)
+        stmt = insert(daily).values([{"product_id": pid, "day": day, "units": qty} for pid, qty in units.items()])
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[daily.c.product_id, daily.c.day],
+            set_={"units": daily.c.units + stmt.excluded.units},
+        ))
+    elif age < SALES_RETENTION_DAYS:
+        db.execute(
+            daily.update()
+            .where(daily.c.product_id == bindparam("pid"), daily.c.day == day)
+            .values(units=daily.c.units - bindparam("qty")),
+            [{"pid": pid, "qty": qty} for pid, qty in units.items()],
+        )
+
+
+def record_order_sale(db: Session, items, order_date: datetime):
+    """items: iterable of (product_id, quantity). Call before the order's commit."""
+    _apply_sales(db, _units_by_product(items), order_date.date(), 1)
+
+
+def order_status_changed(db: Session, order: Order, old_status, new_status):
+    """Take the order's units off the counters when it gets cancelled (and back on if it is revived)."""
+    was_cancelled, is_cancelled = is_cancelled_status(old_status), is_cancelled_status(new_status)
+    if was_cancelled == is_cancelled:
+        return
+    items = [(item.product_id, item.quantity) for item in order.order_items]
+    _apply_sales(db, _units_by_product(items), order.order_date.date(), -1 if is_cancelled else 1)
+
+
+def _sales_window(days: int):
+    since = datetime.utcnow().date() - timedelta(days=days)
+    return (
+        select(func.coalesce(func.sum(ProductSalesDaily.units), 0))
+        .where(ProductSalesDaily.product_id == Product.id, ProductSalesDaily.day > since)
+        .scalar_subquery()
+    )
+
+
+def refresh_sales_windows(db: Session) -> int:
+    """Re-derive the 7/30-day counters from the daily buckets so old sales age out. Run daily."""
+    # products with empty windows cannot decay any further
+    result = db.execute(
+        update(Product)
+        .where(or_(Product.units_sold_7d != 0, Product.units_sold_30d != 0))
+        .values(units_sold_7d=_sales_window(7), units_sold_30d=_sales_window(30))
+        .execution_options(synchronize_session=False)
+    )
+    cutoff = datetime.utcnow().date() - timedelta(days=SALES_RETENTION_DAYS)
+    db.execute(delete(ProductSalesDaily).where(ProductSalesDaily.day <= cutoff))
+    db.commit()
+    return result.rowcount
+
+
+def backfill_sales_counters(db: Session) -> int:
+    """Rebuild units_sold and the daily buckets from order_items of non-cancelled orders."""
+    sold = (
+        select(func.coalesce(func.sum(OrderItem.quantity), 0))
+        .join(Order, Order.id == OrderItem.order_id)
+        .where(OrderItem.product_id == Product.id, Order.order_status != OrderStatus.cancelled)
+        .scalar_subquery()
+    )
+    result = db.execute(
+        update(Product)
+        .values(units_sold=sold)
+        .execution_options(synchronize_session=False)
+    )
+
+    since = datetime.utcnow() - timedelta(days=SALES_RETENTION_DAYS)
+    day = func.date(Order.order_date)
+    db.execute(delete(ProductSalesDaily))
+    db.execute(
+        ProductSalesDaily.__table__.insert().from_select(
+            ["product_id", "day", "units"],
+            select(OrderItem.product_id, day, func.sum(OrderItem.quantity))
+            .join(Order, Order.id == OrderItem.order_id)
+            .where(Order.order_date >= since, Order.order_status != OrderStatus.cancelled)
+            .group_by(OrderItem.product_id, day),
+        )
+    )
+    db.execute(
+        update(Product)
+        .values(units_sold_7d=_sales_window(7), units_sold_30d=_sales_window(30))
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount
+
+
+# ---- price range ----
+
+# Same formula as order pricing (routers/orders.py): discount is a percentage
+EFFECTIVE_PRICE = ProductVariant.price * (100 - func.coalesce(ProductVariant.discount, 0)) / 100.0
+
+
+def _variant_price(agg):
+    return (
+        select(agg(EFFECTIVE_PRICE))
+        .where(ProductVariant.product_id == Product.id, ProductVariant.is_archived == False)
+        .scalar_subquery()
+    )
+
+
+def _price_range_update():
+    return (
+        update(Product)
+        .values(min_price=_variant_price(func.min), max_price=_variant_price(func.max))
+        .execution_options(synchronize_session=False)
+    )
+
+
+def refresh_price_range(db: Session, product_ids):
+    """Recompute min_price/max_price of the given products. Call after their variants are flushed."""
+    product_ids = [pid for pid in set(product_ids) if pid]
+    if product_ids:
+        db.execute(_price_range_update().where(Product.id.in_(product_ids)))
+
+
+def backfill_price_ranges(db: Session) -> int:
+    result = db.execute(_price_range_update())
+    db.commit()
+    return result.rowcount
+
+
+def backfill_all(db: Session) -> dict:
+    return {
+        "rating_products": backfill_rating_aggregates(db),
+        "sales_products": backfill_sales_counters(db),
+        "price_products": backfill_price_ranges(db),
+        "attribute_products": backfill_variant_attributes(db),
+    }
+
+
+if __name__ == "__main__":
+    # python -m app.product_stats
+    from app.database import SessionLocal
+
+    session = SessionLocal()
+    try:
+        print(backfill_all(session))
+    finally:
+        session.close()
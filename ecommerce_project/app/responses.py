@@ -0,0 +1,23 @@
+from typing import Any
+from fastapi import Response
+from fastapi.responses import JSONResponse
+from app.serialization import dumps
+
+# Fast path for catalog lists: the rows are shaped by app.catalog exactly like the
+# response_model would serialize them, so the endpoints return this response directly
+# and FastAPI skips building and re-validating one Pydantic object per product.
+# The routes keep their response_model for the OpenAPI schema.
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def catalog_response(content: Any, response: Response) -> FastJSONResponse:
+    """Send pre-shaped, trusted rows as is, keeping the headers set on the injected `response`."""
+    headers = {
+        key: value for key, value in response.headers.items()
+        if key not in ("content-length", "content-type")
+    }
+    return FastJSONResponse(content, status_code=response.status_code or 200, headers=headers)
@@ -1,11 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
 from sqlalchemy.orm import Session
 from app.schemas import  UserCreate
 from app.auth import get_current_user
 from app.utils import pwd_context, has_permission
 from typing import List, Optional
-from app.database import get_db
+from app.database import get_db, get_read_db, pool_stats
+from app.pagination import PageParams, paginate, set_next_cursor
+from app.product_stats import review_removed, backfill_all
+from app.inventory import lock_order, set_order_status, OutOfStock
 from app.seed_role_permissions import seed_roles_and_permissions
+from app.cache import catalog_cache, PAYMENT_METHODS
+from app.routers.categoryroute import cached_categories
 from app.models import User, Product, Order, Category, Refund, Review, PaymentMethod, PaymentMode, UserProfile, ShippingDetails, Payment, OrderStatus, ProductVariant
 from app.schemas import ProductCreate, OrderUpdate, CategoryResponse, RefundResponse, ReviewResponse, ReviewUpdate, UserUpdate
 from datetime import datetime, timedelta
@@ -72,23 +77,27 @@ def get_admin_profile(admin: User = Depends(admin_required), db: Session = Depen
 #category 
 @router.get("/categories", response_model=list[CategoryResponse])
 def get_categories(db: Session = Depends(get_db)):
-    categories = db.query(Category).all()
-    return categories
+    return cached_categories(db)
 #Product Management
 
 #Order Management
 @router.get("/orders")
-def get_orders(admin: User = Depends(admin_required), db: Session = Depends(get_db)):
-    orders = db.query(Order).all()
-    return {"orders": orders}
+def get_orders(response: Response, page: PageParams = Depends(), admin: User = Depends(admin_required), db: Session = Depends(get_db)):
+    orders, next_cursor = paginate(db.query(Order), page, [Order.id], descending=True)
+    set_next_cursor(response, next_cursor)
+    return {"orders": orders, "next_cursor": next_cursor}
 # Get single Order by ID with Items
 @router.put("/orders/{order_id}")
 def update_order_status(order_id: int, order_update: OrderUpdate, admin: User = Depends(admin_required), db: Session = Depends(get_db)):
-    order = db.query(Order).filter(Order.id == order_id).first()
+    order = lock_order(db, order_id)
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
 
-    order.order_status = order_update.order_status
+    try:
+        set_order_status(db, order, order_update.order_status)
+    except OutOfStock as e:
+        db.rollback()
+        raise HTTPException(status_code=409, detail=str(e))
     db.commit()
     db.refresh(order)
     return {"msg": "Order status updated successfully", "order": order}
@@ -96,10 +105,13 @@ def update_order_status(order_id: int, order_update: OrderUpdate, admin: User =
 # Admins checks refunds 
 @router.get("/refunds", response_model=List[RefundResponse])
 def get_all_refunds(
+    response: Response,
+    page: PageParams = Depends(),
     db: Session = Depends(get_db),
     current_user: User = Depends(admin_required)
 ):
-    refunds = db.query(Refund).all()
+    refunds, next_cursor = paginate(db.query(Refund), page, [Refund.id], descending=True)
+    set_next_cursor(response, next_cursor)
     return refunds
 
 
@@ -109,14 +121,16 @@ def delete_review(review_id: int, admin: User = Depends(admin_required), db: Ses
     review = db.query(Review).filter(Review.id == review_id).first()
     if not review: 
         raise HTTPException(status_code=404, detail="Review not found")
+    review_removed(db, review)
     db.delete(review)   
     db.commit()  
     return {"msg": "Review deleted successfully"}
 # User Management
 @router.get("/users")
-def get_users(admin: User = Depends(admin_required), db: Session = Depends(get_db)):
-    users = db.query(User).filter(User.role == "user").all()
-    return {"users": users}
+def get_users(response: Response, page: PageParams = Depends(), admin: User = Depends(admin_required), db: Session = Depends(get_db)):
+    users, next_cursor = paginate(db.query(User).filter(User.role == "user"), page, [User.id])
+    set_next_cursor(response, next_cursor)
+    return {"users": users, "next_cursor": next_cursor}
 
 @router.put("/user/{user_id}")
 def block_unblock_user(user_id:int,user_update:UserUpdate,admin:User=Depends(admin_required),db:Session=Depends(get_db)):
@@ -137,7 +151,7 @@ def block_unblock_user(user_id:int,user_update:UserUpdate,admin:User=Depends(adm
     return {"msg":"user status update successfully", "user": {"id":user.id,"is_active":user.is_active}}
 #Reports & Analytics
 @router.get("/reports")
-def get_reports(admin: User = Depends(admin_required), db: Session = Depends(get_db)):
+def get_reports(admin: User = Depends(admin_required), db: Session = Depends(get_read_db)):
     total_revenue = db.query(func.sum(Order.order_amount)).filter(Order.order_status == "delivered").scalar()
     total_orders = db.query(Order).count()
     total_users = db.query(User).filter(User.role == "user").count()
@@ -154,6 +168,7 @@ def seed_payment_methods(db: Session):
         if not exists:
             db.add(PaymentMethod(method=method, enabled=True))
     db.commit()
+    catalog_cache.invalidate(PAYMENT_METHODS)
 @router.post("/seed-payment-methods")
 def seed_payment_endpoint(
     db: Session = Depends(get_db),
@@ -161,10 +176,25 @@ def seed_payment_endpoint(
 ):
     seed_payment_methods(db)
     return {"message": "Payment methods seeded successfully"}
+@router.post("/backfill-product-stats")
+def backfill_product_stats_endpoint(
+    db: Session = Depends(get_db),
+    admin: User = Depends(admin_required)
+):
+    result = backfill_all(db)
+    return {"message": "Product stats recomputed successfully", "result": result}
+@router.get("/cache-stats")
+def get_cache_stats(admin: User = Depends(admin_required)):
+    return catalog_cache.stats()
+@router.get("/pool-stats")
+def get_pool_stats(admin: User = Depends(admin_required)):
+    return pool_stats()
 @router.get("/payment-methods/enabled", response_model=List[str])
 def get_enabled_payment_methods(db: Session = Depends(get_db)):
-    enabled_methods = db.query(PaymentMethod).filter_by(enabled=True).all()
-    return [m.method.value for m in enabled_methods]
+    return catalog_cache.get_or_set(
+        (PAYMENT_METHODS, "enabled"),
+        lambda: [m.method.value for m in db.query(PaymentMethod).filter_by(enabled=True).all()],
+    )
 @router.put("/{method}/toggle")
 def toggle_payment_method(
     method: PaymentMode,
@@ -178,13 +208,14 @@ def toggle_payment_method(
     
     payment_method.enabled = enable
     db.commit()
+    catalog_cache.invalidate(PAYMENT_METHODS)
     return {"message": f"{method.value} {'enabled' if enable else 'disabled'}"}
 
 
 
 # Check Monthly Orders
 @router.get("/monthly-orders")
-def get_monthly_orders(admin: User = Depends(admin_required), db: Session = Depends(get_db)):
+def get_monthly_orders(admin: User = Depends(admin_required), db: Session = Depends(get_read_db)):
     from datetime import datetime
     from sqlalchemy import extract
 
@@ -215,7 +246,7 @@ def get_purchased_products_last_30_days(
     limit: Optional[int] = Query(None, ge=1),
     offset: int = Query(0, ge=0),
     admin: User = Depends(admin_required),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     if admin.role != "admin":
         raise HTTPException(status_code=403, detail="Only admin can access this endpoint.")
@@ -274,7 +305,7 @@ def get_purchased_products_last_30_days(
 @router.get("/orders/payment-summary")
 def get_order_payment_summary(
     admin: User = Depends(admin_required),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     if admin.role != "admin":
         raise HTTPException(status_code=403, detail="Only admin can access this Payment Summary.")
@@ -308,7 +339,7 @@ def get_order_payment_summary(
 
 
 @router.get("/dashboard-summary")
-def get_dashboard_summary(admin: User = Depends(admin_required), db: Session = Depends(get_db)):
+def get_dashboard_summary(admin: User = Depends(admin_required), db: Session = Depends(get_read_db)):
     if admin.role != "admin":
         raise HTTPException(status_code=403, detail="Only admin can access this Dashboard Summary.")
 
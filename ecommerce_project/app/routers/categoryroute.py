@@ -2,16 +2,23 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from app.auth import get_current_user
 from app.utils import pwd_context
-from app.database import get_db
+from app.database import get_db, get_read_db
 from app.models import Category
 from typing import List
 from app.schemas import  CategoryResponse, CategoryCreate,CategoryUpdate
+from app.cache import catalog_cache, CATEGORIES
 router=APIRouter()
 router = APIRouter(prefix="/category", tags=["Category List"])
+def cached_categories(db: Session) -> list:
+    return catalog_cache.get_or_set(
+        (CATEGORIES,),
+        lambda: [CategoryResponse.model_validate(c).model_dump() for c in db.query(Category).all()],
+    )
+
 # Public: Get all categories 
 @router.get("/categories", response_model=list[CategoryResponse])
 def get_categories(db: Session = Depends(get_db)):
-    categories=db.query(Category).all()
+    categories=cached_categories(db)
     if not categories:
         raise HTTPException(status_code=404, detail="No category found")
     return categories
@@ -20,7 +27,7 @@ def get_categories(db: Session = Depends(get_db)):
 @router.get("/{category_id}", response_model=List[CategoryResponse])
 def get_categories(
     category_id: int,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     categories = db.query(Category).filter(Category.id == category_id).all()
     if not categories:
@@ -40,6 +47,7 @@ def create_category(category: CategoryCreate, db: Session = Depends(get_db), cur
     new_category = Category(**category.dict())
     db.add(new_category)
     db.commit()
+    catalog_cache.invalidate(CATEGORIES)
     db.refresh(new_category)
     return new_category
 
@@ -62,6 +70,7 @@ def update_category(category_id: int, category_update: CategoryUpdate, db: Sessi
         setattr(category, key, value)
 
     db.commit()
+    catalog_cache.invalidate(CATEGORIES)
     db.refresh(category)
     return category
 
@@ -77,4 +86,5 @@ def delete_category(category_id: int, db: Session = Depends(get_db), current_use
 
     db.delete(category)
     db.commit()
+    catalog_cache.invalidate(CATEGORIES)
     return {"message": "Category deleted successfully"}
\ No newline at end of file
@@ -5,13 +5,15 @@ from uuid import uuid4
 from datetime import date
 from fastapi import APIRouter, Request, HTTPException, Depends
 from fastapi.responses import RedirectResponse
+from fastapi.concurrency import run_in_threadpool
 from google.oauth2 import id_token
 from google.auth.transport import requests
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from dotenv import load_dotenv
 from passlib.context import CryptContext
 
-from app.database import get_db
+from app.database import get_async_db
 from app.models import User, UserProfile, UserRole  
 
 load_dotenv()
@@ -50,7 +52,7 @@ async def login(request: Request):
 
 
 @router.get("/callback")
-async def auth_callback(code: str, request: Request, db: Session = Depends(get_db)):
+async def auth_callback(code: str, request: Request, db: AsyncSession = Depends(get_async_db)):
     token_request_uri = "https://oauth2.googleapis.com/token"
     data = {
         'code': code,
@@ -70,27 +72,28 @@ async def auth_callback(code: str, request: Request, db: Session = Depends(get_d
         raise HTTPException(status_code=400, detail="Missing id_token in response.")
 
     try:
-        id_info = id_token.verify_oauth2_token(id_token_value, requests.Request(), GOOGLE_CLIENT_ID)
+        # fetches Google's signing certs with a blocking HTTP call
+        id_info = await run_in_threadpool(id_token.verify_oauth2_token, id_token_value, requests.Request(), GOOGLE_CLIENT_ID)
         name = id_info.get('name')
         email = id_info.get('email')
         picture = id_info.get('picture')
         username = email.split('@')[0]  
 
         # 1. Check if user exists
-        user = db.query(User).filter(User.email == email).first()
+        user = await db.scalar(select(User).where(User.email == email).limit(1))
         if not user:
            
             user = User(
                 name=name,
                 username=username,
                 email=email,
-                hashed_password=hash_password(uuid4().hex),
+                hashed_password=await run_in_threadpool(hash_password, uuid4().hex),
                 is_active=True,
                 role=UserRole.user,
             )
             db.add(user)
-            db.commit()
-            db.refresh(user)
+            await db.commit()
+            await db.refresh(user)
 
             # 3. Create user profile with dummy data
             profile = UserProfile(
@@ -103,7 +106,7 @@ async def auth_callback(code: str, request: Request, db: Session = Depends(get_d
                 profile_picture=picture or None,
             )
             db.add(profile)
-            db.commit()
+            await db.commit()
 
         request.session['user_name'] = name
 
@@ -1,14 +1,17 @@
 from sqlalchemy.orm import selectinload
-from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks, Response
 from sqlalchemy.orm import Session, selectinload, joinedload
 from typing import List
 from datetime import datetime, timedelta
 from app import models, schemas
 from app.models import Order, User, OrderStatus
-from app.database import get_db
+from app.database import get_db, get_read_db
 from app.auth import get_current_user
+from app.pagination import PageParams, paginate, set_next_cursor
+from app.product_stats import record_order_sale, is_cancelled_status, is_pending_status
+from app.inventory import reserve_stock, order_quantities, place_hold, lock_order, set_order_status, OutOfStock
 from app.send_email import send_payment_confirmation, send_order_notification_to_admin
-import stripe
+from app.payment_gateways import stripe_client
 
 router = APIRouter(prefix="/orders", tags=["Orders"])
 
@@ -92,8 +95,7 @@ def create_order_with_shipping(
         user_id=current_user.id
     )
     db.add(new_order)
-    db.commit()
-    db.refresh(new_order)
+    db.flush()
 
     # Create Order Items
     for item in item_details:
@@ -117,6 +119,19 @@ def create_order_with_shipping(
         shipping_date=shipping_date
     ))
 
+    # An unpaid order holds its stock only until the hold expires
+    if is_pending_status(new_order.order_status):
+        place_hold(db, new_order.id)
+
+    # The hot rows (variant stock, product sales counters) are written last, so they stay
+    # locked only for the commit
+    if not is_cancelled_status(new_order.order_status):
+        try:
+            reserve_stock(db, order_quantities((item["variant_id"], item["quantity"]) for item in item_details))
+        except OutOfStock as e:
+            db.rollback()
+            raise HTTPException(status_code=409, detail=str(e))
+    record_order_sale(db, [(item["product_id"], item["quantity"]) for item in item_details], order_date)
     db.commit()
 
     # Final fetch with relationships
@@ -128,7 +143,8 @@ def create_order_with_shipping(
             selectinload(models.Order.order_items)
             .selectinload(models.OrderItem.variant)
             .selectinload(models.ProductVariant.images),
-            selectinload(models.Order.shipping_details)
+            selectinload(models.Order.shipping_details),
+            selectinload(models.Order.user).selectinload(models.User.role)
         )\
         .filter(models.Order.id == new_order.id)\
         .first()
@@ -156,10 +172,10 @@ def create_order_with_shipping(
 
 @router.get("/", response_model=List[schemas.OrderResponse])
 def get_all_orders(
+    response: Response,
+    page: PageParams = Depends(),
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
-    # skip: int = 0,
-    # limit: int = 10
 ):
     query = db.query(models.Order).options(
         selectinload(models.Order.order_items)
@@ -168,15 +184,15 @@ def get_all_orders(
         selectinload(models.Order.order_items)
             .selectinload(models.OrderItem.variant)
             .selectinload(models.ProductVariant.images),
-        joinedload(models.Order.shipping_details)
+        joinedload(models.Order.shipping_details),
+        selectinload(models.Order.user).selectinload(models.User.role)
     )
 
     if current_user.role != "admin":
         query = query.filter(models.Order.user_id == current_user.id)
 
-    orders = query.all()
-
-    # orders = query.offset(skip).limit(limit).all()
+    orders, next_cursor = paginate(query, page, [models.Order.id], descending=True)
+    set_next_cursor(response, next_cursor)
 
     for order in orders:
         for item in order.order_items:
@@ -204,7 +220,8 @@ def get_order(
         selectinload(models.Order.order_items)
             .selectinload(models.OrderItem.variant)
             .selectinload(models.ProductVariant.images),
-        joinedload(models.Order.shipping_details)
+        joinedload(models.Order.shipping_details),
+        selectinload(models.Order.user).selectinload(models.User.role)
     ).filter(models.Order.id == order_id).first()
 
     if not order:
@@ -225,28 +242,31 @@ def get_order(
 # Cancel Order 
 @router.put("/cancel/{order_id}")
 def cancel_order(order_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    order = db.query(models.Order).filter(models.Order.id == order_id).first()
-    
-    if not current_user.role=="admin" and order.user_id != current_user.id:
-        raise HTTPException(status_code=403, detail="You are not allowed to cancel this order")
-    
+    # Locked, so a cancel racing the hold sweeper or a payment webhook gives the units back once
+    order = lock_order(db, order_id)
+
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
 
-    if order.order_status == "cancelled":
+    if not current_user.role=="admin" and order.user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="You are not allowed to cancel this order")
+
+    if order.order_status == OrderStatus.cancelled:
         raise HTTPException(status_code=400, detail="Order already cancelled")
 
-    order.order_status = "cancelled"
+    set_order_status(db, order, OrderStatus.cancelled)
     db.commit()
 
 
     refund_record = None
+    payment = order.payments[0] if order.payments else None
 
     # Auto-refund logic
-    if order.payment and order.payment.stripe_payment_intent_id:
+    if payment and payment.stripe_payment_intent_id:
+        stripe = stripe_client()
         try:
             refund = stripe.Refund.create(
-                payment_intent=order.payment.stripe_payment_intent_id,
+                payment_intent=payment.stripe_payment_intent_id,
                 amount=int(order.final_amount * 100)  # Using final_amount here
             )
             refund_record = models.Refund(
@@ -365,12 +385,16 @@ def update_order_status(
             status_code=400,
             detail="Invalid order status. Must be one of: Pending, Confirmed, Shipped, Delivered, Cancelled"
         )
-    order = db.query(Order).filter(Order.id == order_id).first()
+    order = lock_order(db, order_id)
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     if order.order_status == status_enum:
         raise HTTPException(status_code=400, detail="Order status is already set to this value")
-    order.order_status = status_enum
+    try:
+        set_order_status(db, order, status_enum)
+    except OutOfStock as e:
+        db.rollback()
+        raise HTTPException(status_code=409, detail=str(e))
     db.commit()
     return {"message": f"Order {order_id} status updated to {status_enum.value}"}
 
@@ -381,7 +405,7 @@ def update_order_status(
 @router.get("/track-order/{order_id}", response_model=schemas.OrderTrackingResponse)
 def track_order(
     order_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_user)  # 👈 Secure user access
 ):
     order = db.query(Order).filter(Order.id == order_id).first()
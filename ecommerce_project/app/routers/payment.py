@@ -1,41 +1,39 @@
 from fastapi import APIRouter, HTTPException, Depends
+from datetime import timedelta
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from app.database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_db, get_async_db
 from app.models import Payment, PaymentLog, Order, User, OrderStatus, Order, User, OrderStatus
 from app.schemas import PaymentCreate, PaymentResponse, PaymentLogCreate, PaymentIntentRequest, PaymentMode, StripeCheckoutResponse
 from app.config import settings
 from app.auth import get_current_user
-import paypalrestsdk
 from app.auth import get_current_user
 from app.routers.admin import PaymentMethod
-import stripe, paypalrestsdk
+from app.payment_gateways import stripe_client, paypal_client
+from app.inventory import drop_hold, hold_checkout_deadline
 
 router = APIRouter(prefix="/payments", tags=["Payments"])
 
-# Configure PayPal SDK
-paypalrestsdk.configure({
-    "mode": "sandbox",  # Set to "live" for production
-    "client_id": settings.paypal_client_id,  
-    "client_secret": settings.paypal_client_secret
-})
-# Configure Stripe SDK
-stripe.api_key = settings.stripe_secret_key
+# Stripe rejects a Checkout Session expires_at less than 30 minutes away; one more covers the request
+STRIPE_CHECKOUT_MIN_OPEN = timedelta(minutes=31)
 
 # Endpoint to create payment session
 @router.post("/create-checkout-session/", response_model=StripeCheckoutResponse)
 async def create_checkout_session(
     payment_data: PaymentIntentRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     try:
         # 1. Check if payment already exists for the order
-        existing_payment = db.query(Payment).filter(Payment.order_id == payment_data.order_id).first()
+        existing_payment = await db.scalar(select(Payment).where(Payment.order_id == payment_data.order_id).limit(1))
         if existing_payment:
             raise HTTPException(status_code=400, detail="Payment for this order already exists")
 
         # 2. Fetch the order from DB and validate ownership
-        order = db.query(Order).filter(Order.id == payment_data.order_id).first()
+        order = await db.get(Order, payment_data.order_id)
         if not order:
             raise HTTPException(status_code=404, detail="Order not found")
 
@@ -47,15 +45,19 @@ async def create_checkout_session(
         # 3. Use order.amount from DB
         amount = order.final_amount
         # Check if selected payment method is enabled
-        enabled_method = db.query(PaymentMethod).filter_by(method=payment_data.payment_method, enabled=True).first()
+        enabled_method = await db.scalar(select(PaymentMethod).filter_by(method=payment_data.payment_method, enabled=True).limit(1))
         if not enabled_method:
             raise HTTPException(status_code=403, detail=f"{payment_data.payment_method} is currently disabled by admin")
 
 
         # ===== Stripe Payment Handling =====
         if payment_data.payment_method in [PaymentMode.credit_card, PaymentMode.debit_card]:
-            # Create Stripe Checkout Session for card payment
-            checkout_session = stripe.checkout.Session.create(
+            # The payment page closes when the order's hold on its stock runs out
+            expires_at = await db.run_sync(hold_checkout_deadline, order.id, STRIPE_CHECKOUT_MIN_OPEN)
+            # Create Stripe Checkout Session for card payment (blocking HTTP call, kept off the event loop)
+            stripe = stripe_client()
+            checkout_session = await run_in_threadpool(
+                stripe.checkout.Session.create,
                 payment_method_types=["card"],
                 line_items=[{
                     'price_data': {
@@ -69,6 +71,7 @@ async def create_checkout_session(
                 success_url=f"{settings.frontend_url}/checkout?session_id={{CHECKOUT_SESSION_ID}}",
                 cancel_url=f"{settings.frontend_url}/cancel",
                 metadata={"order_id": payment_data.order_id},
+                expires_at=int(expires_at.timestamp()),
             )
             # Save payment record for Stripe
             payment = Payment(
@@ -85,8 +88,8 @@ async def create_checkout_session(
             )
 
             db.add(payment)
-            db.commit()
-            db.refresh(payment)
+            await db.commit()
+            await db.refresh(payment)
 
             # Log payment creation in PaymentLog
             log = PaymentLog(
@@ -95,7 +98,7 @@ async def create_checkout_session(
                 message=f"Stripe Checkout Session created: {checkout_session.id}"
             )
             db.add(log)
-            db.commit()
+            await db.commit()
 
             return {
                 "payment_id": payment.id,
@@ -108,6 +111,7 @@ async def create_checkout_session(
         # ===== PayPal Payment Handling =====
         elif payment_data.payment_method == PaymentMode.paypal:
             # Create PayPal Payment for PayPal method
+            paypalrestsdk = paypal_client()
             payment_response = paypalrestsdk.Payment({
                 "intent": "sale",
                 "payer": {
@@ -135,7 +139,7 @@ async def create_checkout_session(
                 }]
             })
 
-            if payment_response.create():
+            if await run_in_threadpool(payment_response.create):
                 approval_url = next(
                     (link["href"] for link in payment_response.links if link["rel"] == "approval_url"),
                     None
@@ -158,8 +162,8 @@ async def create_checkout_session(
                 )
 
                 db.add(payment)
-                db.commit()
-                db.refresh(payment)
+                await db.commit()
+                await db.refresh(payment)
 
                 # Log payment creation in PaymentLog
                 log = PaymentLog(
@@ -168,7 +172,7 @@ async def create_checkout_session(
                     message="PayPal payment created"
                 )
                 db.add(log)
-                db.commit()
+                await db.commit()
 
                 return {
                     "payment_id": payment.id,
@@ -195,9 +199,11 @@ async def create_checkout_session(
                 paid_at=None
             )
 
+            # Paid on delivery, so the order keeps its stock until an admin moves it on
+            await db.run_sync(drop_hold, order.id)
             db.add(payment)
-            db.commit()
-            db.refresh(payment)
+            await db.commit()
+            await db.refresh(payment)
 
             log = PaymentLog(
                 payment_id=payment.id,
@@ -205,7 +211,7 @@ async def create_checkout_session(
                 message="COD order created successfully"
             )
             db.add(log)
-            db.commit()
+            await db.commit()
 
             return {
             "payment_id": payment.id,
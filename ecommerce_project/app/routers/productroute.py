@@ -1,16 +1,26 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Form, UploadFile, File, Query, Path
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, status, Form, UploadFile, File, Query, Path, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing_extensions import Annotated
-from sqlalchemy import func, cast, Float
-from app.models import User, Product, ProductImage, Category,ProductVariant,VariantAttribute,CategoryVariantAttribute,Review
-from app.schemas import  ProductCreate,ProductResponse, ProductVariantResponse, ProductVariantCreate
-from app.database import get_db
+from sqlalchemy import func, cast, Float, select, delete
+from app.models import User, Product, ProductImage, Category,ProductVariant,VariantAttribute,CategoryVariantAttribute,Review,VariantAttributeValue,ImportJob,ImportStatus,ImportMode,OrderItem
+from app.schemas import  ProductCreate,ProductResponse, ProductVariantCreate, CatalogQueryResponse, VariantSearchResponse, InventoryFeed, InventoryFeedResponse
+from app.database import get_db, get_async_db, get_read_db
+from app.catalog import catalog_query, serialize_product, serialize_variant
+from app.pagination import PageParams, paginate, set_next_cursor
+from app.product_stats import refresh_price_range
+from app.inventory import apply_inventory_deltas, touches_featured
+from app.bulk_import import stage_upload, import_staged, job_progress, validate_upload, ValidationReport
+from app.facets import CatalogFilters, facet_counts, FACET_CACHE_TTL
+from app.variant_attributes import sync_product_attributes, parse_attribute_filters, matching_variant_ids
+from app.responses import catalog_response
+from app.http_cache import catalog_validator, product_validator, conditional_response, note_catalog_deletion
+from app.cache import catalog_cache, FEATURED_PRODUCTS, BRANDS, CATALOG_FACETS, PRODUCT_NAMESPACES
 from app.auth import get_current_user
 from app.routers.admin import admin_required
-from typing import Optional, List, Union
-from typing import Optional, List, Union
-from uuid import uuid4
-import os, uuid, json, csv
+from typing import Optional, List
+import os, uuid, json, shutil
 
 
 
@@ -19,8 +29,22 @@ router=APIRouter(prefix="/products", tags=["Product panel"])
 
 UPLOAD_DIR = "media/uploads"
 ERROR_DIR = "media/errors"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
-os.makedirs(ERROR_DIR, exist_ok=True)
+
+
+def save_upload(image: UploadFile, file_path: str):
+    # blocking file IO, run it in the threadpool from the async routes
+    with open(file_path, "wb") as buffer:
+        shutil.copyfileobj(image.file, buffer)
+
+
+def remove_uploads(urls):
+    # the stored files of removed images; links to other sites have nothing to delete
+    for url in urls:
+        if url.startswith("/media/uploads/"):
+            try:
+                os.remove(os.path.join(UPLOAD_DIR, os.path.basename(url)))
+            except FileNotFoundError:
+                pass
 
 # Add Products
 @router.post("/", response_model=ProductResponse, status_code=status.HTTP_201_CREATED)
@@ -33,12 +57,12 @@ async def add_product(
     variants: List[str] = Form(...),
     variant_images: List[UploadFile] = File(...),
     admin: dict = Depends(admin_required),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     if admin.role != "admin":
         raise HTTPException(status_code=403, detail="Only admins can add products")
 
-    category = db.query(Category).filter(Category.id == category_id).first()
+    category = await db.get(Category, category_id)
     if not category:
         raise HTTPException(status_code=400, detail=f"Category ID {category_id} does not exist")
 
@@ -60,8 +84,7 @@ async def add_product(
             admin_id=admin.id
         )
         db.add(new_product)
-        db.flush()
-        db.refresh(new_product)
+        await db.flush()
 
         image_index = 0
         created_variants = []
@@ -119,8 +142,7 @@ async def add_product(
                 attributes=attributes
             )
             db.add(new_variant)
-            db.flush()
-            db.refresh(new_variant)
+            await db.flush()
 
             variant_image_urls = []
 
@@ -137,8 +159,7 @@ async def add_product(
                 filename = f"{short_id}_{clean_filename}"
                 file_path = os.path.join(UPLOAD_DIR, filename)
 
-                with open(file_path, "wb") as buffer:
-                    buffer.write(await image.read())
+                await run_in_threadpool(save_upload, image, file_path)
 
                 image_url = f"/media/uploads/{filename}"
                 db.add(ProductImage(variant_id=new_variant.id, image_url=image_url))
@@ -155,10 +176,14 @@ async def add_product(
                 "images": variant_image_urls
             })
 
-        db.commit()
+        await db.run_sync(refresh_price_range, [new_product.id])
+        await db.run_sync(sync_product_attributes, [new_product.id])
+        await db.commit()
+        catalog_cache.invalidate(*PRODUCT_NAMESPACES)
+        await db.refresh(new_product)
 
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
     return ProductResponse(
@@ -171,6 +196,8 @@ async def add_product(
         admin_id=new_product.admin_id,
         created_at=new_product.created_at,
         updated_at=new_product.updated_at,
+        min_price=new_product.min_price,
+        max_price=new_product.max_price,
         variants=created_variants,
         images=[]
     )
@@ -179,315 +206,239 @@ async def add_product(
 # Create Products in Bulk Through CSV File
 # Add celery 
 
+DRY_RUN_DESCRIPTION = "Only validate the file and report every error, nothing is written"
+IMPORT_MODE_DESCRIPTION = (
+    "create adds every row as a new variant. upsert updates the products and variants that already "
+    "exist (matched on the sku / variant_sku columns, else on product_name + category_id and attributes) "
+    "in place, so a catalog feed can be re-imported; images are then only needed for new variants"
+)
+
 
-def save_image(file: UploadFile, product_name: str, attributes: dict) -> str:
-    ext = os.path.splitext(file.filename)[1]
-    product_slug = product_name.lower().replace(" ", "_")
-    filename = f"{product_slug}_{uuid4().hex[:6]}{ext}"
-    path = os.path.join(UPLOAD_DIR, filename)
-    with open(path, "wb") as f:
-        f.write(file.file.read())
-    return f"/media/uploads/{filename}"
+def dry_run_response(response: Response, report: ValidationReport) -> dict:
+    response.status_code = status.HTTP_200_OK
+    return {
+        "dry_run": True,
+        "rows": report.rows,
+        "valid_rows": report.valid_rows,
+        "products": report.products,
+        "errors": len(report.errors),
+        "error_file": report.error_file,
+        "error_details": report.errors,
+        "warnings": report.warnings,
+    }
 
 
+# Plain def: the import does blocking file and DB IO, FastAPI runs it in the threadpool
 @router.post("/bulk-upload", status_code=status.HTTP_201_CREATED)
-async def upload_products_csv(
+def upload_products_csv(
+    response: Response,
     file: UploadFile = File(...),
-    images: List[UploadFile] = File(...),
+    images: List[UploadFile] = File([]),
+    mode: ImportMode = Query(ImportMode.create, description=IMPORT_MODE_DESCRIPTION),
+    dry_run: bool = Query(False, description=DRY_RUN_DESCRIPTION),
     admin=Depends(admin_required),
     db: Session = Depends(get_db)
 ):
     if admin.role != "admin":
         raise HTTPException(status_code=403, detail="Only admins can add products")
 
-    content = await file.read()
-    decoded = content.decode('utf-8').splitlines()
-    reader = csv.DictReader(decoded)
-
-    error_rows = []
-    success_count = 0
-    image_map = {img.filename: img for img in images}
-
-    product_cache = {}
-
-    for idx, row in enumerate(reader):
-        try:
-            # Validate required fields 
-            required_fields = ["product_name", "brand", "is_feature", "category_id", "description",
-                               "price", "stock", "attributes", "image_filenames"]
-            for field in required_fields:
-                if not row.get(field):
-                    raise ValueError(f"Missing required field '{field}'")
-
-            product_name = row["product_name"].strip()
-            brand = row["brand"].strip()
-            is_feature = row["is_feature"].lower() == "true"
-            category_id = int(row["category_id"])
-            description = row["description"].strip()
-            price = float(row["price"])
-            stock = int(row["stock"])
-            discount = int(row.get("discount", 0))
-            shipping_time = int(row.get("shipping_time", 0))
-            attributes = json.loads(row["attributes"])
-            image_filenames = [img.strip() for img in row["image_filenames"].split(",")]
-
-            category = db.query(Category).filter(Category.id == category_id).first()
-            if not category:
-                raise ValueError(f"Category ID {category_id} does not exist")
-
-            # Check if product already created 
-            product_key = f"{product_name}_{category_id}"
-            if product_key in product_cache:
-                new_product = product_cache[product_key]
-            else:
-                new_product = Product(
-                    sku=str(uuid4()),
-                    product_name=product_name,
-                    brand=brand,
-                    is_feature=is_feature,
-                    category_id=category_id,
-                    description=description,
-                    admin_id=admin.id
-                )
-                db.add(new_product)
-                db.flush()
-                db.refresh(new_product)
-                product_cache[product_key] = new_product
+    if dry_run:
+        category_ids = set(db.scalars(select(Category.id)))
+        return dry_run_response(response, validate_upload(file.file, [img.filename for img in images], category_ids, mode))
 
-            # Create Variant 
-            new_variant = ProductVariant(
-                product_id=new_product.id,
-                price=price,
-                stock=stock,
-                discount=discount,
-                shipping_time=shipping_time,
-                attributes=attributes
-            )
-            db.add(new_variant)
-            db.flush()
-            db.refresh(new_variant)
-
-            # Save Images 
-            for img_name in image_filenames:
-                if img_name not in image_map:
-                    raise ValueError(f"Image file '{img_name}' not found in upload")
-                img_url = save_image(image_map[img_name], product_name, attributes)
-                db.add(ProductImage(variant_id=new_variant.id, image_url=img_url))
-
-            db.commit()
-            success_count += 1
-
-        except Exception as e:
-            db.rollback()
-            row["error"] = str(e)
-            error_rows.append(row)
-
-    #  Save errors to CSV 
-    error_file_path = None
-    if error_rows:
-        error_file_path = os.path.join(ERROR_DIR, f"errors_{uuid4().hex[:6]}.csv")
-        with open(error_file_path, "w", newline="", encoding="utf-8") as err_file:
-            writer = csv.DictWriter(err_file, fieldnames=reader.fieldnames + ["error"])
-            writer.writeheader()
-            writer.writerows(error_rows)
+    staged = stage_upload(file.file, {img.filename: img.file for img in images})
+    result = import_staged(db, staged.directory, staged.image_paths, admin.id, mode)
+
+    if result.success_count:
+        catalog_cache.invalidate(*PRODUCT_NAMESPACES)
 
     return {
-        "message": f"{success_count} variants uploaded successfully",
-        "errors": len(error_rows),
-        "error_file": error_file_path,
-        "error_details": error_rows[:5]
+        "message": f"{result.success_count} variants uploaded successfully",
+        "errors": result.error_count,
+        "error_file": result.error_file,
+        "error_details": result.sample_errors
     }
 
-from app.tasks import process_bulk_upload
-import base64
+from app.tasks import start_bulk_import
 
 @router.post("/celery-bulk-upload", status_code=status.HTTP_202_ACCEPTED)
 async def upload_products_csv(
+    response: Response,
     file: UploadFile = File(...),
-    images: List[UploadFile] = File(...),
-    admin=Depends(admin_required)
+    images: List[UploadFile] = File([]),
+    mode: ImportMode = Query(ImportMode.create, description=IMPORT_MODE_DESCRIPTION),
+    dry_run: bool = Query(False, description=DRY_RUN_DESCRIPTION),
+    admin=Depends(admin_required),
+    db: AsyncSession = Depends(get_async_db)
 ):
     if admin.role != "admin":
         raise HTTPException(status_code=403, detail="Only admins can add products")
 
-    content = await file.read()
-
-    image_data = {}
-    for img in images:
-        image_data[img.filename] = await img.read()
+    if dry_run:
+        category_ids = set(await db.scalars(select(Category.id)))
+        report = await run_in_threadpool(validate_upload, file.file, [img.filename for img in images], category_ids, mode)
+        return dry_run_response(response, report)
 
-    task = process_bulk_upload.delay(content.decode("utf-8"), image_data, admin.id)
+    # The workers get paths to the spooled files, never their contents
+    staged = await run_in_threadpool(stage_upload, file.file, {img.filename: img.file for img in images})
+    job = ImportJob(
+        id=os.path.basename(staged.directory), admin_id=admin.id, mode=mode,
+        directory=staged.directory, image_paths=staged.image_paths,
+    )
+    db.add(job)
+    await db.commit()
+    start_bulk_import.delay(job.id)
 
     return {
         "message": "Upload task started",
-        "task_id": task.id
+        "task_id": job.id
     }
 
-from celery.result import AsyncResult
-from app.celery_worker import celery_app
-
+# Progress is read from the primary, replicas would lag behind the workers
 @router.get("/bulk-upload/status/{task_id}")
-def get_upload_status(task_id: str):
-    res = AsyncResult(task_id, app=celery_app)
-    return {
-        "task_id": task_id,
-        "status": res.status,
-        "result": res.result if res.ready() else None
-    }
+def get_upload_status(task_id: str, db: Session = Depends(get_db)):
+    job = db.get(ImportJob, task_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return job_progress(db, job)
+
+# Re-run the chunks of an interrupted import that never committed
+@router.post("/bulk-upload/{task_id}/resume", status_code=status.HTTP_202_ACCEPTED)
+def resume_upload(task_id: str, db: Session = Depends(get_db), admin=Depends(admin_required)):
+    job = db.get(ImportJob, task_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    if job.status == ImportStatus.completed:
+        raise HTTPException(status_code=400, detail="Import job already completed")
+    start_bulk_import.delay(job.id)
+    return {"message": "Upload task resumed", "task_id": job.id}
 
 # Get only featured products
 @router.get("/featuredproducts", response_model=List[ProductResponse])
-def get_featured_products(db: Session = Depends(get_db)):
-    featured_products = db.query(Product).filter(Product.is_feature == True).all()
-
-    product_responses = []
-    for product in featured_products:
-        variants = []
-        for variant in product.variants:
-            variant_dict = {
-                "id": variant.id,
-                "price": variant.price,
-                "stock": variant.stock,
-                "discount": variant.discount,
-                "shipping_time": variant.shipping_time,
-                "attributes": variant.attributes or {},
-                "images": [img.image_url for img in variant.images],
-            }
-            variants.append(ProductVariantResponse(**variant_dict))
-
-        product_dict = {
-            "id": product.id,
-            "sku": product.sku,
-            "admin_id": product.admin_id,
-            "product_name": product.product_name,
-            "brand": product.brand,
-            "category_id": product.category_id,
-            "description": product.description,
-            "created_at": product.created_at,
-            "updated_at": product.updated_at,
-            "variants": variants,
-        }
-        product_responses.append(ProductResponse(**product_dict))
-
-    return product_responses
+def get_featured_products(request: Request, response: Response, db: Session = Depends(get_db)):
+    not_modified = conditional_response(request, response, catalog_validator(db, request))
+    if not_modified:
+        return not_modified
+    featured = catalog_cache.get_or_set(
+        (FEATURED_PRODUCTS,),
+        lambda: [serialize_product(product) for product in catalog_query(db).filter(Product.is_feature == True).all()],
+    )
+    return catalog_response(featured, response)
 
 
 #get all products
 @router.get("/allproducts", response_model=List[ProductResponse])
-def get_products(db: Session = Depends(get_db)):
-    products = db.query(Product).all()
-    product_responses = []
-    for product in products:
-        variants = []
-        for variant in product.variants:
-            variant_dict = {
-                "id": variant.id,
-                "price": variant.price,
-                "stock": variant.stock,
-                "discount": variant.discount,
-                "shipping_time": variant.shipping_time,
-                "attributes": variant.attributes or {}, 
-                "images": [img.image_url for img in variant.images],
-            }
-            variants.append(ProductVariantResponse(**variant_dict))
-
-        product_dict = {
-            "id": product.id,
-            "sku": product.sku,
-            "admin_id": product.admin_id,
-            "product_name": product.product_name,
-            "brand": product.brand,
-            "category_id": product.category_id,
-            "description": product.description,
-            "created_at": product.created_at,
-            "updated_at": product.updated_at,
-            "variants": variants,
-        }
-        product_responses.append(ProductResponse(**product_dict))
-
-    return product_responses
+def get_products(request: Request, response: Response, page: PageParams = Depends(), db: Session = Depends(get_read_db)):
+    not_modified = conditional_response(request, response, catalog_validator(db, request))
+    if not_modified:
+        return not_modified
+    products, next_cursor = paginate(catalog_query(db), page, [Product.id])
+    set_next_cursor(response, next_cursor)
+    return catalog_response([serialize_product(product) for product in products], response)
+
+# Combined catalog filter: brand / category / price / rating / variant attributes, plus facet counts.
+# Items and facets both read the primary: the facet loader feeds the cache, so it cannot use a
+# replica (see get_read_db), and items from a lagging replica would not add up to the facet counts.
+@router.get("/query", response_model=CatalogQueryResponse)
+def query_products(
+    request: Request,
+    response: Response,
+    filters: CatalogFilters = Depends(),
+    page: PageParams = Depends(),
+    db: Session = Depends(get_db),
+):
+    not_modified = conditional_response(request, response, catalog_validator(db, request))
+    if not_modified:
+        return not_modified
+    keys, descending, sort_conditions = filters.sort_keys()
+    query = catalog_query(db).filter(*filters.conditions(), *sort_conditions)
+    products, next_cursor = paginate(query, page, keys, descending=descending)
+    set_next_cursor(response, next_cursor)
+    return catalog_response({
+        "items": [serialize_product(product) for product in products],
+        "facets": catalog_cache.get_or_set(
+            (CATALOG_FACETS, filters.cache_key()), lambda: facet_counts(db, filters), ttl=FACET_CACHE_TTL
+        ),
+        "next_cursor": next_cursor,
+    }, response)
+
+# Variants having every requested attribute, e.g. ?attr=color:red&attr=size:M
+@router.get("/variants/by-attributes", response_model=List[VariantSearchResponse])
+def get_variants_by_attributes(
+    request: Request,
+    response: Response,
+    attr: List[str] = Query(..., description="Variant attribute as name:value, e.g. color:red. Repeatable"),
+    page: PageParams = Depends(),
+    db: Session = Depends(get_read_db)
+):
+    try:
+        attributes = parse_attribute_filters(attr)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    not_modified = conditional_response(request, response, catalog_validator(db, request))
+    if not_modified:
+        return not_modified
+
+    query = (
+        db.query(ProductVariant)
+        .options(selectinload(ProductVariant.images))
+        .filter(ProductVariant.id.in_(matching_variant_ids(attributes)))
+    )
+    variants, next_cursor = paginate(query, page, [ProductVariant.id])
+    set_next_cursor(response, next_cursor)
+    return catalog_response(
+        [{**serialize_variant(variant), "product_id": variant.product_id} for variant in variants], response
+    )
+
+# Price / stock feed from the warehouse: thousands of per-variant changes in one call
+@router.post("/variants/inventory", response_model=InventoryFeedResponse)
+def update_inventory(feed: InventoryFeed, admin=Depends(admin_required), db: Session = Depends(get_db)):
+    if admin.role != "admin":
+        raise HTTPException(status_code=403, detail="Only admins can update inventory")
+
+    result = apply_inventory_deltas(db, feed.updates)
+
+    # brands never change here, facets only move with prices
+    namespaces = [CATALOG_FACETS] if result.price_changed else []
+    if touches_featured(db, result.product_ids):
+        namespaces.append(FEATURED_PRODUCTS)
+    if namespaces:
+        catalog_cache.invalidate(*namespaces)
+
+    return {"updated": result.updated, "not_found": result.not_found}
 
 # GET product by ID
 from fastapi import Path
 from typing_extensions import Annotated
 @router.get("/{product_id}", response_model=ProductResponse)
-def get_product(product_id: Annotated[int, Path(ge=1)], db: Session = Depends(get_db)):
-    product = db.query(Product).filter(Product.id == product_id).first()
-    if not product:
+def get_product(product_id: Annotated[int, Path(ge=1)], request: Request, response: Response, db: Session = Depends(get_read_db)):
+    validator = product_validator(db, request, product_id)
+    if validator is None:
         raise HTTPException(status_code=404, detail="Product not found")
+    not_modified = conditional_response(request, response, validator)
+    if not_modified:
+        return not_modified
 
+    product = catalog_query(db).filter(Product.id == product_id).first()
+    if not product:
+        raise HTTPException(status_code=404, detail="Product not found")
 
-    variants = db.query(ProductVariant).filter_by(product_id=product.id).all()
-    variant_list = []
-    for variant in variants:
-        images = db.query(ProductImage).filter_by(variant_id=variant.id).all()
-        image_urls = [img.image_url for img in images]
-        variant_list.append({
-            "id": variant.id,
-            "price": variant.price,
-            "stock": variant.stock,
-            "discount": variant.discount,
-            "shipping_time": variant.shipping_time,
-            "attributes": variant.attributes,
-            "images": image_urls
-        })
-
-    return ProductResponse(
-        id=product.id,
-        sku=product.sku,
-        product_name=product.product_name,
-        brand=product.brand,
-        category_id=product.category_id,
-        description=product.description,
-        admin_id=product.admin_id,
-        created_at=product.created_at,
-        updated_at=product.updated_at,
-        variants=variant_list,
-        images=[]
-    )
+    return catalog_response(serialize_product(product), response)
 
 #get product by category
 @router.get("/category/{category_id}", response_model=List[ProductResponse])
-def get_products_by_category(category_id: Annotated[int, Path(ge=1)], db: Session = Depends(get_db)):
+def get_products_by_category(category_id: Annotated[int, Path(ge=1)], request: Request, response: Response, db: Session = Depends(get_read_db)):
     category = db.query(Category).filter(Category.id == category_id).first()
     if not category:
         raise HTTPException(
             status_code=404,
             detail=f"Category with ID {category_id} does not exist."
         )
-    products = db.query(Product).filter(Product.category_id == category_id).all()
-    response = []
-    for product in products:
-        variants = db.query(ProductVariant).filter_by(product_id=product.id).all()
-        variant_list = []
-        for variant in variants:
-            images = db.query(ProductImage).filter_by(variant_id=variant.id).all()
-            image_urls = [img.image_url for img in images]
-            variant_list.append({
-                "id": variant.id,
-                "price": variant.price,
-                "stock": variant.stock,
-                "discount": variant.discount,
-                "shipping_time": variant.shipping_time,
-                "attributes": variant.attributes,
-                "images": image_urls
-            })
-
-        response.append(ProductResponse(
-            id=product.id,
-            sku=product.sku,
-            product_name=product.product_name,
-            brand=product.brand,
-            category_id=product.category_id,
-            description=product.description,
-            admin_id=product.admin_id,
-            created_at=product.created_at,
-            updated_at=product.updated_at,
-            variants=variant_list,
-            images=[]
-        ))
-
-    return response
+    not_modified = conditional_response(request, response, catalog_validator(db, request))
+    if not_modified:
+        return not_modified
+    products = catalog_query(db).filter(Product.category_id == category_id).all()
+    return catalog_response([serialize_product(product) for product in products], response)
 
 
 @router.delete("/{product_id}", status_code=status.HTTP_202_ACCEPTED)
@@ -506,17 +457,79 @@ def delete_product(product_id: int, db: Session = Depends(get_db), admin: dict =
     db.query(ProductImage).filter(ProductImage.variant_id.in_(
         db.query(ProductVariant.id).filter_by(product_id=product_id)
     )).delete(synchronize_session=False)
+    db.query(VariantAttributeValue).filter_by(product_id=product_id).delete(synchronize_session=False)
     
     db.query(ProductVariant).filter_by(product_id=product_id).delete(synchronize_session=False)
 
     db.delete(product)
+    note_catalog_deletion(db)
     db.commit()
+    catalog_cache.invalidate(*PRODUCT_NAMESPACES)
 
     return {"message": "Product deleted successfully"}
 
 
 #update the product
 
+VARIANT_FIELDS = ("price", "stock", "discount", "shipping_time")
+
+
+def parse_variant_form(idx: int, variant_str: str) -> dict:
+    """
+    One variant of the update form. "id" names an existing variant of the product, which is
+    updated in place; without it a variant is created. "image_count" new images are taken
+    from the uploads / links (default 1 for a new variant, 0 for an existing one) and the
+    optional "images" list names the existing image URLs to keep (default: all of them).
+    Every other key is an attribute.
+    """
+    try:
+        variant_data = json.loads(variant_str)
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=400, detail=f"Variant at index {idx} has invalid JSON format")
+    if not isinstance(variant_data, dict):
+        raise HTTPException(status_code=400, detail=f"Invalid variant data format at index {idx}. Expected a dictionary.")
+
+    variant_id = variant_data.get("id")
+    price = variant_data.get("price")
+    stock = variant_data.get("stock")
+    discount = variant_data.get("discount", 0)
+    shipping_time = variant_data.get("shipping_time")
+    image_count = variant_data.get("image_count", 1 if variant_id is None else 0)
+    keep_images = variant_data.get("images")
+
+    direct_fields = {"id", "price", "stock", "discount", "shipping_time", "image_count", "images"}
+    attributes = {k: str(v) if v is not None else "" for k, v in variant_data.items() if k not in direct_fields}
+
+    if variant_id is not None and not isinstance(variant_id, int):
+        raise HTTPException(status_code=400, detail=f"Invalid 'id' in variant at index {idx}")
+    if price is None or not isinstance(price, (int, float)) or price < 0:
+        raise HTTPException(status_code=400, detail=f"Invalid 'price' in variant at index {idx}")
+    if stock is None or not isinstance(stock, int) or stock < 0:
+        raise HTTPException(status_code=400, detail=f"Invalid 'stock' in variant at index {idx}")
+    if not isinstance(discount, int) or not (0 <= discount <= 100):
+        raise HTTPException(status_code=400, detail=f"'discount' must be between 0 and 100 at index {idx}")
+    if shipping_time is not None and (not isinstance(shipping_time, int) or shipping_time < 0):
+        raise HTTPException(status_code=400, detail=f"Invalid 'shipping_time' in variant at index {idx}")
+    if not isinstance(image_count, int) or image_count < (1 if variant_id is None else 0):
+        raise HTTPException(status_code=400, detail=f"Invalid 'image_count' in variant at index {idx}")
+    if keep_images is not None and (not isinstance(keep_images, list) or not all(isinstance(url, str) for url in keep_images)):
+        raise HTTPException(status_code=400, detail=f"'images' must be a list of image URLs at index {idx}")
+    if "color" not in attributes:
+        raise HTTPException(status_code=400, detail=f"Missing 'color' attribute in variant at index {idx}")
+
+    return {
+        "id": variant_id,
+        "fields": {"price": price, "stock": stock, "discount": discount, "shipping_time": shipping_time},
+        "attributes": attributes,
+        "image_count": image_count,
+        "keep_images": keep_images,
+    }
+
+
+# Variants are diffed against the stored ones: changed variants get an UPDATE of the changed
+# columns, new ones an INSERT and only the variants left out are deleted. Images are only
+# added or removed where the form says so, so untouched variants keep their ids (order items
+# point to them) and their image files.
 @router.put("/{product_id}", response_model=ProductResponse, status_code=status.HTTP_202_ACCEPTED)
 async def update_product(
     product_id: int,
@@ -529,7 +542,7 @@ async def update_product(
     variant_images: Annotated[List[UploadFile], File()] = [],
     variant_image_links: Annotated[List[str], Form()] = [],
     admin: dict = Depends(admin_required),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user),
 ):
     if current_user.role != "admin":
@@ -538,144 +551,164 @@ async def update_product(
     if not variants:
         raise HTTPException(status_code=400, detail="At least one variant is required")
 
-    product = db.query(Product).filter(Product.id == product_id).first()
+    product = await db.get(Product, product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
 
-    category = db.query(Category).filter(Category.id == category_id).first()
+    category = await db.get(Category, category_id)
     if not category:
         raise HTTPException(status_code=400, detail=f"Category ID {category_id} does not exist")
 
-    # Update product fields
-    product.product_name = product_name.strip()
-    product.brand = brand.strip()
-    product.description = description.strip()
-    product.category_id = category_id
-    product.is_feature = is_feature
-    db.commit()
-
-    # Delete old variants and images only if new images or links are provided
-    if variant_images or variant_image_links:
-        old_variant_ids = [v.id for v in db.query(ProductVariant).filter_by(product_id=product.id).all()]
-        db.query(ProductImage).filter(ProductImage.variant_id.in_(old_variant_ids)).delete(synchronize_session=False)
-        db.query(ProductVariant).filter(ProductVariant.id.in_(old_variant_ids)).delete(synchronize_session=False)
-        db.commit()
+    # Everything is validated before anything is written
+    incoming = [parse_variant_form(idx, variant_str) for idx, variant_str in enumerate(variants)]
+    existing = {
+        variant.id: variant
+        for variant in await db.scalars(
+            select(ProductVariant)
+            .options(selectinload(ProductVariant.images))
+            .where(ProductVariant.product_id == product.id, ProductVariant.is_archived == False)
+        )
+    }
+    kept = set()
+    for idx, data in enumerate(incoming):
+        if data["id"] is None:
+            continue
+        if data["id"] not in existing:
+            raise HTTPException(status_code=400, detail=f"Variant {data['id']} at index {idx} does not belong to this product")
+        if data["id"] in kept:
+            raise HTTPException(status_code=400, detail=f"Variant {data['id']} is listed more than once")
+        kept.add(data["id"])
+
+    requested = sum(data["image_count"] for data in incoming)
+    if requested > len(variant_images) + len(variant_image_links):
+        raise HTTPException(
+            status_code=400,
+            detail=f"Not enough images: the variants need {requested}, provided: {len(variant_images) + len(variant_image_links)}"
+        )
 
     image_index = 0
     link_index = 0
-    created_variants = []
-
-    try:
-        for idx, variant_str in enumerate(variants):
-            try:
-                variant_data = json.loads(variant_str)
-            except json.JSONDecodeError:
-                raise HTTPException(status_code=400, detail=f"Variant at index {idx} has invalid JSON format")
-
-            price = variant_data.get("price")
-            stock = variant_data.get("stock")
-            discount = variant_data.get("discount", 0)
-            shipping_time = variant_data.get("shipping_time")
-            image_count = variant_data.get("image_count", 1)
-
-            direct_fields = {"price", "stock", "discount", "shipping_time", "image_count"}
-            attributes = {k: str(v) if v is not None else "" for k, v in variant_data.items() if k not in direct_fields}
 
-            if price is None or not isinstance(price, (int, float)) or price < 0:
-                raise HTTPException(status_code=400, detail=f"Invalid 'price' in variant at index {idx}")
-            if stock is None or not isinstance(stock, int) or stock < 0:
-                raise HTTPException(status_code=400, detail=f"Invalid 'stock' in variant at index {idx}")
-            if not (0 <= discount <= 100):
-                raise HTTPException(status_code=400, detail=f"'discount' must be between 0 and 100 at index {idx}")
-            if shipping_time is not None and (not isinstance(shipping_time, int) or shipping_time < 0):
-                raise HTTPException(status_code=400, detail=f"Invalid 'shipping_time' in variant at index {idx}")
-            if not isinstance(image_count, int) or image_count < 1:
-                raise HTTPException(status_code=400, detail=f"Invalid 'image_count' in variant at index {idx}")
-            if "color" not in attributes:
-                raise HTTPException(status_code=400, detail=f"Missing 'color' attribute in variant at index {idx}")
-
-            new_variant = ProductVariant(
-                product_id=product.id,
-                price=price,
-                stock=stock,
-                discount=discount,
-                shipping_time=shipping_time,
-                attributes=attributes
-            )
-            db.add(new_variant)
-            db.flush()
-            db.refresh(new_variant)
-            try: 
-                variant_image_urls = []
-                total_available = min(len(variant_images) - image_index, image_count) + min(len(variant_image_links) - link_index, image_count)
-
-                if total_available < image_count:
-                    raise HTTPException(
-                        status_code=400,
-                        detail=f"Not enough images for variant at index {idx}. Expected: {image_count}, provided: {total_available}"
-                    )
-
-                # Interleave files and links
-                for i in range(image_count):
-                    if i % 2 == 0 and image_index < len(variant_images):  # Use file for even indices
-                        image = variant_images[image_index]
-                        short_id = uuid.uuid4().hex[:8]
-                        clean_filename = image.filename.replace(" ", "_").lower()
-                        filename = f"{short_id}_{clean_filename}"
-                        file_path = os.path.join(UPLOAD_DIR, filename)
-
-                        try:
-                            with open(file_path, "wb") as buffer:
-                                buffer.write(await image.read())
-                        except Exception:
-                            raise HTTPException(status_code=500, detail="Failed to save uploaded image file")
-
-                        image_url = f"/media/uploads/{filename}"
-                        db.add(ProductImage(variant_id=new_variant.id, image_url=image_url))
-                        variant_image_urls.append(image_url)
-                        image_index += 1
-
-                    elif link_index < len(variant_image_links):  # Use link for odd indices or if no files left
-                        image_url = variant_image_links[link_index].strip()
-                        db.add(ProductImage(variant_id=new_variant.id, image_url=image_url))
-                        variant_image_urls.append(image_url)
-                        link_index += 1
-
-                    else:
-                        raise HTTPException(status_code=400, detail=f"Images missing for variant at index {idx}")
-            except Exception as e:
-                db.rollback()
-                raise HTTPException(status_code=500, detail=f"Update Failed {str(e)}")
-            created_variants.append({
-                "id": new_variant.id,
-                "price": price,
-                "stock": stock,
-                "discount": discount,
-                "shipping_time": shipping_time,
-                "attributes": attributes,
-                "images": variant_image_urls
-            })
-
-        db.commit()
-
-        return ProductResponse(
-            id=product.id,
-            sku=product.sku,
-            product_name=product.product_name,
-            brand=product.brand,
-            category_id=product.category_id,
-            description=product.description,
-            admin_id=product.admin_id,
-            is_feature=product.is_feature,
-            created_at=product.created_at,
-            updated_at=product.updated_at,
-            variants=created_variants,
-            images=[]  
-        )
+    async def take_images(idx: int, count: int) -> List[str]:
+        # Interleave files and links, as for new products
+        nonlocal image_index, link_index
+        urls = []
+        for i in range(count):
+            # Use file for even indices, or when the links ran out
+            if image_index < len(variant_images) and (i % 2 == 0 or link_index >= len(variant_image_links)):
+                image = variant_images[image_index]
+                short_id = uuid.uuid4().hex[:8]
+                clean_filename = image.filename.replace(" ", "_").lower()
+                filename = f"{short_id}_{clean_filename}"
+                file_path = os.path.join(UPLOAD_DIR, filename)
+                try:
+                    await run_in_threadpool(save_upload, image, file_path)
+                except Exception:
+                    raise HTTPException(status_code=500, detail="Failed to save uploaded image file")
+                urls.append(f"/media/uploads/{filename}")
+                image_index += 1
+            elif link_index < len(variant_image_links):  # Use link for odd indices or if no files left
+                urls.append(variant_image_links[link_index].strip())
+                link_index += 1
+            else:
+                raise HTTPException(status_code=400, detail=f"Images missing for variant at index {idx}")
+        return urls
 
+    try:
+        product.product_name = product_name.strip()
+        product.brand = brand.strip()
+        product.description = description.strip()
+        product.category_id = category_id
+        product.is_feature = is_feature
+
+        prices_changed = attributes_changed = False
+        removed_urls = set()
+        for idx, data in enumerate(incoming):
+            variant = existing.get(data["id"])
+            if variant is None:
+                variant = ProductVariant(product_id=product.id, attributes=data["attributes"], **data["fields"])
+                db.add(variant)
+                prices_changed = attributes_changed = True
+            else:
+                # only the columns that differ, an unchanged variant is not written at all
+                for name, value in data["fields"].items():
+                    if getattr(variant, name) != value:
+                        setattr(variant, name, value)
+                        prices_changed = prices_changed or name in ("price", "discount")
+                if (variant.attributes or {}) != data["attributes"]:
+                    variant.attributes = data["attributes"]
+                    attributes_changed = True
+                if data["keep_images"] is not None:
+                    for image in [image for image in variant.images if image.image_url not in data["keep_images"]]:
+                        variant.images.remove(image)
+                        removed_urls.add(image.image_url)
+                        variant.updated_at = func.now()  # the product ETag follows the variants' updated_at
+
+            new_urls = await take_images(idx, data["image_count"])
+            variant.images.extend(ProductImage(image_url=url) for url in new_urls)
+            if new_urls and data["id"] is not None:
+                variant.updated_at = func.now()
+
+        removed = [variant_id for variant_id in existing if variant_id not in kept]
+        if removed:
+            # variants that were ordered are archived, so the order items keep their variant
+            ordered = set(await db.scalars(select(OrderItem.variant_id).where(OrderItem.variant_id.in_(removed)).distinct()))
+            for variant_id in ordered:
+                existing[variant_id].stock = 0
+                existing[variant_id].is_archived = True
+            prices_changed = attributes_changed = True
+            deleted = [variant_id for variant_id in removed if variant_id not in ordered]
+            if deleted:
+                for variant_id in deleted:
+                    removed_urls.update(image.image_url for image in existing[variant_id].images)
+                    db.expunge(existing[variant_id])
+                await db.execute(delete(ProductImage).where(ProductImage.variant_id.in_(deleted)))
+                await db.execute(delete(VariantAttributeValue).where(VariantAttributeValue.variant_id.in_(deleted)))
+                await db.execute(delete(ProductVariant).where(ProductVariant.id.in_(deleted)))
+                await db.run_sync(note_catalog_deletion)
+
+        await db.flush()
+        if prices_changed:
+            await db.run_sync(refresh_price_range, [product.id])
+        if attributes_changed:
+            await db.run_sync(sync_product_attributes, [product.id])
+        await db.commit()
+    except HTTPException:
+        await db.rollback()
+        raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Update failed: {str(e)}")
+    catalog_cache.invalidate(*PRODUCT_NAMESPACES)
+
+    # Files go once committed, and only when no other image row uses them (a bulk import stores an image once for all its variants)
+    if removed_urls:
+        removed_urls -= set(await db.scalars(select(ProductImage.image_url).where(ProductImage.image_url.in_(removed_urls))))
+        await run_in_threadpool(remove_uploads, removed_urls)
+
+    await db.refresh(product)
+    current = await db.scalars(
+        select(ProductVariant)
+        .options(selectinload(ProductVariant.images))
+        .where(ProductVariant.product_id == product.id, ProductVariant.is_archived == False)
+        .order_by(ProductVariant.id)
+        .execution_options(populate_existing=True)
+    )
+    return ProductResponse(
+        id=product.id,
+        sku=product.sku,
+        product_name=product.product_name,
+        brand=product.brand,
+        category_id=product.category_id,
+        description=product.description,
+        admin_id=product.admin_id,
+        is_feature=product.is_feature,
+        created_at=product.created_at,
+        updated_at=product.updated_at,
+        min_price=product.min_price,
+        max_price=product.max_price,
+        variants=[serialize_variant(variant) for variant in current],
+    )
 
 
 
@@ -687,93 +720,61 @@ from app.models import Product, Review
 
 @router.get("/rating/by-rating", response_model=List[ProductResponse])
 def get_products_by_rating(
+    request: Request,
+    response: Response,
     min_rating: Optional[float] = Query(0, ge=0, le=5),
-    db: Session = Depends(get_db)
+    page: PageParams = Depends(),
+    db: Session = Depends(get_read_db)
 ):
-    subquery = (
-        db.query(
-            Review.product_id,
-            func.avg(Review.rating).label("avg_rating")
-        )
-        .group_by(Review.product_id)
-        .subquery())
+    not_modified = conditional_response(request, response, catalog_validator(db, request))
+    if not_modified:
+        return not_modified
+    # Range scan on the indexed avg_rating column, best rated first
+    query = catalog_query(db).filter(Product.avg_rating >= min_rating)
+    products, next_cursor = paginate(query, page, [Product.avg_rating, Product.id], descending=True)
+    set_next_cursor(response, next_cursor)
+    return catalog_response([serialize_product(product) for product in products], response)
+
 #get unique brand for drop down
 @router.get("/brands/",response_model=List[str])
 def get_brands(db:Session=Depends(get_db)):
-    brands=db.query(Product.brand).distinct().all()
-    return [b[0] for b in brands]
+    return catalog_cache.get_or_set(
+        (BRANDS,),
+        lambda: [b[0] for b in db.query(Product.brand).distinct().order_by(Product.brand).all()],
+    )
 #filter products by brands
 @router.get("/filter/",response_model=List[ProductResponse])
-def get_products_by_brand(brand:str=None,db:Session=Depends(get_db)):
-    query=db.query(Product)
+def get_products_by_brand(request: Request, response: Response, brand:str=None,db:Session=Depends(get_read_db)):
+    not_modified = conditional_response(request, response, catalog_validator(db, request))
+    if not_modified:
+        return not_modified
+    query=catalog_query(db)
     if brand:
         query=query.filter(Product.brand==brand)
-    return query.all()
+    return catalog_response([serialize_product(product) for product in query.all()], response)
 
-from sqlalchemy import case, func, desc
+from app.search import search_product_ids
 
 @router.get("/search/", response_model=List[ProductResponse])
 def search_products_by_name(
+    request: Request,
+    response: Response,
     query: str,
     min_rating: float = Query(0, ge=0, le=5),  # Default to 0, range from 0 to 5
-    db: Session = Depends(get_db)
+    limit: int = Query(50, ge=1, le=200),
+    db: Session = Depends(get_read_db)
 ):
-    # Match priority: exact match (3), startswith (2), contains (1)
-    subquery = (
-        db.query(
-            Review.product_id,
-            func.avg(Review.rating).label("avg_rating")
-        )
-        .group_by(Review.product_id)
-        .subquery()
-    )
-
-    match_score = case(
-        (Product.product_name.ilike(query), 3),
-        (Product.product_name.ilike(f"{query}%"), 2),
-        (Product.product_name.ilike(f"%{query}%"), 1),
-        else_=0
-    )
-
-    products = (
-        db.query(Product)
-        .join(subquery, Product.id == subquery.c.product_id)
-        .filter(subquery.c.avg_rating >= min_rating)  # Filter by the min_rating
-        .order_by(match_score.desc())  # Sort by match score
-        .all()
-    )
-
-    product_responses = []
-    for product in products:
-        variants = db.query(ProductVariant).filter_by(product_id=product.id).all()
-        variant_list = []
-
-        for variant in variants:
-            images = db.query(ProductImage).filter_by(variant_id=variant.id).all()
-            image_urls = [img.image_url for img in images]
-            variant_list.append(ProductVariantResponse(
-                id=variant.id,
-                price=variant.price,
-                stock=variant.stock,
-                discount=variant.discount,
-                shipping_time=variant.shipping_time,
-                attributes=variant.attributes,
-                images=image_urls
-            ))
-
-        product_responses.append(ProductResponse(
-            id=product.id,
-            sku=product.sku,
-            product_name=product.product_name,
-            brand=product.brand,
-            category_id=product.category_id,
-            description=product.description,
-            admin_id=product.admin_id,
-            created_at=product.created_at,
-            updated_at=product.updated_at,
-            variants=variant_list,
-            images=[] 
-        ))
-
-    return product_responses
-
+    not_modified = conditional_response(request, response, catalog_validator(db, request))
+    if not_modified:
+        return not_modified
+    filters = []
+    if min_rating > 0:
+        # Unreviewed products have no average, so they only drop out when a minimum is asked for
+        filters.append(Product.avg_rating >= min_rating)
+
+    product_ids = search_product_ids(db, query, limit, filters)
+    if not product_ids:
+        return []
+
+    products = {p.id: p for p in catalog_query(db).filter(Product.id.in_(product_ids)).all()}
+    return catalog_response([serialize_product(products[pid]) for pid in product_ids if pid in products], response)
@@ -1,12 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
 from app.models import Order, Payment, Refund, User, RefundStatus, PaymentLog
 from app.database import get_db
 from app.auth import get_current_user
+from app.pagination import PageParams, paginate, set_next_cursor
 from app.schemas import RefundRequest, RefundResponse  # Tum bana chuke ho
-import stripe, paypalrestsdk, json
-from app.config import Settings
+import json
+from app.payment_gateways import stripe_client, paypal_client
 import logging
 router = APIRouter(prefix="/refunds", tags=["Refunds"])
 
@@ -54,13 +55,13 @@ logger = logging.getLogger(__name__)
 
 
 
-def get_settings():
-    return Settings()
-
+# Plain def: the Stripe/PayPal SDK calls below block, so this runs in the threadpool
 @router.post("/approve/{refund_id}")
-async def approve_refund(refund_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user), settings: Settings = Depends(get_settings)):
+def approve_refund(refund_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
     if current_user.role != "admin":
         raise HTTPException(403, "Not authorized")
+    stripe = stripe_client()
+    paypalrestsdk = paypal_client()
 
     logger.info(f"Querying refund id={refund_id}")
     refund = db.query(Refund).filter(Refund.id == refund_id).first()
@@ -103,11 +104,6 @@ async def approve_refund(refund_id: int, db: Session = Depends(get_db), current_
                     db.add(PaymentLog(payment_id=payment.id, status="refund_approved", message=f"Stripe refund: {stripe_refund.id}"))
 
             elif payment.payment_method == "paypal":
-                paypalrestsdk.configure({
-                    "mode": "sandbox",  # Change to "live" for production
-                    "client_id": settings.paypal_client_id,
-                    "client_secret": settings.paypal_client_secret
-                })
                 order = paypalrestsdk.Order.find(payment.paypal_payment_intent_id)
                 if not order.transactions or not order.transactions[0].related_resources:
                     refund.status = "rejected"
@@ -179,14 +175,18 @@ async def approve_refund(refund_id: int, db: Session = Depends(get_db), current_
 # ------------------------
 @router.get("/my-requests", response_model=list[RefundResponse])
 def list_my_refunds(
+    response: Response,
+    page: PageParams = Depends(),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):  
     if current_user.role == "user":
-        refunds = db.query(Refund).join(Order).filter(Order.user_id == current_user.id).all()
+        query = db.query(Refund).join(Order).filter(Order.user_id == current_user.id)
     elif current_user.role == "admin":
-        refunds = db.query(Refund).all()
+        query = db.query(Refund)
     else:
         raise HTTPException(status_code=403, detail="Unauthorized access")
-    
+
+    refunds, next_cursor = paginate(query, page, [Refund.id], descending=True)
+    set_next_cursor(response, next_cursor)
     return refunds
\ No newline at end of file
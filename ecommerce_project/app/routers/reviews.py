@@ -1,9 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Response
 from sqlalchemy.orm import Session
 from typing import List
 from app import models, schemas
-from app.database import get_db
+from app.database import get_db, get_read_db
 from app.auth import get_current_user
+from app.pagination import PageParams, paginate, set_next_cursor
+from app.product_stats import review_added, review_removed, review_rating_changed
 from app.models import User
 from sqlalchemy import func
 
@@ -55,6 +57,7 @@ def create_review(
     review_email = review.email if review.email else current_user.email
 
     db.add(new_review)
+    review_added(db, new_review)
     db.commit()
     db.refresh(new_review)
 
@@ -71,12 +74,14 @@ def create_review(
 
 # Get all reviews
 @router.get("/", response_model=List[schemas.ReviewResponse])
-def get_all_reviews(db: Session = Depends(get_db)):
-    return db.query(models.Review).all()
+def get_all_reviews(response: Response, page: PageParams = Depends(), db: Session = Depends(get_read_db)):
+    reviews, next_cursor = paginate(db.query(models.Review), page, [models.Review.id], descending=True)
+    set_next_cursor(response, next_cursor)
+    return reviews
 
 # Get a single review by ID
 @router.get("/{review_id}", response_model=schemas.ReviewResponse)
-def get_review(review_id: int, db: Session = Depends(get_db)):
+def get_review(review_id: int, db: Session = Depends(get_read_db)):
     review = db.query(models.Review).filter(models.Review.id == review_id).first()
     if not review:
         raise HTTPException(status_code=404, detail="Review not found")
@@ -97,6 +102,7 @@ def delete_review(
     if not review:
         raise HTTPException(status_code=404, detail="Review not found or not yours")
 
+    review_removed(db, review)
     db.delete(review)
     db.commit()
     return {"detail": "Review deleted successfully"}
@@ -106,7 +112,7 @@ def delete_review(
 @router.get("/product_id/{product_id}", response_model=List[schemas.ProductReviewResponse])
 def get_reviews_by_product(
     product_id: int,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     reviews = (
         db.query(
@@ -156,6 +162,7 @@ def update_review(
             detail="Review not found or not yours"
         )
 
+    review_rating_changed(db, review.product_id, review.rating, review_data.rating)
     review.rating = review_data.rating
     review.description = review_data.description
     db.commit()
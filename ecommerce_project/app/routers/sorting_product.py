@@ -1,10 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.orm import Session
-from sqlalchemy import desc, asc, cast, Float
+from sqlalchemy import desc, cast, Float
 from typing import List, Optional
-from app.database import get_db
-from app.models import Product, ProductVariant, OrderItem, Review
+from app.database import get_read_db
+from app.models import Product
 from app.schemas import ProductResponse
+from app.catalog import catalog_query, serialize_product
+from app.pagination import PageParams, paginate, set_next_cursor
+from app.responses import catalog_response
+from app.http_cache import catalog_validator, conditional_response
 from enum import Enum
 router = APIRouter(prefix="/sort")
 
@@ -14,59 +18,81 @@ class SortOrderEnum(str, Enum):
 
 @router.get("/sort_by_price/", response_model=List[ProductResponse])
 def sort_products_by_price(
+    request: Request,
+    response: Response,
     sort_order: Optional[SortOrderEnum] = Query(default=None),
-    db: Session = Depends(get_db)
+    min_price: Optional[float] = Query(default=None, ge=0),
+    max_price: Optional[float] = Query(default=None, ge=0),
+    page: PageParams = Depends(),
+    db: Session = Depends(get_read_db)
 ):
     """
-    Endpoint to sort products by price.
-    - No sort_order => Random/mixed order.
-    - 'asc' => Sort price low to high.
-    - 'desc' => Sort price high to low.
+    Endpoint to sort products by price (after discount), one row per product.
+    - No sort_order => Catalog order.
+    - 'asc' => Sort by cheapest variant, low to high.
+    - 'desc' => Sort by dearest variant, high to low.
+    - min_price / max_price => products with a variant price range overlapping the given range.
+    Paginated with the X-Next-Cursor header.
     """
+    not_modified = conditional_response(request, response, catalog_validator(db, request))
+    if not_modified:
+        return not_modified
 
-    query = db.query(Product).join(Product.variants)
+    query = catalog_query(db)
+    if min_price is not None:
+        query = query.filter(Product.max_price >= min_price)
+    if max_price is not None:
+        query = query.filter(Product.min_price <= max_price)
 
+    # Keyset on the materialized price columns (app.product_stats.refresh_price_range) + id as tie breaker
     if sort_order == SortOrderEnum.asc:
-        query = query.order_by(asc(ProductVariant.price))
+        query = query.filter(Product.min_price.isnot(None))
+        products, next_cursor = paginate(query, page, [Product.min_price, Product.id])
     elif sort_order == SortOrderEnum.desc:
-        query = query.order_by(desc(ProductVariant.price))
-    # else: leave as is for random/mixed order
+        query = query.filter(Product.max_price.isnot(None))
+        products, next_cursor = paginate(query, page, [Product.max_price, Product.id], descending=True)
+    else:
+        products, next_cursor = paginate(query, page, [Product.id])
 
-    products = query.all()
-
-    if not products:
+    if not products and not page.cursor:
         raise HTTPException(status_code=404, detail="No products found.")
 
-    return products
-from sqlalchemy import func, desc
+    set_next_cursor(response, next_cursor)
+    return catalog_response([serialize_product(product) for product in products], response)
+from sqlalchemy import desc
 from typing import Optional
 from fastapi import Query
 class SortByEnum(str, Enum):
     popularity = "popularity"
     rating = "rating"
+class PopularityWindowEnum(str, Enum):
+    all = "all"
+    week = "7d"
+    month = "30d"
+POPULARITY_COLUMNS = {
+    PopularityWindowEnum.all: Product.units_sold,
+    PopularityWindowEnum.week: Product.units_sold_7d,
+    PopularityWindowEnum.month: Product.units_sold_30d,
+}
 @router.get("/popu_or_rating/")
 def sort_products(
+    request: Request,
+    response: Response,
     sort_by: Optional[SortByEnum] = Query(default=None),
-    db: Session = Depends(get_db)
+    window: PopularityWindowEnum = Query(default=PopularityWindowEnum.all),
+    db: Session = Depends(get_read_db)
 ):
+    not_modified = conditional_response(request, response, catalog_validator(db, request))
+    if not_modified:
+        return not_modified
     query = db.query(Product)
 
     if sort_by == SortByEnum.popularity:
-        query = (
-            query
-            .join(Product.variants)
-            .join(OrderItem, OrderItem.variant_id == ProductVariant.id)
-            .group_by(Product.id)
-            .order_by(desc(func.count(OrderItem.id)))
-        )
+        # Precomputed counters (app.product_stats), index scan instead of counting order_items
+        query = query.order_by(desc(POPULARITY_COLUMNS[window]), Product.id)
 
     elif sort_by == SortByEnum.rating:
-        query = (
-            query
-            .outerjoin(Review, Review.product_id == Product.id)
-            .group_by(Product.id)
-            .order_by(desc(func.avg(Review.rating)))  # No need to cast anymore
-        )
+        query = query.order_by(Product.avg_rating.desc().nullslast(), Product.id)
 
     products = query.all()
     return products
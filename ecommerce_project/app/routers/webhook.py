@@ -1,17 +1,18 @@
-import stripe, os, json
+import os, json
 from fastapi import APIRouter, Request, Header, HTTPException, status, Depends, BackgroundTasks
-from sqlalchemy.orm import Session
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime
 
-from app.config import settings
-from app.database import get_db
-from app.models import Payment, Order, User, OrderStatus
+from app.database import get_async_db
+from app.models import Payment, User
 from app.send_email import send_payment_confirmation
+from app.payment_gateways import stripe_client
+from app.inventory import payment_completed, payment_failed
 from dotenv import load_dotenv
 router = APIRouter(prefix="/webhook", tags=["Stripe Webhook"])
 
-# Set your secret key
-stripe.api_key = settings.stripe_secret_key
 load_dotenv()
 stripe_webhook_secret= os.getenv("STRIPE_WEBHOOK_SECRET")
 
@@ -22,9 +23,10 @@ async def stripe_webhook(
     request: Request,
     background_tasks: BackgroundTasks,
     stripe_signature: str = Header(None),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     payload = await request.body()
+    stripe = stripe_client()
 
     try:
         event = stripe.Webhook.construct_event(
@@ -40,19 +42,16 @@ async def stripe_webhook(
         stripe_payment_intent_id = intent["id"]
 
         # Get the related payment
-        payment = db.query(Payment).filter(Payment.stripe_payment_intent_id == stripe_payment_intent_id).first()
+        payment = await db.scalar(select(Payment).where(Payment.stripe_payment_intent_id == stripe_payment_intent_id).limit(1))
 
         if payment and payment.status != "succeeded":
             payment.status = "succeeded"
             payment.paid_at = datetime.utcnow()
-            db.commit()
-
-            # Fetch related order and user
-            order = db.query(Order).filter(Order.id == payment.order_id).first()
-            user = db.query(User).filter(User.id == order.user_id).first() if order else None
-            if order:
-                order.order_status=OrderStatus.confirmed
-            db.commit()
+            await db.commit()
+
+            # Confirm the order, which releases its hold on the stock
+            order = await db.run_sync(payment_completed, payment.order_id)
+            user = await db.get(User, order.user_id) if order else None
             # Send payment confirmation email
             if user:
                 send_payment_confirmation(
@@ -62,26 +61,39 @@ async def stripe_webhook(
                     order_id=payment.order_id,
                     amount=payment.amount
                 )
-        elif event["type"] == "checkout.session.completed":
-            session = event["data"]["object"]
-            session_id = session["id"]
-
-            # Retrieve full session to access payment_intent
-            session = stripe.checkout.Session.retrieve(session_id, expand=["payment_intent"])
-            payment_intent_id = session.payment_intent.id
-
-            # Update existing payment record
-            payment = db.query(Payment).filter(Payment.stripe_checkout_session_id == session.id).first()
-            if payment and not payment.stripe_payment_intent_id:
-                payment.stripe_payment_intent_id = payment_intent_id
-                db.commit()
+    elif event["type"] == "checkout.session.completed":
+        session = event["data"]["object"]
+        session_id = session["id"]
+
+        # Retrieve full session to access payment_intent
+        session = await run_in_threadpool(stripe.checkout.Session.retrieve, session_id, expand=["payment_intent"])
+        payment_intent_id = session.payment_intent.id
+
+        # Update existing payment record
+        payment = await db.scalar(select(Payment).where(Payment.stripe_checkout_session_id == session.id).limit(1))
+        if payment and not payment.stripe_payment_intent_id:
+            payment.stripe_payment_intent_id = payment_intent_id
+            await db.commit()
+    elif event["type"] in ("payment_intent.payment_failed", "checkout.session.expired"):
+        failed = event["data"]["object"]
+        if event["type"] == "payment_intent.payment_failed":
+            lookup = Payment.stripe_payment_intent_id == failed["id"]
+        else:
+            lookup = Payment.stripe_checkout_session_id == failed["id"]
+        payment = await db.scalar(select(Payment).where(lookup).limit(1))
+
+        if payment and payment.status != "succeeded":
+            payment.status = "failed"
+            await db.commit()
+            # Cancel the order and put its stock back
+            await db.run_sync(payment_failed, payment.order_id)
     return {"status": "success"}
 
 @router.post("/paypal")
 async def paypal_webhook(
     request: Request,
     background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     try:
         payload = await request.body()
@@ -94,20 +106,16 @@ async def paypal_webhook(
             capture_id = resource.get("id")
             invoice_id = resource.get("invoice_id")  # You should set this during payment creation
 
-            payment = db.query(Payment).filter(Payment.paypal_payment_id == capture_id).first()
+            payment = await db.scalar(select(Payment).where(Payment.paypal_payment_intent_id == capture_id).limit(1))
 
             if payment and payment.status != "succeeded":
                 payment.status = "succeeded"
                 payment.paid_at = datetime.utcnow()
-                db.commit()
-
-                # Update related order
-                order = db.query(Order).filter(Order.id == payment.order_id).first()
-                user = db.query(User).filter(User.id == order.user_id).first() if order else None
+                await db.commit()
 
-                if order:
-                    order.order_status = OrderStatus.confirmed
-                    db.commit()
+                # Confirm the related order, which releases its hold on the stock
+                order = await db.run_sync(payment_completed, payment.order_id)
+                user = await db.get(User, order.user_id) if order else None
 
                 if user:
                     send_payment_confirmation(
@@ -118,6 +126,16 @@ async def paypal_webhook(
                         amount=payment.amount
                     )
 
+        elif event_type == "PAYMENT.CAPTURE.DENIED":
+            capture_id = resource.get("id")
+            payment = await db.scalar(select(Payment).where(Payment.paypal_payment_intent_id == capture_id).limit(1))
+
+            if payment and payment.status != "succeeded":
+                payment.status = "failed"
+                await db.commit()
+                # Cancel the related order and put its stock back
+                await db.run_sync(payment_failed, payment.order_id)
+
         return {"status": "success"}
 
     except Exception as e:
@@ -3,10 +3,13 @@ from fastapi.responses import JSONResponse
 from typing import Optional
 import shutil
 import os
+from sqlalchemy import select
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from app import models, schemas
 from app.auth import get_current_user
-from app.database import get_db
+from app.database import get_db, get_async_db
+from app.cache import catalog_cache, WEBSITE_LOGO
 import uuid
 
 router = APIRouter(
@@ -15,11 +18,15 @@ router = APIRouter(
 )
 
 UPLOAD_DIR = "media/website_logo"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
 
+# Plain def: the cache may wait on another worker's recompute, so this runs in the threadpool
 @router.get("/website_logo", response_model=schemas.WebsiteLogoBase)
-async def get_website_logo(db: Session = Depends(get_db)):
-    website_logo = db.query(models.WebsiteLogo).first()
+def get_website_logo(db: Session = Depends(get_db)):
+    def load():
+        logo = db.query(models.WebsiteLogo).first()
+        return schemas.WebsiteLogoBase.model_validate(logo).model_dump() if logo else None
+
+    website_logo = catalog_cache.get_or_set((WEBSITE_LOGO,), load)
     if not website_logo:
         raise HTTPException(status_code=404, detail="Website logo not found")
     return website_logo
@@ -30,12 +37,12 @@ async def create_or_update_website_logo(
     name: str = Form(...),
     logo: Optional[UploadFile] = None,
     admin: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     if admin.role != "admin":
         raise HTTPException(status_code=403, detail="Only admins can perform this action")
 
-    website_logo = db.query(models.WebsiteLogo).first()
+    website_logo = await db.scalar(select(models.WebsiteLogo).limit(1))
 
     # Handle logo upload and cleanup
     logo_path = None
@@ -56,13 +63,15 @@ async def create_or_update_website_logo(
         website_logo.name = name
         if logo_path:
             website_logo.logo_path = logo_path
-        db.commit()
-        db.refresh(website_logo)
+        await db.commit()
+        catalog_cache.invalidate(WEBSITE_LOGO)
+        await db.refresh(website_logo)
     else:
         website_logo = models.WebsiteLogo(name=name, logo_path=logo_path)
         db.add(website_logo)
-        db.commit()
-        db.refresh(website_logo)
+        await db.commit()
+        catalog_cache.invalidate(WEBSITE_LOGO)
+        await db.refresh(website_logo)
 
     return website_logo
 
@@ -101,13 +110,13 @@ async def create_or_update_website_logo(
 @router.delete("/website_logo")
 async def delete_website_logo(
     admin: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
    
     if admin.role != "admin":
         raise HTTPException(status_code=403, detail="Only admins can perform this action")
 
-    website_logo = db.query(models.WebsiteLogo).first()
+    website_logo = await db.scalar(select(models.WebsiteLogo).limit(1))
     if not website_logo:
         raise HTTPException(status_code=404, detail="Website logo not found")
 
@@ -117,7 +126,8 @@ async def delete_website_logo(
         except FileNotFoundError:
             pass
 
-    db.delete(website_logo)
-    db.commit()
+    await db.delete(website_logo)
+    await db.commit()
+    catalog_cache.invalidate(WEBSITE_LOGO)
 
     return {"message": "Website logo and name deleted successfully"}
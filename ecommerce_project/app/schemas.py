@@ -1,8 +1,8 @@
-from pydantic import BaseModel, EmailStr, Field, field_validator,condecimal, conint, ConfigDict, validator
+from pydantic import BaseModel, EmailStr, Field, field_validator,condecimal, conint, ConfigDict, validator, model_validator
 
 from datetime import date,datetime
 from enum import Enum
-from typing import Optional, List, Any, Literal,Dict
+from typing import Optional, List, Any, Literal,Dict, Union
 from app.models import RatingEnum
 
 # website logo schema
@@ -39,7 +39,12 @@ class UserResponse(BaseModel):
     name: str
     username: str
     email: EmailStr
-    role: str
+    role: Optional[str] = None
+
+    # User.role is the Role row; respond with its name
+    @field_validator("role", mode="before")
+    def role_name(cls, v):
+        return getattr(v, "name", v)
 
     model_config=ConfigDict(from_attributes=True)
 class UserUpdate(BaseModel):
@@ -125,6 +130,7 @@ class ProductVariantCreate(ProductVariantBase):
 
 class ProductVariantResponse(ProductVariantBase):
     id: int
+    sku: Optional[str] = None
     images: List[str]
 
     @field_validator("images", mode="before")
@@ -137,6 +143,34 @@ class ProductVariantResponse(ProductVariantBase):
     model_config = ConfigDict(from_attributes=True)
 
 
+class VariantSearchResponse(ProductVariantResponse):
+    product_id: int
+
+
+# Price / stock feed, see app.inventory. Only the fields that are set are changed.
+class InventoryDelta(BaseModel):
+    variant_id: Optional[int] = None
+    sku: Optional[str] = None
+    price: Optional[Annotated[float, Field(gt=0)]] = None
+    stock: Optional[Annotated[int, Field(ge=0)]] = None
+    discount: Optional[Annotated[int, Field(ge=0, le=100)]] = None
+
+    @model_validator(mode="after")
+    def check_delta(self):
+        if (self.variant_id is None) == (self.sku is None):
+            raise ValueError("Give either variant_id or sku")
+        if self.price is None and self.stock is None and self.discount is None:
+            raise ValueError("Nothing to change, give price, stock or discount")
+        return self
+
+class InventoryFeed(BaseModel):
+    updates: Annotated[List[InventoryDelta], Field(min_length=1, max_length=10000)]
+
+class InventoryFeedResponse(BaseModel):
+    updated: int
+    not_found: List[Union[int, str]]  # variant ids / SKUs that matched no variant
+
+
 # ---------------- Product Schemas ----------------
 
 class ProductBase(BaseModel):
@@ -159,11 +193,31 @@ class ProductResponse(ProductBase):
     admin_id: int
     created_at: Optional[datetime]
     updated_at: Optional[datetime]
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
     variants: List[ProductVariantResponse] = []
 
     model_config = ConfigDict(from_attributes=True)
 
 
+class FacetValue(BaseModel):
+    value: str
+    count: int
+
+
+class CatalogFacets(BaseModel):
+    brands: List[FacetValue] = []
+    categories: List[FacetValue] = []
+    price: List[FacetValue] = []
+    attributes: Dict[str, List[FacetValue]] = {}
+
+
+class CatalogQueryResponse(BaseModel):
+    items: List[ProductResponse]
+    facets: CatalogFacets
+    next_cursor: Optional[str] = None
+
+
 # ---------------- Image Response ----------------
 
 class ProductImageResponse(BaseModel):
@@ -372,7 +426,7 @@ class OrderItemBase(BaseModel):
     quantity: int
 
 class OrderItemCreate(OrderItemBase):
-    pass
+    quantity: Annotated[int, Field(gt=0)]
 
 class OrderItemResponse(BaseModel):
     id: int
@@ -0,0 +1,174 @@
+import re, threading
+from bisect import bisect_left
+from collections import defaultdict
+from sqlalchemy import func, literal_column, or_, desc, case
+from sqlalchemy.orm import Session
+from app.models import Product
+
+# Product search.
+# On PostgreSQL the ranking runs against two indexes created by the
+# "product search index" migration, both maintained by Postgres on every write:
+#   ix_products_search_document  GIN over to_tsvector(name/brand/description)  -> full text + prefix
+#   ix_products_name_trgm        GIN (pg_trgm) over product_name                 -> typo tolerance
+# Other databases (SQLite test runs) use the in-process InvertedIndex below.
+
+# Must stay byte-for-byte identical to the indexed expression in the migration,
+# otherwise the planner will not use the GIN index.
+SEARCH_DOCUMENT = literal_column(
+    "to_tsvector('simple', coalesce(products.product_name, '') || ' ' || "
+    "coalesce(products.brand, '') || ' ' || coalesce(products.description, ''))"
+)
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> list:
+    return _TOKEN_RE.findall((text or "").lower())
+
+
+def search_product_ids(db: Session, query: str, limit: int, filters: list = ()) -> list:
+    """Return up to `limit` ids of products matching `query` and `filters`, most relevant first."""
+    tokens = tokenize(query)
+    if not tokens:
+        return []
+    if db.get_bind().dialect.name == "postgresql":
+        return _postgres_search(db, query, tokens, limit, filters)
+
+    ranked_ids = inverted_index.search(db, tokens)
+    if filters and ranked_ids:
+        allowed = {r.id for r in db.query(Product.id).filter(Product.id.in_(ranked_ids), *filters)}
+        ranked_ids = [pid for pid in ranked_ids if pid in allowed]
+    return ranked_ids[:limit]
+
+
+def _postgres_search(db: Session, query: str, tokens: list, limit: int, filters: list) -> list:
+    # every token must match, the last one as a prefix so results update while typing
+    ts_query = func.to_tsquery(
+        literal_column("'simple'"),
+        " & ".join(tokens[:-1] + [f"{tokens[-1]}:*"])
+    )
+    name = func.lower(Product.product_name)
+    rank = (
+        func.ts_rank(SEARCH_DOCUMENT, ts_query)
+        + func.similarity(Product.product_name, query)
+        + case((name == query.lower(), 1), else_=0)  # exact name match first
+    )
+    rows = (
+        db.query(Product.id)
+        .filter(or_(
+            SEARCH_DOCUMENT.op("@@")(ts_query),
+            Product.product_name.op("%")(query),
+        ))
+        .filter(*filters)
+        .order_by(desc(rank), Product.id)
+        .limit(limit)
+        .all()
+    )
+    return [r.id for r in rows]
+
+
+def _within_one_edit(a: str, b: str) -> bool:
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    if len(a) == len(b):
+        return a[i + 1:] == b[i + 1:] or (  # substitution
+            i + 1 < len(a) and a[i] == b[i + 1] and a[i + 1] == b[i] and a[i + 2:] == b[i + 2:]  # transposition
+        )
+    return a[i:] == b[i + 1:]  # insertion
+
+
+class InvertedIndex:
+    """
+    Pure-Python fallback used when the database has no full text support.
+    token -> {product_id: field weight}; rebuilt lazily whenever the products
+    table signature (row count, max id, last update) changes.
+    """
+
+    FIELD_WEIGHTS = (("product_name", 3.0), ("brand", 2.0), ("description", 1.0))
+    EXACT, PREFIX, FUZZY = 1.0, 0.7, 0.4
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._signature = None
+        # (postings, sorted vocabulary, lower-cased names), swapped in one assignment
+        self._snapshot = ({}, [], {})
+
+    def invalidate(self):
+        with self._lock:
+            self._signature = None
+
+    def _table_signature(self, db: Session):
+        return tuple(db.query(
+            func.count(Product.id),
+            func.max(Product.id),
+            func.max(func.coalesce(Product.updated_at, Product.created_at)),
+        ).one())
+
+    def _ensure_fresh(self, db: Session):
+        signature = self._table_signature(db)
+        if signature == self._signature:
+            return
+        with self._lock:
+            if signature == self._signature:
+                return
+            postings = defaultdict(dict)
+            names = {}
+            rows = db.query(Product.id, Product.product_name, Product.brand, Product.description)
+            for row in rows.yield_per(1000):
+                names[row.id] = (row.product_name or "").lower()
+                for field, weight in self.FIELD_WEIGHTS:
+                    for token in tokenize(getattr(row, field)):
+                        current = postings[token].get(row.id, 0.0)
+                        postings[token][row.id] = max(current, weight)
+            self._snapshot = (dict(postings), sorted(postings), names)
+            self._signature = signature
+
+    def _expand(self, postings: dict, vocabulary: list, token: str, is_last: bool) -> dict:
+        """Vocabulary terms matching `token` -> match quality."""
+        matches = {}
+        if token in postings:
+            matches[token] = self.EXACT
+        if is_last:
+            start = bisect_left(vocabulary, token)
+            for term in vocabulary[start:]:
+                if not term.startswith(token):
+                    break
+                matches.setdefault(term, self.PREFIX)
+        if not matches and len(token) >= 4:
+            for term in vocabulary:
+                if term[0] == token[0] and _within_one_edit(token, term):
+                    matches[term] = self.FUZZY
+        return matches
+
+    def search(self, db: Session, tokens: list) -> list:
+        self._ensure_fresh(db)
+        postings, vocabulary, names = self._snapshot
+        scores = None
+        for position, token in enumerate(tokens):
+            token_scores = {}
+            for term, quality in self._expand(postings, vocabulary, token, position == len(tokens) - 1).items():
+                for product_id, weight in postings[term].items():
+                    score = quality * weight
+                    if score > token_scores.get(product_id, 0.0):
+                        token_scores[product_id] = score
+            if scores is None:
+                scores = token_scores
+            else:
+                scores = {pid: s + token_scores[pid] for pid, s in scores.items() if pid in token_scores}
+            if not scores:
+                return []
+
+        phrase = " ".join(tokens)
+        for product_id in scores:
+            if names.get(product_id) == phrase:
+                scores[product_id] += 10.0
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return [product_id for product_id, _ in ranked]
+
+
+inverted_index = InvertedIndex()
@@ -1,111 +1,77 @@
-import os, csv, json
-from uuid import uuid4
-from sqlalchemy.orm import Session
-from app.models import Product, ProductVariant, ProductImage, Category
-from app.database import get_db  
+from celery import chord
+from app.database import SessionLocal
+from app.bulk_import import prepare_job, import_job_chunk, finish_job, fail_job, job_progress
+from app.product_stats import refresh_sales_windows
+from app.inventory import release_expired_holds
+from app.cache import catalog_cache, PRODUCT_NAMESPACES
 from app.celery_worker import celery_app
 
-ERROR_DIR = "media/errors"
-UPLOAD_DIR = "media/uploads"
-get_db_session = get_db
-@celery_app.task(name="process_bulk_upload")
-def process_bulk_upload(content: str, image_data: dict, admin_id: int):
-    session = get_db_session()
-    decoded = content.splitlines()
-    reader = csv.DictReader(decoded)
+@celery_app.task(name="start_bulk_import")
+def start_bulk_import(job_id: str):
+    """Split the job's CSV and fan its remaining chunks out as a chord. Safe to call again to resume a job."""
+    session = SessionLocal()
+    try:
+        pending = prepare_job(session, job_id)
+    except Exception as e:
+        fail_job(session, job_id, str(e))
+        raise
+    finally:
+        session.close()
 
-    error_rows = []
-    success_count = 0
-    product_cache = {}
+    if pending:
+        # a chunk that raises skips finish_bulk_import; the errback marks the job failed instead
+        callback = finish_bulk_import.s(job_id).on_error(fail_bulk_import.s(job_id))
+        chord(import_bulk_chunk.s(job_id, index) for index in pending)(callback)
+    else:
+        finish_bulk_import.delay([], job_id)
+    return {"job_id": job_id, "chunks": len(pending)}
 
-    for idx, row in enumerate(reader):
-        try:
-            # Validate required fields 
-            required_fields = ["product_name", "brand", "is_feature", "category_id", "description",
-                               "price", "stock", "attributes", "image_filenames"]
-            for field in required_fields:
-                if not row.get(field):
-                    raise ValueError(f"Missing required field '{field}'")
 
-            product_name = row["product_name"].strip()
-            brand = row["brand"].strip()
-            is_feature = row["is_feature"].lower() == "true"
-            category_id = int(row["category_id"])
-            description = row["description"].strip()
-            price = float(row["price"])
-            stock = int(row["stock"])
-            discount = int(row.get("discount", 0))
-            shipping_time = int(row.get("shipping_time", 0))
-            attributes = json.loads(row["attributes"])
-            image_filenames = [img.strip() for img in row["image_filenames"].split(",")]
+# acks_late: a chunk whose worker dies is redelivered; its marker row makes the retry a no-op once it committed
+@celery_app.task(name="import_bulk_chunk", acks_late=True, reject_on_worker_lost=True)
+def import_bulk_chunk(job_id: str, index: int):
+    session = SessionLocal()
+    try:
+        return import_job_chunk(session, job_id, index)
+    finally:
+        session.close()
 
-            category = session.query(Category).filter(Category.id == category_id).first()
-            if not category:
-                raise ValueError(f"Category ID {category_id} does not exist")
 
-            product_key = f"{product_name}_{category_id}"
-            if product_key in product_cache:
-                new_product = product_cache[product_key]
-            else:
-                new_product = Product(
-                    sku=str(uuid4()),
-                    product_name=product_name,
-                    brand=brand,
-                    is_feature=is_feature,
-                    category_id=category_id,
-                    description=description,
-                    admin_id=admin_id
-                )
-                session.add(new_product)
-                session.flush()
-                session.refresh(new_product)
-                product_cache[product_key] = new_product
+@celery_app.task(name="finish_bulk_import")
+def finish_bulk_import(results: list, job_id: str):
+    session = SessionLocal()
+    try:
+        job = finish_job(session, job_id)
+        if job.rows_done:
+            catalog_cache.invalidate(*PRODUCT_NAMESPACES)
+        return job_progress(session, job)
+    finally:
+        session.close()
 
-            new_variant = ProductVariant(
-                product_id=new_product.id,
-                price=price,
-                stock=stock,
-                discount=discount,
-                shipping_time=shipping_time,
-                attributes=attributes
-            )
-            session.add(new_variant)
-            session.flush()
-            session.refresh(new_variant)
 
-            for img_name in image_filenames:
-                if img_name not in image_data:
-                    raise ValueError(f"Image file '{img_name}' not found")
-                image_bytes = bytes(image_data[img_name])
-                save_path = os.path.join(UPLOAD_DIR, f"{uuid4().hex[:6]}_{img_name}")
-                with open(save_path, "wb") as f:
-                    f.write(image_bytes)
-                image_url = f"/media/uploads/{os.path.basename(save_path)}"
-                session.add(ProductImage(variant_id=new_variant.id, image_url=image_url))
+# Celery calls an errback taking (request, exc, traceback) directly, with the job id appended from .s(job_id)
+@celery_app.task(name="fail_bulk_import")
+def fail_bulk_import(request, exc, traceback, job_id: str):
+    session = SessionLocal()
+    try:
+        fail_job(session, job_id, str(exc))
+    finally:
+        session.close()
 
-            session.commit()
-            success_count += 1
-
-        except Exception as e:
-            session.rollback()
-            row["error"] = str(e)
-            error_rows.append(row)
-
-    error_file_path = None
-    if error_rows:
-        os.makedirs(ERROR_DIR, exist_ok=True)
-        error_file_path = os.path.join(ERROR_DIR, f"errors_{uuid4().hex[:6]}.csv")
-        with open(error_file_path, "w", newline="", encoding="utf-8") as err_file:
-            writer = csv.DictWriter(err_file, fieldnames=reader.fieldnames + ["error"])
-            writer.writeheader()
-            writer.writerows(error_rows)
-
-    return {
-        "message": f"{success_count} variants uploaded successfully",
-        "errors": len(error_rows),
-        "error_file": error_file_path,
-        "sample_errors": error_rows[:5]
-    }
 
+@celery_app.task(name="refresh_product_sales_windows")
+def refresh_product_sales_windows():
+    session = SessionLocal()
+    try:
+        return {"products_refreshed": refresh_sales_windows(session)}
+    finally:
+        session.close()
 
 
+@celery_app.task(name="release_expired_inventory_holds")
+def release_expired_inventory_holds():
+    session = SessionLocal()
+    try:
+        return {"orders_cancelled": release_expired_holds(session)}
+    finally:
+        session.close()
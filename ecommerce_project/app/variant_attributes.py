@@ -0,0 +1,120 @@
+from collections import defaultdict
+from typing import Dict, Set
+from sqlalchemy import select, delete, func, and_, or_
+from sqlalchemy.orm import Session
+from app.database import dialect_insert
+from app.models import Product, ProductVariant, VariantAttribute, CategoryVariantAttribute, VariantAttributeValue
+
+# ProductVariant.attributes (JSON) stays the source of truth for reads; every write
+# re-syncs the owning products' rows in variant_attribute_values so attribute
+# filters become (attribute_id, value) index lookups instead of JSON scans.
+
+
+def _attribute_ids(db: Session, names) -> dict:
+    """name -> VariantAttribute.id, creating missing attributes."""
+    names = sorted(set(names))
+    if not names:
+        return {}
+    insert = dialect_insert(db)
+    db.execute(
+        insert(VariantAttribute.__table__)
+        .values([{"name": name} for name in names])
+        .on_conflict_do_nothing(index_elements=["name"])
+    )
+    rows = db.query(VariantAttribute.id, VariantAttribute.name).filter(VariantAttribute.name.in_(names))
+    return {row.name: row.id for row in rows}
+
+
+def _link_categories(db: Session, pairs: set):
+    """Record which attributes each category uses (category_variant_attributes)."""
+    if not pairs:
+        return
+    existing = set(
+        db.query(CategoryVariantAttribute.category_id, CategoryVariantAttribute.attribute_id)
+        .filter(CategoryVariantAttribute.category_id.in_({category_id for category_id, _ in pairs}))
+        .all()
+    )
+    missing = pairs - existing
+    if missing:
+        db.execute(
+            CategoryVariantAttribute.__table__.insert(),
+            [{"category_id": category_id, "attribute_id": attribute_id} for category_id, attribute_id in sorted(missing)],
+        )
+
+
+def sync_product_attributes(db: Session, product_ids):
+    """Rebuild the attribute rows of the given products' variants. Call after the variants are flushed."""
+    product_ids = [pid for pid in set(product_ids) if pid]
+    if not product_ids:
+        return
+    db.execute(delete(VariantAttributeValue).where(VariantAttributeValue.product_id.in_(product_ids)))
+
+    variants = (
+        db.query(ProductVariant.id, ProductVariant.product_id, ProductVariant.attributes, Product.category_id)
+        .join(Product, Product.id == ProductVariant.product_id)
+        .filter(ProductVariant.product_id.in_(product_ids), ProductVariant.is_archived == False)
+        .all()
+    )
+    entries = []
+    for variant in variants:
+        for name, value in (variant.attributes or {}).items():
+            if value is not None and str(value).strip() != "":
+                entries.append((variant, name.strip(), str(value).strip()))
+    if not entries:
+        return
+
+    ids = _attribute_ids(db, [name for _, name, _ in entries])
+    rows = {
+        (ids[name], value, variant.id): {
+            "attribute_id": ids[name], "value": value, "variant_id": variant.id, "product_id": variant.product_id,
+        }
+        for variant, name, value in entries
+    }
+    db.execute(VariantAttributeValue.__table__.insert(), list(rows.values()))
+    _link_categories(db, {(variant.category_id, ids[name]) for variant, name, _ in entries if variant.category_id})
+
+
+def backfill_variant_attributes(db: Session, batch_size: int = 500) -> int:
+    product_ids = [pid for (pid,) in db.query(Product.id).order_by(Product.id)]
+    for start in range(0, len(product_ids), batch_size):
+        sync_product_attributes(db, product_ids[start:start + batch_size])
+        db.commit()
+    return len(product_ids)
+
+
+def matching_variant_ids(attributes: Dict[str, Set[str]]):
+    """
+    SELECT of the variant ids having every requested attribute (any of its values),
+    e.g. {"color": {"red"}, "size": {"M", "L"}}. Each (name, value) pair is a primary key range scan.
+    """
+    pairs = or_(*[
+        and_(VariantAttribute.name == name, VariantAttributeValue.value.in_(sorted(values)))
+        for name, values in attributes.items()
+    ])
+    return (
+        select(VariantAttributeValue.variant_id)
+        .join(VariantAttribute, VariantAttribute.id == VariantAttributeValue.attribute_id)
+        .where(pairs)
+        .group_by(VariantAttributeValue.variant_id)
+        .having(func.count(func.distinct(VariantAttributeValue.attribute_id)) == len(attributes))
+    )
+
+
+def matching_product_ids(attributes: Dict[str, Set[str]]):
+    """Like matching_variant_ids, for products with at least one such variant."""
+    return (
+        matching_variant_ids(attributes)
+        .with_only_columns(VariantAttributeValue.product_id)
+        .group_by(VariantAttributeValue.product_id)
+    )
+
+
+def parse_attribute_filters(values) -> dict:
+    """["color:red", "size:M", "size:L"] -> {"color": {"red"}, "size": {"M", "L"}}; raises ValueError."""
+    attributes = defaultdict(set)
+    for item in values or []:
+        name, sep, value = item.partition(":")
+        if not sep or not name.strip() or not value.strip():
+            raise ValueError(f"Invalid attribute filter '{item}', expected name:value")
+        attributes[name.strip()].add(value.strip())
+    return dict(attributes)
@@ -0,0 +1,72 @@
+"""
+Bulk product import throughput: generates a CSV of N variant rows (5 per product, ~1% with an
+unknown category) and runs app.bulk_import.import_products over it, reporting rows/s and the
+number of SQL statements. Stored images and the error CSV go to a temporary working directory.
+
+    python benchmarks/bulk_import_throughput.py --rows 50000
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+
+from common import Timer, add_database_argument, setup_database
+
+VARIANTS_PER_PRODUCT = 5
+UNKNOWN_CATEGORY = 999
+
+
+def csv_lines(rows: int, categories: int, seed: str):
+    rng = random.Random(42)
+    yield "product_name,brand,is_feature,category_id,description,price,stock,discount,shipping_time,attributes,image_filenames\n"
+    for i in range(rows):
+        product = i // VARIANTS_PER_PRODUCT
+        category = UNKNOWN_CATEGORY if i % 97 == 0 else product % categories + 1
+        attributes = json.dumps({"color": rng.choice(["red", "blue"]), "size": str(i % VARIANTS_PER_PRODUCT)})
+        yield (f'{seed} product {product},brand{product % 50},false,{category},desc,{10 + i % 90},{i % 20},'
+               f'{i % 3 * 5},3,"{attributes.replace(chr(34), chr(34) * 2)}",a.jpg\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    add_database_argument(parser)
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--chunk-size", type=int, default=None, help="default: settings.bulk_import_chunk_size")
+    parser.add_argument("--categories", type=int, default=5)
+    args = parser.parse_args()
+
+    SessionLocal = setup_database(args.database_url)
+    from app.bulk_import import import_products
+    from app.config import settings
+    from app.database import count_queries, engine
+    from app.models import Category
+
+    db = SessionLocal()
+    for category_id in range(1, args.categories + 1):
+        if not db.get(Category, category_id):
+            db.add(Category(id=category_id, category_name=f"Benchmark {category_id}"))
+    db.commit()
+
+    workdir = tempfile.mkdtemp()
+    os.chdir(workdir)
+    image = os.path.join(workdir, "a.jpg")
+    with open(image, "wb") as f:
+        f.write(b"\xff\xd8" + b"\0" * 1024)
+
+    timer = Timer()
+    with count_queries(engine) as counter, timer:
+        result = import_products(
+            db, csv_lines(args.rows, args.categories, os.urandom(4).hex()), {"a.jpg": image}, admin_id=1,
+            chunk_size=args.chunk_size,
+        )
+    seconds = timer.samples[0] / 1000
+    print(f"{args.rows} rows on {db.get_bind().dialect.name}, chunk size {args.chunk_size or settings.bulk_import_chunk_size}")
+    print(f"  imported {result.success_count}, rejected {result.error_count}")
+    print(f"  {seconds:.2f}s, {args.rows / seconds:.0f} rows/s, {counter.count} statements")
+    print(f"  files written under {workdir}")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Catalog list serialization: the pre-shaped rows of app.catalog encoded by app.serialization.dumps,
+against the previous path (validate every row against List[ProductResponse], then FastAPI's
+jsonable_encoder + json.dumps). Both paths must produce the same JSON; only encoding is timed.
+
+    python benchmarks/catalog_serialization.py --products 10000
+"""
+import argparse
+import json
+from datetime import datetime, timezone
+from typing import List
+
+from common import Timer, setup_database
+
+
+def build_products(count: int, variants: int, images: int):
+    # transient rows with their relationships set, as catalog_query() returns them
+    from app.models import Product, ProductImage, ProductVariant
+
+    now = datetime(2026, 1, 15, 12, 30, 5, 123456, tzinfo=timezone.utc)
+    products = []
+    for i in range(count):
+        product = Product(
+            id=i + 1, sku=f"SKU-{i}", admin_id=1, product_name=f'"Shirt {i}"', brand="Nike", category_id=1,
+            description="cotton shirt", created_at=now, updated_at=now, min_price=9.0, max_price=12.7,
+        )
+        for j in range(variants):
+            variant = ProductVariant(
+                id=i * variants + j + 1, sku=f"SKU-{i}-{j}", price=10.0 + i * 0.1 + j, stock=5, discount=10,
+                shipping_time=3, attributes={"color": ["red", "blue"][j % 2], "size": "M"},
+            )
+            variant.images = [ProductImage(image_url=f"/media/{i}_{j}_{k}.png") for k in range(images)]
+            product.variants.append(variant)
+        products.append(product)
+    return products
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--products", type=int, default=10000)
+    parser.add_argument("--variants", type=int, default=4)
+    parser.add_argument("--images", type=int, default=2)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    setup_database()
+    from fastapi.encoders import jsonable_encoder
+    from pydantic import TypeAdapter
+    import app.serialization as serialization
+    from app.catalog import serialize_product
+    from app.schemas import ProductResponse
+
+    products = build_products(args.products, args.variants, args.images)
+    adapter = TypeAdapter(List[ProductResponse])
+
+    def previous():
+        # FastAPI 0.110 serialize_response + JSONResponse.render for a response_model route
+        validated = adapter.validate_python([serialize_product(p) for p in products])
+        content = jsonable_encoder(adapter.dump_python(validated, mode="json"))
+        return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode()
+
+    def pre_shaped():
+        return serialization.dumps([serialize_product(p) for p in products])
+
+    orjson = serialization.orjson
+
+    def pre_shaped_json_fallback():
+        serialization.orjson = None
+        try:
+            return pre_shaped()
+        finally:
+            serialization.orjson = orjson
+
+    reference = json.loads(previous())
+    print(f"{args.products} products x {args.variants} variants x {args.images} images, "
+          f"{len(previous()) / 1e6:.1f} MB of JSON")
+    paths = [previous, pre_shaped_json_fallback] + ([pre_shaped] if orjson is not None else [])
+    for path in paths:
+        assert json.loads(path()) == reference, f"{path.__name__} output differs from the previous path"
+        timer = Timer()
+        for _ in range(args.rounds):
+            with timer:
+                path()
+        print(f"  {path.__name__:26} {timer.summary()}")
+    if orjson is None:
+        print("  orjson is not installed, only the json fallback was measured")
+
+
+if __name__ == "__main__":
+    main()
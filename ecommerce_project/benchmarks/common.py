@@ -0,0 +1,79 @@
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Shared setup for the benchmark scripts in this directory, run from ecommerce_project/:
+#     python benchmarks/search_latency.py [--database-url URL]
+# Without --database-url they run on a throwaway SQLite file. A URL must point at a scratch
+# database already migrated with `alembic upgrade head`: the scripts insert rows and leave them.
+
+# app.config requires these; no benchmark talks to mail, Stripe, PayPal or Google
+PLACEHOLDER_SETTINGS = dict(
+    MAIL_USERNAME="bench", MAIL_PASSWORD="bench", MAIL_FROM="bench@example.com", MAIL_PORT="465",
+    MAIL_SERVER="localhost", MAIL_FROM_NAME="bench", MAIL_STARTTLS="False", MAIL_SSL_TLS="True",
+    STRIPE_SECRET_KEY="sk_test", STRIPE_WEBHOOK_SECRET="whsec_test", PAYPAL_CLIENT_ID="bench",
+    FRONTEND_URL="http://localhost:3000", GOOGLE_CLIENT_ID="bench", GOOGLE_CLIENT_SECRET="bench",
+    GOOGLE_REDIRECT_URI="http://localhost:8000/auth/google/callback",
+)
+
+
+def add_database_argument(parser):
+    parser.add_argument("--database-url", help="scratch database migrated to head (default: temporary SQLite file)")
+
+
+def setup_database(database_url=None):
+    """Point app.database at the benchmark database and return its SessionLocal. Call before importing app modules."""
+    for key, value in PLACEHOLDER_SETTINGS.items():
+        os.environ.setdefault(key, value)
+    sqlite_file = None
+    if not database_url:
+        sqlite_file = os.path.join(tempfile.mkdtemp(), "bench.db")
+        database_url = f"sqlite:///{sqlite_file}"
+    os.environ["DATABASE_URL"] = database_url
+    os.environ.pop("DATABASE_REPLICA_URLS", None)
+
+    from sqlalchemy import text
+    from app import models
+    from app.database import Base, SessionLocal, engine
+
+    if sqlite_file:
+        # a few tables default their timestamps to Postgres' now(), which SQLite does not parse in DDL
+        for table in Base.metadata.tables.values():
+            for column in table.columns:
+                if column.server_default is not None and str(getattr(column.server_default, "arg", "")) == "now()":
+                    column.server_default.arg = text("CURRENT_TIMESTAMP")
+        Base.metadata.create_all(engine)
+
+    db = SessionLocal()
+    if not db.get(models.Category, 1):
+        db.add(models.Category(id=1, category_name="Benchmark"))
+    if not db.get(models.User, 1):
+        db.add(models.User(id=1, name="bench", username="bench", email="bench@example.com", hashed_password="x"))
+    db.commit()
+    db.close()
+    return SessionLocal
+
+
+class Timer:
+    """Wall-clock samples in milliseconds."""
+
+    def __init__(self):
+        self.samples = []
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.samples.append((time.perf_counter() - self._start) * 1000)
+
+    def percentile(self, p: float) -> float:
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+    def summary(self) -> str:
+        return (f"n={len(self.samples)} p50={self.percentile(50):.1f}ms "
+                f"p95={self.percentile(95):.1f}ms max={max(self.samples):.1f}ms")
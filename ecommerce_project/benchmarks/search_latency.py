@@ -0,0 +1,68 @@
+"""
+Product search latency: seeds N products and times app.search.search_product_ids over a mix of
+whole-word, prefix-while-typing and misspelled queries. PostgreSQL uses the GIN indexes from the
+search index migration; SQLite uses the in-process inverted index, whose one-off build is timed separately.
+
+    python benchmarks/search_latency.py --products 100000
+"""
+import argparse
+import random
+
+from common import Timer, add_database_argument, setup_database
+
+WORDS = ["red", "blue", "cotton", "leather", "smart", "watch", "phone", "shoe", "running", "classic",
+         "slim", "fit", "denim", "jacket", "wireless", "linen", "wool", "sport", "casual", "vintage"]
+BRANDS = ["nike", "puma", "apple", "zara", "levis", "adidas"]
+QUERIES = ["denim", "smart wat", "leathr jacket", "red cotton shoe", "nike run", "vintage wool", "wireles", "m4242"]
+
+
+def seed(SessionLocal, count: int, batch: int = 10000):
+    from app.models import Product
+
+    rng = random.Random(42)
+    db = SessionLocal()
+    start = db.query(Product).count()
+    for offset in range(start, start + count, batch):
+        db.execute(Product.__table__.insert(), [
+            dict(sku=f"bench-{i}", product_name=" ".join(rng.sample(WORDS, 3)) + f" m{i}",
+                 brand=rng.choice(BRANDS), category_id=1, description=" ".join(rng.sample(WORDS, 6)), admin_id=1)
+            for i in range(offset, min(offset + batch, start + count))
+        ])
+        db.commit()
+    db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    add_database_argument(parser)
+    parser.add_argument("--products", type=int, default=100000)
+    parser.add_argument("--rounds", type=int, default=25, help="passes over the query mix")
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    SessionLocal = setup_database(args.database_url)
+    from app.search import search_product_ids
+
+    seed(SessionLocal, args.products)
+    db = SessionLocal()
+    print(f"{args.products} products on {db.get_bind().dialect.name}")
+
+    build = Timer()
+    with build:
+        search_product_ids(db, QUERIES[0], args.limit)
+    print(f"first query (index build on SQLite): {build.samples[0]:.0f}ms")
+
+    overall = Timer()
+    per_query = {query: Timer() for query in QUERIES}
+    for _ in range(args.rounds):
+        for query in QUERIES:
+            with per_query[query], overall:
+                search_product_ids(db, query, args.limit)
+    for query, timer in per_query.items():
+        print(f"  {query!r:20} {timer.summary()}")
+    print(f"all queries          {overall.summary()}")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
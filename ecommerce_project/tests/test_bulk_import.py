@@ -0,0 +1,123 @@
+"""
+CSV product import: rows the database rejects only fail themselves, not the rest of their chunk,
+a dry run reports what the import would do without writing anything, and re-importing a feed in
+upsert mode updates the catalog in place.
+"""
+import csv
+import os
+
+import pytest
+
+from app import models
+from app.bulk_import import import_products
+
+HEADER = "product_name,brand,is_feature,category_id,description,price,stock,attributes,image_filenames,variant_sku\n"
+
+
+def feed_row(name, price=10, color="red", variant_sku="", brand="Nike", category_id=1, image="a.jpg"):
+    return f'{name},{brand},false,{category_id},cotton shirt,{price},5,"{{""color"": ""{color}""}}",{image},{variant_sku}\n'
+
+
+@pytest.fixture
+def image(tmp_path, monkeypatch):
+    # media/ goes to a scratch directory
+    monkeypatch.chdir(tmp_path)
+    path = tmp_path / "a.jpg"
+    path.write_bytes(b"\xff\xd8")
+    return {"a.jpg": str(path)}
+
+
+def upload(client, lines, **params):
+    return client.post(
+        "/products/bulk-upload", params=params,
+        files=[("file", ("products.csv", "".join(lines).encode())), ("images", ("a.jpg", b"\xff\xd8"))],
+    )
+
+
+def error_rows(result):
+    with open(result.error_file, newline="", encoding="utf-8") as f:
+        return [(row["product_name"], row["error"]) for row in csv.DictReader(f)]
+
+
+def test_database_error_only_fails_the_offending_rows(db, image):
+    taken = models.Product(sku="OLD", product_name="Old shirt", brand="Nike", category_id=1, description="", admin_id=1)
+    taken.variants.append(models.ProductVariant(sku="V-TAKEN", price=5, stock=1, attributes={"color": "red"}))
+    db.add(taken)
+    db.commit()
+
+    # one chunk; two rows reuse a variant SKU another product already has, which only the INSERT finds out
+    lines = [HEADER] + [
+        feed_row(f"Shirt {i}", variant_sku="V-TAKEN" if i in (2, 5) else f"V-{i}") for i in range(8)
+    ] + [feed_row("Shirt 0", color="blue")]
+    result = import_products(db, lines, image, admin_id=1, chunk_size=100)
+
+    assert (result.success_count, result.error_count) == (7, 2)
+    assert [name for name, _ in error_rows(result)] == ["Shirt 2", "Shirt 5"]
+    assert all("sku" in error for _, error in error_rows(result))
+    # the rejected rows' products were rolled back with them, Shirt 0 got both its variants
+    names = sorted(name for name, in db.query(models.Product.product_name))
+    assert names == ["Old shirt"] + [f"Shirt {i}" for i in (0, 1, 3, 4, 6, 7)]
+    shirt = db.query(models.Product).filter_by(product_name="Shirt 0").one()
+    assert sorted(variant.attributes["color"] for variant in shirt.variants) == ["blue", "red"]
+    assert db.query(models.ProductVariant).count() == 8
+
+
+def test_dry_run_reports_without_writing(client, db, image):
+    lines = [
+        HEADER,
+        feed_row("Shirt 0"),
+        feed_row("Shirt 0", color="blue", brand="Puma"),
+        feed_row("Shirt 0"),
+        feed_row("Shirt 1", category_id=99),
+        feed_row("Shirt 2", image="missing.jpg"),
+        feed_row("Shirt 3", price="abc"),
+    ]
+    response = upload(client, lines, dry_run="true")
+    assert response.status_code == 200, response.text
+    report = response.json()
+
+    assert (report["dry_run"], report["rows"], report["valid_rows"], report["products"], report["errors"]) == (True, 6, 3, 1, 3)
+    assert [(error["row"], error["product_name"]) for error in report["error_details"]] == [
+        (5, "Shirt 1"), (6, "Shirt 2"), (7, "Shirt 3"),
+    ]
+    assert "Category ID 99" in report["error_details"][0]["error"]
+    assert "missing.jpg" in report["error_details"][1]["error"]
+    assert [(warning["row"], warning["warning"]) for warning in report["warnings"]] == [
+        (3, "product fields differ from row 2, the values of row 2 are used"),
+        (4, "same product and attributes as row 2, a duplicate variant would be created"),
+    ]
+    with open(report["error_file"], newline="", encoding="utf-8") as f:
+        assert [row["product_name"] for row in csv.DictReader(f)] == ["Shirt 1", "Shirt 2", "Shirt 3"]
+
+    # nothing was imported, staged or stored
+    assert db.query(models.Product).count() == 0
+    assert db.query(models.ProductVariant).count() == 0
+    assert db.query(models.ImportJob).count() == 0
+    assert not os.path.exists("media/uploads")
+    assert not os.path.exists("imports") or not os.listdir("imports")
+
+
+def test_upsert_reimport_is_idempotent(client, db, image):
+    def feed(price):
+        return [
+            HEADER,
+            feed_row("Shirt 0", price=price, variant_sku="V-0"),
+            feed_row("Shirt 0", price=price, color="blue"),
+            feed_row("Shirt 1", price=price),
+            feed_row("Shirt 2", price=price, variant_sku="V-2"),
+        ]
+
+    counts = []
+    for price in (10, 10, 12):
+        response = upload(client, feed(price), mode="upsert")
+        assert response.status_code == 201, response.text
+        assert response.json()["errors"] == 0
+        db.expire_all()
+        counts.append((
+            db.query(models.Product).count(), db.query(models.ProductVariant).count(), db.query(models.ProductImage).count(),
+        ))
+
+    assert counts == [(3, 4, 4)] * 3
+    # the last feed's prices were written over the same variants
+    assert sorted(variant.price for variant in db.query(models.ProductVariant)) == [12] * 4
+    assert sorted(product.min_price for product in db.query(models.Product)) == [12] * 3
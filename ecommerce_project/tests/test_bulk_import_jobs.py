@@ -0,0 +1,74 @@
+"""
+Chunked bulk import jobs: progress is reported per committed chunk, a chunk that raises marks the
+job failed (the chord errback), and resuming the job only imports the chunks that never committed.
+"""
+import io
+
+import pytest
+
+from app import models
+from app.bulk_import import stage_upload, prepare_job, import_job_chunk, finish_job
+from app.config import settings
+from app.tasks import fail_bulk_import
+
+HEADER = "product_name,brand,is_feature,category_id,description,price,stock,attributes,image_filenames\n"
+
+
+def feed(count):
+    return HEADER + "".join(
+        f'Shirt {i},Nike,false,1,cotton shirt,{10 + i},5,"{{""size"": ""M""}}",a.jpg\n' for i in range(count)
+    )
+
+
+@pytest.fixture
+def job(db, tmp_path, monkeypatch):
+    # media/ and the staging directory go to a scratch directory
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(settings, "bulk_import_dir", str(tmp_path / "imports"))
+    monkeypatch.setattr(settings, "bulk_import_chunk_size", 2)
+    staged = stage_upload(io.BytesIO(feed(5).encode()), {"a.jpg": io.BytesIO(b"\xff\xd8")})
+    job = models.ImportJob(id="job1", admin_id=1, directory=staged.directory, image_paths=staged.image_paths)
+    db.add(job)
+    db.commit()
+    return job
+
+
+def progress(client, job_id):
+    response = client.get(f"/products/bulk-upload/status/{job_id}")
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_progress_failure_and_resume(client, db, job):
+    assert prepare_job(db, job.id) == [0, 1, 2]
+    import_job_chunk(db, job.id, 0)
+
+    status = progress(client, job.id)
+    assert status["status"] == "running"
+    assert (status["total_rows"], status["rows_done"], status["chunks_done"], status["chunk_count"]) == (5, 2, 1, 3)
+    assert status["percent"] == 40.0
+    assert status["eta_seconds"] is not None
+
+    # chunk 1 raised in its worker: the chord skips finish_bulk_import and calls the errback
+    fail_bulk_import(None, RuntimeError("worker lost"), None, job.id)
+    status = progress(client, job.id)
+    assert (status["status"], status["error"], status["eta_seconds"]) == ("failed", "worker lost", None)
+    assert status["rows_done"] == 2
+
+    # /resume runs start_bulk_import again, which only fans out the chunks that never committed
+    db.expire_all()  # the errback committed from its own session
+    assert prepare_job(db, job.id) == [1, 2]
+    assert import_job_chunk(db, job.id, 0)["skipped"]
+    for index in (1, 2):
+        import_job_chunk(db, job.id, index)
+    finish_job(db, job.id)
+
+    status = progress(client, job.id)
+    assert (status["status"], status["error"], status["rows_done"], status["rows_failed"]) == ("completed", None, 5, 0)
+    assert (status["chunks_done"], status["percent"]) == (3, 100.0)
+    assert db.query(models.Product).count() == 5
+    assert db.query(models.ProductVariant).count() == 5
+
+
+def test_status_of_unknown_job(client):
+    assert client.get("/products/bulk-upload/status/missing").status_code == 404
@@ -0,0 +1,123 @@
+"""
+app.cache: the in-process backend is a bounded LRU whose entries expire with their TTL. Workers
+sharing a backend see each other's invalidations, compute a missing value once between them, and
+fall back to the loader when the backend is down.
+"""
+import threading
+import time
+
+from app.cache import Cache, MemoryBackend, FEATURED_PRODUCTS, BRANDS
+
+
+def test_least_recently_used_entry_is_evicted():
+    backend = MemoryBackend(max_entries=2)
+    backend.set("a", b"1", ttl=60)
+    backend.set("b", b"2", ttl=60)
+    assert backend.get("a") == b"1"  # "b" is now the least recently used
+    backend.set("c", b"3", ttl=60)
+
+    assert (backend.get("a"), backend.get("b"), backend.get("c")) == (b"1", None, b"3")
+    assert backend.info()["entries"] == 2
+    assert backend.evictions == 1
+
+
+def test_entries_expire_with_their_ttl():
+    backend = MemoryBackend()
+    backend.set("short", b"1", ttl=0.05)
+    backend.set("long", b"2", ttl=60)
+    time.sleep(0.1)
+    assert (backend.get("short"), backend.get("long")) == (None, b"2")
+    # an expired key can be taken again, e.g. by the next recompute lock
+    assert backend.add("short", b"3", ttl=60)
+
+
+def test_expired_value_is_loaded_again():
+    cache = Cache(MemoryBackend())
+    loads = []
+
+    def loader():
+        loads.append(1)
+        return {"products": len(loads)}
+
+    assert cache.get_or_set((FEATURED_PRODUCTS,), loader, ttl=0.05) == {"products": 1}
+    assert cache.get_or_set((FEATURED_PRODUCTS,), loader, ttl=0.05) == {"products": 1}
+    time.sleep(0.1)
+    assert cache.get_or_set((FEATURED_PRODUCTS,), loader, ttl=0.05) == {"products": 2}
+    stats = cache.stats()["namespaces"][FEATURED_PRODUCTS]
+    assert (stats["hits"], stats["misses"]) == (1, 2)
+
+
+def test_invalidation_reaches_every_worker():
+    backend = MemoryBackend()
+    worker, other_worker = Cache(backend), Cache(backend)
+    for cache in (worker, other_worker):
+        assert cache.get_or_set((FEATURED_PRODUCTS,), lambda: "old") == "old"
+        assert cache.get_or_set((BRANDS,), lambda: ["Nike"]) == ["Nike"]
+
+    worker.invalidate(FEATURED_PRODUCTS)
+
+    # the version bump is published, no worker waits out VERSION_TTL or the entry's TTL
+    for cache in (worker, other_worker):
+        assert cache.get_or_set((FEATURED_PRODUCTS,), lambda: "new") == "new"
+        assert cache.get_or_set((BRANDS,), lambda: ["Puma"]) == ["Nike"]
+    assert backend.get_counter("cache:version:featured_products") == 1
+
+
+def test_concurrent_misses_run_the_loader_once():
+    backend = MemoryBackend()
+    workers = [Cache(backend), Cache(backend)]  # two processes, four threads each
+    start = threading.Barrier(8)
+    calls, results = [], []
+
+    def loader():
+        calls.append(1)
+        time.sleep(0.2)
+        return {"products": 3}
+
+    def read(cache):
+        start.wait()
+        results.append(cache.get_or_set((FEATURED_PRODUCTS,), loader))
+
+    threads = [threading.Thread(target=read, args=(workers[i % 2],)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results == [{"products": 3}] * 8
+    stats = [cache.stats()["namespaces"][FEATURED_PRODUCTS] for cache in workers]
+    assert sum(s["misses"] for s in stats) == 8
+    assert sum(s["coalesced"] for s in stats) == 7
+
+
+class DownBackend(MemoryBackend):
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    def _fail(self, *args, **kwargs):
+        self.calls += 1
+        raise ConnectionError("backend unreachable")
+
+    get = set = add = get_counter = incr = publish = _fail
+
+
+def test_backend_down_falls_back_to_the_loader():
+    backend = DownBackend()
+    cache = Cache(backend)
+
+    assert cache.get_or_set((FEATURED_PRODUCTS,), lambda: {"products": 1}) == {"products": 1}
+    calls = backend.calls
+    # within RETRY_AFTER the backend is skipped instead of timing out on every read
+    assert cache.get_or_set((FEATURED_PRODUCTS,), lambda: {"products": 2}) == {"products": 2}
+    assert backend.calls == calls
+    # an invalidation after a commit never raises
+    cache.invalidate(FEATURED_PRODUCTS)
+    assert cache.stats()["namespaces"][FEATURED_PRODUCTS]["errors"] == 2
+
+    # back up: reads go through the backend again
+    cache.backend = MemoryBackend()
+    cache._down_until = 0.0
+    assert cache.get_or_set((FEATURED_PRODUCTS,), lambda: {"products": 3}) == {"products": 3}
+    assert cache.get_or_set((FEATURED_PRODUCTS,), lambda: {"products": 4}) == {"products": 3}
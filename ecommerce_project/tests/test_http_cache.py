@@ -0,0 +1,70 @@
+"""
+Catalog listings and product detail carry an ETag and Last-Modified; a client copy that is still
+current gets a 304 from the validator query alone, and deleting a product changes the validator
+even when no max() over the version columns moves.
+"""
+import pytest
+
+from app import models
+from app.database import count_queries
+
+
+def seed_products(db, count):
+    products = []
+    for i in range(count):
+        product = models.Product(
+            sku=f"SKU-{i}", product_name=f"Shirt {i}", brand="Nike", category_id=1, description="cotton shirt",
+            admin_id=1, is_feature=True,
+        )
+        product.variants.append(models.ProductVariant(price=10 + i, stock=5, discount=0, attributes={"color": "red"}))
+        products.append(product)
+    db.add_all(products)
+    db.commit()
+    return products
+
+
+@pytest.mark.parametrize("url", [
+    "/products/allproducts",
+    "/products/featuredproducts",
+    "/products/category/1",
+    "/products/{product_id}",
+])
+def test_current_copy_gets_304(client, db, url):
+    url = url.format(product_id=seed_products(db, 3)[0].id)
+    first = client.get(url)
+    assert first.status_code == 200
+    etag, last_modified = first.headers["etag"], first.headers["last-modified"]
+    assert first.headers["cache-control"].startswith("public, max-age=")
+
+    with count_queries() as counter:
+        response = client.get(url, headers={"If-None-Match": etag})
+    assert (response.status_code, response.content) == (304, b"")
+    assert response.headers["etag"] == etag
+    # answered from the validator, the page is neither loaded nor serialized
+    assert counter.count <= 2
+
+    assert client.get(url, headers={"If-None-Match": f'W/{etag}, "other"'}).status_code == 304
+    assert client.get(url, headers={"If-Modified-Since": last_modified}).status_code == 304
+    assert client.get(url, headers={"If-Modified-Since": "Mon, 01 Jan 2001 00:00:00 GMT"}).status_code == 200
+    assert client.get(url, headers={"If-None-Match": '"stale"'}).status_code == 200
+    # If-None-Match wins over If-Modified-Since
+    assert client.get(url, headers={"If-None-Match": '"stale"', "If-Modified-Since": last_modified}).status_code == 200
+
+
+def test_query_parameters_are_part_of_the_etag(client, db):
+    seed_products(db, 3)
+    assert client.get("/products/allproducts").headers["etag"] != client.get("/products/allproducts?limit=1").headers["etag"]
+
+
+def test_product_delete_changes_the_listing_validator(client, db):
+    # not the newest product: max(id), max(updated_at) and max(created_at) all stay the same
+    oldest = seed_products(db, 3)[0]
+    etag = client.get("/products/allproducts").headers["etag"]
+
+    assert client.delete(f"/products/{oldest.id}").status_code == 202
+    assert db.query(models.CatalogVersion).one().deletions == 1
+
+    response = client.get("/products/allproducts", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert len(response.json()) == 2
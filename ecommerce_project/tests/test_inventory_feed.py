@@ -0,0 +1,77 @@
+"""
+The price / stock feed applies per-variant deltas, addressed by id or SKU, touching only the fields
+each delta carries; unknown variants are reported back and malformed deltas reject the feed.
+"""
+import pytest
+
+from app import models
+
+FEED = "/products/variants/inventory"
+
+
+def seed_variants(db):
+    product = models.Product(
+        sku="SKU-1", product_name="Shirt", brand="Nike", category_id=1, description="cotton shirt", admin_id=1,
+    )
+    product.variants = [
+        models.ProductVariant(sku="V-RED", price=10, stock=5, discount=0, attributes={"color": "red"}),
+        models.ProductVariant(sku="V-BLUE", price=20, stock=5, discount=10, attributes={"color": "blue"}),
+    ]
+    db.add(product)
+    db.commit()
+    return product
+
+
+def fields(db, variant_id):
+    variant = db.get(models.ProductVariant, variant_id)
+    return variant.price, variant.stock, variant.discount
+
+
+def test_partial_deltas_and_not_found(client, db):
+    product = seed_variants(db)
+    red, blue = (variant.id for variant in product.variants)
+
+    response = client.post(FEED, json={"updates": [
+        {"variant_id": red, "stock": 2},
+        {"sku": "V-BLUE", "price": 8},
+        {"variant_id": 9999, "stock": 1},
+        {"sku": "NOPE", "discount": 5},
+    ]})
+    assert response.status_code == 200, response.text
+    assert response.json() == {"updated": 2, "not_found": ["NOPE", 9999]}
+
+    db.expire_all()
+    assert fields(db, red) == (10, 2, 0)
+    assert fields(db, blue) == (8, 5, 10)
+    # the price change moved the product's range: blue now costs 8 * 0.9
+    assert (db.get(models.Product, product.id).min_price, db.get(models.Product, product.id).max_price) == (7.2, 10)
+
+
+def test_later_delta_for_the_same_variant_wins(client, db):
+    red = seed_variants(db).variants[0].id
+    response = client.post(FEED, json={"updates": [
+        {"variant_id": red, "stock": 1, "price": 11},
+        {"sku": "V-RED", "stock": 3},
+    ]})
+    assert response.json() == {"updated": 1, "not_found": []}
+    db.expire_all()
+    assert fields(db, red) == (11, 3, 0)
+
+
+@pytest.mark.parametrize("updates", [
+    [],
+    [{"stock": 1}],  # neither variant_id nor sku
+    [{"variant_id": 1, "sku": "V-RED", "stock": 1}],  # both
+    [{"variant_id": 1}],  # nothing to change
+    [{"variant_id": 1, "stock": -1}],
+    [{"variant_id": 1, "price": 0}],
+    [{"variant_id": 1, "discount": 101}],
+])
+def test_invalid_feed_is_rejected(client, db, updates):
+    product = seed_variants(db)
+    # next to a valid delta, which must not be applied either
+    feed = [{"variant_id": product.variants[1].id, "stock": 0}, *updates] if updates else []
+    response = client.post(FEED, json={"updates": feed})
+    assert response.status_code == 422
+    db.expire_all()
+    assert fields(db, product.variants[1].id) == (20, 5, 10)
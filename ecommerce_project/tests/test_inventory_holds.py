@@ -0,0 +1,102 @@
+"""
+An unpaid order only holds its units until its InventoryHold expires: the sweeper cancels it and puts
+the units back, a payment confirms it and drops the hold, and a payment arriving after the sweep
+revives the order, or queues a refund when its units have been sold in the meantime.
+"""
+from datetime import datetime, timedelta, timezone
+
+from app import models
+from app.inventory import (
+    place_hold, reserve_stock, release_expired_holds, payment_completed,
+    HOLD_EXPIRED_REASON, SOLD_OUT_REFUND_REASON,
+)
+
+
+def seed_variant(db, stock):
+    product = models.Product(
+        sku="SKU-1", product_name="Shirt", brand="Nike", category_id=1, description="cotton shirt", admin_id=1,
+    )
+    variant = models.ProductVariant(price=10, stock=stock, discount=0, attributes={"color": "red"})
+    product.variants.append(variant)
+    db.add(product)
+    db.commit()
+    return variant
+
+
+def checkout(db, variant, quantity):
+    # what create_order_with_shipping does for a pending order
+    order = models.Order(order_amount=10 * quantity, final_amount=10 * quantity, order_status=models.OrderStatus.pending, user_id=1)
+    order.order_items.append(models.OrderItem(
+        product_id=variant.product_id, variant_id=variant.id, mrp=10, quantity=quantity, total_price=10 * quantity,
+    ))
+    db.add(order)
+    db.flush()
+    place_hold(db, order.id)
+    reserve_stock(db, {variant.id: quantity})
+    db.add(models.Payment(order_id=order.id, payment_method="stripe", amount=order.final_amount))
+    db.commit()
+    return order.id
+
+
+def expire_hold(db, order_id):
+    db.get(models.InventoryHold, order_id).expires_at = datetime.now(timezone.utc) - timedelta(minutes=1)
+    db.commit()
+
+
+def state(db, variant_id, order_id):
+    db.expire_all()
+    order = db.get(models.Order, order_id)
+    held = db.get(models.InventoryHold, order_id) is not None
+    return order.order_status, order.cancel_reason, held, db.get(models.ProductVariant, variant_id).stock
+
+
+def test_expired_hold_is_swept(db):
+    variant_id = seed_variant(db, stock=5).id
+    expired = checkout(db, db.get(models.ProductVariant, variant_id), 2)
+    waiting = checkout(db, db.get(models.ProductVariant, variant_id), 1)
+    expire_hold(db, expired)
+
+    assert release_expired_holds(db) == 1
+    assert state(db, variant_id, expired) == (models.OrderStatus.cancelled, HOLD_EXPIRED_REASON, False, 4)
+    assert state(db, variant_id, waiting) == (models.OrderStatus.pending, None, True, 4)
+    # nothing left to sweep
+    assert release_expired_holds(db) == 0
+
+
+def test_payment_confirms_and_drops_the_hold(db):
+    variant_id = seed_variant(db, stock=5).id
+    order_id = checkout(db, db.get(models.ProductVariant, variant_id), 2)
+
+    assert payment_completed(db, order_id) is not None
+    assert state(db, variant_id, order_id) == (models.OrderStatus.confirmed, None, False, 3)
+    # the sweeper has nothing to release for a paid order
+    assert release_expired_holds(db) == 0
+
+
+def test_late_payment_revives_the_order(db):
+    variant_id = seed_variant(db, stock=5).id
+    order_id = checkout(db, db.get(models.ProductVariant, variant_id), 2)
+    expire_hold(db, order_id)
+    release_expired_holds(db)
+    assert state(db, variant_id, order_id)[3] == 5
+
+    assert payment_completed(db, order_id) is not None
+    assert state(db, variant_id, order_id) == (models.OrderStatus.confirmed, None, False, 3)
+    assert db.query(models.Refund).count() == 0
+
+
+def test_late_payment_after_sell_out_queues_a_refund(db):
+    variant_id = seed_variant(db, stock=2).id
+    order_id = checkout(db, db.get(models.ProductVariant, variant_id), 2)
+    expire_hold(db, order_id)
+    release_expired_holds(db)
+    # the released units sell before the payment comes in
+    checkout(db, db.get(models.ProductVariant, variant_id), 2)
+
+    assert payment_completed(db, order_id) is None
+    assert state(db, variant_id, order_id) == (models.OrderStatus.cancelled, HOLD_EXPIRED_REASON, False, 0)
+    refund = db.query(models.Refund).one()
+    assert (refund.order_id, refund.amount, refund.reason, refund.status) == (
+        order_id, 20, SOLD_OUT_REFUND_REASON, models.RefundStatus.requested,
+    )
+    assert [log.status for log in db.query(models.PaymentLog)] == ["refund_required"]
@@ -0,0 +1,83 @@
+"""
+Listing, detail and order endpoints must run a constant number of SQL statements: doubling the
+products, order items and orders behind a response must not add queries, or an N+1 crept back in.
+"""
+import pytest
+
+from app import models
+from app.cache import catalog_cache, MemoryBackend
+from app.database import count_queries
+
+
+def seed_products(db, count, variants=3, images=2):
+    start = db.query(models.Product).count()
+    products = []
+    for i in range(start, start + count):
+        product = models.Product(
+            sku=f"SKU-{i}", product_name=f"Shirt {i}", brand="Nike" if i % 2 else "Puma", category_id=1,
+            description="cotton shirt", admin_id=1, is_feature=i % 3 == 0,
+        )
+        for j in range(variants):
+            variant = models.ProductVariant(
+                price=10 + i + j, stock=5, discount=10, attributes={"color": ["red", "blue"][j % 2], "size": "M"}
+            )
+            variant.images = [models.ProductImage(image_url=f"/media/{i}_{j}_{k}.png") for k in range(images)]
+            product.variants.append(variant)
+        products.append(product)
+    db.add_all(products)
+    db.commit()
+    return products
+
+
+def seed_order(db, products):
+    # every order has its own customer, so a per-order user lookup shows up in the counts
+    customer_id = db.query(models.User).count() + 1
+    customer = models.User(
+        id=customer_id, name=f"customer {customer_id}", username=f"customer{customer_id}",
+        email=f"customer{customer_id}@example.com", hashed_password="x",
+        role=models.Role(name=f"customer {customer_id}"),
+    )
+    order = models.Order(
+        order_amount=0, final_amount=0, order_status=models.OrderStatus.pending, user=customer,
+        shipping_details=models.ShippingDetails(
+            user_id=customer_id, full_name="Jane Doe", contact_information="555-0100", email="jane@example.com",
+            postal_code=12345, city="Springfield", address="1 Main St", state="IL", country="US",
+        ),
+    )
+    for product in products:
+        variant = product.variants[0]
+        order.order_items.append(models.OrderItem(
+            product_id=product.id, variant_id=variant.id, mrp=variant.price, quantity=1, total_price=variant.price
+        ))
+    db.add(order)
+    db.commit()
+    return order
+
+
+def statement_count(client, url, monkeypatch):
+    # start cold so both measurements run the same cache misses
+    monkeypatch.setattr(catalog_cache, "backend", MemoryBackend())
+    monkeypatch.setattr(catalog_cache, "_versions", {})
+    with count_queries() as counter:
+        response = client.get(url)
+    assert response.status_code == 200, response.text
+    return counter.count
+
+
+@pytest.mark.parametrize("url", [
+    "/products/allproducts",
+    "/products/featuredproducts",
+    "/products/category/1",
+    "/products/{product_id}",
+    "/products/search/?query=shirt",
+    "/products/query?brand=Nike",
+    "/orders/",
+    "/orders/{order_id}",
+])
+def test_statement_count_does_not_grow_with_rows(client, db, url, monkeypatch):
+    counts = []
+    for count in (10, 10):  # N products, then 2N
+        products = seed_products(db, count)
+        order = seed_order(db, db.query(models.Product).all())
+        counts.append(statement_count(client, url.format(product_id=products[0].id, order_id=order.id), monkeypatch))
+    assert counts[0] == counts[1]
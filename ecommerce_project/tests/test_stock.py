@@ -0,0 +1,112 @@
+"""
+Checkout takes the ordered units off the variant's stock in one conditional UPDATE: concurrent
+checkouts never oversell, a checkout without enough stock gets a 409, and a cancelled order gives
+its units back (reviving it takes them again, or answers 409 once they are gone).
+"""
+import threading
+
+import pytest
+
+from app import models
+from app.database import SessionLocal
+from app.inventory import reserve_stock, OutOfStock
+from app.routers import orders
+
+SHIPPING = dict(
+    full_name="Jane Doe", email="jane@example.com", contact_information="555-0100", address="1 Main St",
+    state="IL", city="Springfield", country="US", postal_code=12345,
+)
+
+
+@pytest.fixture(autouse=True)
+def no_mail(monkeypatch):
+    # the tests never send mail, see conftest
+    monkeypatch.setattr(orders, "send_order_notification_to_admin", lambda *args: None)
+
+
+def seed_variant(db, stock):
+    product = models.Product(
+        sku="SKU-1", product_name="Shirt", brand="Nike", category_id=1, description="cotton shirt", admin_id=1,
+    )
+    variant = models.ProductVariant(price=10, stock=stock, discount=0, attributes={"size": "M"})
+    product.variants.append(variant)
+    db.add(product)
+    db.commit()
+    return variant
+
+
+def stock(db, variant):
+    db.expire_all()
+    return db.get(models.ProductVariant, variant.id).stock
+
+
+def checkout(client, variant, quantity, **order):
+    return client.post("/orders/", json={
+        "order_items": [{"product_id": variant.product_id, "variant_id": variant.id, "quantity": quantity}],
+        "shipping_details": SHIPPING,
+        **order,
+    })
+
+
+def test_concurrent_reservations_never_oversell(db):
+    variant_id = seed_variant(db, stock=10).id
+    start = threading.Barrier(25)
+    outcomes = []
+
+    def buy():
+        session = SessionLocal()
+        try:
+            start.wait()
+            reserve_stock(session, {variant_id: 1})
+            session.commit()
+            outcomes.append("reserved")
+        except OutOfStock:
+            session.rollback()
+            outcomes.append("out of stock")
+        finally:
+            session.close()
+
+    threads = [threading.Thread(target=buy) for _ in range(25)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert outcomes.count("reserved") == 10
+    assert outcomes.count("out of stock") == 15
+    assert db.get(models.ProductVariant, variant_id).stock == 0
+
+
+def test_checkout_without_stock_is_a_conflict(client, db):
+    variant = seed_variant(db, stock=2)
+    assert checkout(client, variant, 2).status_code == 201
+    assert stock(db, variant) == 0
+
+    response = checkout(client, variant, 1)
+    assert response.status_code == 409
+    assert str(variant.id) in response.json()["detail"]
+    # the whole order was rolled back
+    assert db.query(models.Order).count() == 1
+    assert stock(db, variant) == 0
+
+
+def test_cancel_restores_stock_and_revive_needs_it_back(client, db):
+    variant = seed_variant(db, stock=3)
+    order_id = checkout(client, variant, 3).json()["id"]
+    assert stock(db, variant) == 0
+
+    assert client.put(f"/orders/cancel/{order_id}").status_code == 200
+    assert stock(db, variant) == 3
+
+    # someone else buys the units the cancelled order gave back
+    assert checkout(client, variant, 2).status_code == 201
+    response = client.put(f"/orders/{order_id}/status", params={"status": "confirmed"})
+    assert response.status_code == 409
+    assert db.get(models.Order, order_id).order_status == models.OrderStatus.cancelled
+    assert stock(db, variant) == 1
+
+    # with enough stock the order can be revived, and takes its units again
+    db.get(models.ProductVariant, variant.id).stock = 4
+    db.commit()
+    assert client.put(f"/orders/{order_id}/status", params={"status": "confirmed"}).status_code == 200
+    assert stock(db, variant) == 1
@@ -0,0 +1,104 @@
+"""
+update_product diffs the variants: a variant left out of the form is deleted, or archived when order
+items reference it, and then no longer shows up in the catalog. Image files the edit drops are
+removed from media/uploads once nothing references them.
+"""
+import json
+import os
+
+import pytest
+
+from app import models
+from app.inventory import reserve_stock, OutOfStock
+
+
+@pytest.fixture
+def uploads(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("media/uploads")
+
+    def upload(name):
+        with open(os.path.join("media/uploads", name), "wb") as f:
+            f.write(b"\xff\xd8")
+        return f"/media/uploads/{name}"
+    return upload
+
+
+def seed_product(db, uploads):
+    product = models.Product(
+        sku="SKU-1", product_name="Shirt", brand="Nike", category_id=1, description="cotton shirt", admin_id=1,
+    )
+    for color, price, images in (("red", 10, ["red.jpg"]), ("blue", 20, ["blue.jpg"]), ("green", 30, ["g1.jpg", "g2.jpg"])):
+        variant = models.ProductVariant(price=price, stock=5, discount=0, attributes={"color": color})
+        variant.images = [models.ProductImage(image_url=uploads(name)) for name in images]
+        product.variants.append(variant)
+    db.add(product)
+    db.flush()
+    red = product.variants[0]
+    db.add(models.Order(
+        order_amount=10, final_amount=10, order_status=models.OrderStatus.delivered, user_id=1,
+        order_items=[models.OrderItem(product_id=product.id, variant_id=red.id, mrp=10, quantity=1, total_price=10)],
+    ))
+    db.commit()
+    return product
+
+
+def test_removed_variants_and_images(client, db, uploads):
+    product = seed_product(db, uploads)
+    red, blue, green = product.variants
+    variant_ids = (red.id, blue.id, green.id)
+
+    # only green stays, with one of its two images
+    form = {
+        "product_name": "Shirt", "brand": "Nike", "is_feature": "false", "category_id": "1", "description": "cotton shirt",
+        "variants": [json.dumps({"id": green.id, "price": 30, "stock": 5, "color": "green", "images": ["/media/uploads/g1.jpg"]})],
+    }
+    response = client.put(f"/products/{product.id}", data=form)
+    assert response.status_code == 202, response.text
+    assert [variant["id"] for variant in response.json()["variants"]] == [green.id]
+
+    db.expire_all()
+    red, blue, green = (db.get(models.ProductVariant, variant_id) for variant_id in variant_ids)
+    # ordered: archived, out of stock, with its image for the order history
+    assert (red.is_archived, red.stock, [image.image_url for image in red.images]) == (True, 0, ["/media/uploads/red.jpg"])
+    assert blue is None
+    assert [image.image_url for image in green.images] == ["/media/uploads/g1.jpg"]
+
+    # the archived variant is gone from listings, facets and the price range
+    listed = client.get(f"/products/{product.id}").json()
+    assert [variant["id"] for variant in listed["variants"]] == [green.id]
+    assert [variant["id"] for p in client.get("/products/allproducts").json() for variant in p["variants"]] == [green.id]
+    assert {row.variant_id for row in db.query(models.VariantAttributeValue)} == {green.id}
+    assert (db.get(models.Product, product.id).min_price, db.get(models.Product, product.id).max_price) == (30, 30)
+
+    assert sorted(os.listdir("media/uploads")) == ["g1.jpg", "red.jpg"]
+
+
+def test_shared_image_file_is_kept(client, db, uploads):
+    product = seed_product(db, uploads)
+    red, blue, green = product.variants
+    # a bulk import stores an image once for every variant that names it
+    blue.images.append(models.ProductImage(image_url="/media/uploads/g2.jpg"))
+    db.commit()
+
+    form = {
+        "product_name": "Shirt", "brand": "Nike", "is_feature": "false", "category_id": "1", "description": "cotton shirt",
+        "variants": [
+            json.dumps({"id": variant.id, "price": variant.price, "stock": 5, **variant.attributes}) for variant in (red, blue)
+        ] + [json.dumps({"id": green.id, "price": 30, "stock": 5, "color": "green", "images": ["/media/uploads/g1.jpg"]})],
+    }
+    assert client.put(f"/products/{product.id}", data=form).status_code == 202
+    # green dropped g2.jpg, blue still shows it
+    assert sorted(os.listdir("media/uploads")) == ["blue.jpg", "g1.jpg", "g2.jpg", "red.jpg"]
+
+
+def test_archived_variant_cannot_be_reserved(db, uploads):
+    product = seed_product(db, uploads)
+    red = product.variants[0]
+    # e.g. restocked by the inventory feed after it was archived
+    red.is_archived = True
+    red.stock = 3
+    db.commit()
+
+    with pytest.raises(OutOfStock):
+        reserve_stock(db, {red.id: 1})